@@ -1,4 +1,5 @@
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Callable
 
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, SystemMessage, AnyMessage
@@ -9,6 +10,51 @@ from .llmBase import LLMBase
 from ..core.config import get_settings
 
 
+class AgentCache:
+    """已编译 agent 的 LRU 缓存，相同 (name, model, system_prompt) 只编译一次"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._agents: OrderedDict[tuple, "AgentBase"] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional["AgentBase"]:
+        agent = self._agents.get(key)
+        if agent is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._agents.move_to_end(key)
+        return agent
+
+    def put(self, key: tuple, agent: "AgentBase"):
+        self._agents[key] = agent
+        self._agents.move_to_end(key)
+        while len(self._agents) > self.max_size:
+            self._agents.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._agents),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_agent_cache: Optional[AgentCache] = None
+
+
+def get_agent_cache() -> AgentCache:
+    global _agent_cache
+    if _agent_cache is None:
+        _agent_cache = AgentCache(get_settings().agent_cache_size)
+    return _agent_cache
+
+
 class AgentBase:
     def __init__(
             self,
@@ -31,10 +77,50 @@ class AgentBase:
             tools=self.tools
         )
 
+    @classmethod
+    def get_or_create(
+            cls,
+            name: str,
+            system_prompt: Optional[str] = None,
+            tools_factory: Optional[Callable[[], list[BaseTool]]] = None,
+            llm: Optional[LLMBase] = None,
+    ) -> "AgentBase":
+        """
+        获取预编译的 agent，未命中时才编译并放入缓存
+        Args:
+            name: agent 名称，作为缓存 key 的一部分
+            system_prompt: 静态 system prompt，不能包含用户信息、时间等每次请求都变化的内容
+            tools_factory: 创建工具列表的函数，只在缓存未命中时调用
+            llm: 使用的 LLM，默认使用配置中的模型
+        """
+        llm = llm or LLMBase()
+        key = (name, llm.model, llm.base_url, llm.temperature, system_prompt)
+        cache = get_agent_cache()
+        agent = cache.get(key)
+        if agent is None:
+            agent = cls(
+                name=name,
+                llm=llm,
+                system_prompt=system_prompt,
+                tools=tools_factory() if tools_factory else None,
+            )
+            cache.put(key, agent)
+        return agent
+
     async def arun(
             self,
-            messages: list[AnyMessage]
+            messages: list[AnyMessage],
+            context: Optional[str] = None,
     ) -> AnyMessage:
+        """
+        Args:
+            messages: 对话历史
+            context: 每次请求变化的数据 (用户信息、当前时间、RAG 参考资料等)，
+                     以 SystemMessage 追加在对话历史之后，不会写入编译好的 agent，
+                     保证 system prompt + 历史消息这段前缀在多次请求间保持不变
+        """
+        if context:
+            messages = [*messages, SystemMessage(content=context)]
         response = await self.agent.ainvoke({
             "messages": messages
         })
@@ -1,21 +1,42 @@
+"""
+Prompt 模板
+
+为了命中服务端的前缀 / KV 缓存，每个 agent 的 prompt 拆成两部分：
+- prefix: 静态前缀，模块导入时预编译，所有请求逐字节一致，作为第一条 SystemMessage
+- context: 用户信息、时间(精确到分钟)、检索结果等易变字段，在调用时作为最后一条消息追加
+"""
+import datetime
+import hashlib
+
 from ..models.graphState import UserProfile
 
 
-def get_academic_agent_prompt(user_info: UserProfile, current_time: str):
-    """
-    构建教务智能体的 System Prompt
-    Args:
-        user_info: 用户信息
-        current_time: 当前时间
+class PromptTemplate:
+    def __init__(self, name: str, prefix: str, context: str = ""):
+        self.name = name
+        self.prefix = prefix
+        self.context = context
+        # 前缀指纹，用于确认前缀在不同请求之间保持不变
+        self.fingerprint = hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:12]
 
-    """
+    def render_context(self, **fields) -> str:
+        return self.context.format(**fields)
+
+
+def current_minute() -> str:
+    """注入 prompt 的当前时间只精确到分钟，同一分钟内的请求上下文完全相同"""
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+
+
+def _role_name(user_info: UserProfile) -> str:
+    return '学生' if user_info['role'] == 'student' else '教师'
 
-    # 基础角色定义
-    prompt = f"""
+
+ACADEMIC_AGENT = PromptTemplate(
+    name="academic_agent",
+    prefix="""
     # Role
     你是 Uni-Mind 智慧校园的【教务专员】。
-    当前用户: {user_info['name']} ({'学生' if user_info['role'] == 'student' else '教师'}, id: {user_info['uid']})
-    当前时间: {current_time}
 
     # Goal
     你的核心职责是或协助用户查询成绩、课表。
@@ -23,7 +44,7 @@ def get_academic_agent_prompt(user_info: UserProfile, current_time: str):
 
     # Constraints & Safety (最高优先级)
     1. **数据真实性**: 如果工具返回 "未查到数据" 或 "None"，你必须如实告知用户，不能捏造。
-    2. **权限控制**: 
+    2. **权限控制**:
        - 如果用户是学生，绝对不允许执行 `update_grade` 或 `modify_score` 类工具。如果学生尝试修改成绩，请礼貌但坚定地拒绝。
        - 如果用户是教师，在执行修改操作前，必须复述一遍修改内容让用户确认（虽然前端有确认表单，但语言上也要确认）。
     3. **隐私保护**: 不要在回复中透露无关人员的信息。
@@ -31,35 +52,66 @@ def get_academic_agent_prompt(user_info: UserProfile, current_time: str):
     # Response Style
     1. **不要生成复杂的表格**: 前端界面会自动渲染漂亮的图表和课表。你的回复应该是简短的文字总结。
     2. **语气**: 专业、客观。对成绩较低的学生（<60分）给予适度鼓励；对成绩优异的学生（>90分）给予肯定。
-    
+
     # 回复要求
     - 当查询成绩时：总结通过了几门课，最高分课程是什么，是否有挂科风险。
     - 当查询课表时：告知今天或明天最近的一节课是什么，地点在哪里。
     - 如果工具返回了详细的 JSON 数据，你只需要提取关键信息进行自然语言复述，不需要罗列所有数据。
+    """,
+    context="""
+    当前用户: {name} ({role}, id: {uid})
+    当前时间: {current_time}
+    """,
+)
+
+
+def get_academic_agent_prompt():
+    """
+    教务智能体的静态 System Prompt (可被预编译 agent 复用)
+    用户信息与当前时间由 get_academic_agent_context 在调用时注入
     """
+    return ACADEMIC_AGENT.prefix
 
-    return prompt
 
+def get_academic_agent_context(user_info: UserProfile, current_time: str):
+    """
+    构建教务智能体每次请求变化的上下文
+    Args:
+        user_info: 用户信息
+        current_time: 当前时间，应使用 current_minute()
+    """
+    return ACADEMIC_AGENT.render_context(
+        name=user_info['name'], role=_role_name(user_info), uid=user_info['uid'], current_time=current_time
+    )
 
-def get_router_system_prompt() -> str:
-    prompt = """
+
+# 路由关键词：既写入路由 prompt，也被本地快速路由 (intentRouter) 用作规则
+ROUTER_KEYWORDS = {
+    "academic": ["成绩", "分数", "GPA", "挂科", "课表", "上课时间", "教室", "老师联系方式"],
+    "info": ["讲座", "新闻", "通知", "校规", "保研", "图书馆开馆时间", "校历"],
+    "admin": ["请假", "申请", "预约", "报名"],
+}
+
+ROUTER = PromptTemplate(
+    name="router",
+    prefix=f"""
     你是一个意图分类专家，负责将智慧校园助手的用户输入分发到正确的处理模块。
 
     请根据以下规则进行分类：
 
     1. **academic (教务模块)**:
        - 涉及个人成绩，平时课表等查询。
-       - 关键词：成绩、分数、GPA、挂科、课表、上课时间、教室、老师联系方式。
+       - 关键词：{'、'.join(ROUTER_KEYWORDS['academic'])}。
        - 例子："我高数考了多少分？", "周五上午有什么课？", "张三老师的办公室在哪？"
 
     2. **info (信息模块)**:
        - 涉及保研政策，讲座信息，校园新闻等查询。
-       - 关键词：讲座、新闻、通知、校规、保研、图书馆开馆时间、校历。
+       - 关键词：{'、'.join(ROUTER_KEYWORDS['info'])}。
        - 例子："最近有什么关于AI的讲座？", "图书馆几点关门？", "挂科了还能保研吗？", 保研对绩点有什么要求
 
     3. **admin (行政模块)**:
        - 涉及写入操作或需要审批的事务。
-       - 关键词：请假、申请、预约、报名。
+       - 关键词：{'、'.join(ROUTER_KEYWORDS['admin'])}。
        - 例子："我要请假三天", "帮我预约羽毛球场"。
 
     4. **chat (闲聊模块)**:
@@ -67,58 +119,151 @@ def get_router_system_prompt() -> str:
        - 例子："你好", "你是谁", "讲个笑话"。
 
     【严格遵守以下 JSON 结构】：
-    {
+    {{
       "destination": "这里只能填 academic, info, admin 或 chat",
       "reason": "简短说明理由"
-    }
-    """
-    return prompt
+    }}
+    """,
+)
+
 
+def get_router_system_prompt() -> str:
+    return ROUTER.prefix
 
-def get_rag_summary_system_prompt(user_message: str):
-    prompt = f"""
-    分析用户的问题：{user_message}
+
+RAG_SUMMARY = PromptTemplate(
+    name="rag_summary",
+    prefix="""
+    分析用户的问题 (问题在最后一条消息中)：
     1.生成一段模拟的政策条文(HyDE)；
     2.提取3-5个关键词；总结关键词时要能够总结出最核心的词，且词语使用要尽量独立且官方，例如四六级要解读成四级和六级。
     3.判断所属领域(domain)。
+    4.如果是查询讲座、活动 (domain 为 campus_events)，再提取时间范围、地点和活动类型；
+      相对时间 (如"明天"、"这周末") 请根据最后一条消息中的当前时间换算，问题中没有提到的字段填 null。
     【严格遵守以下 JSON 结构】：
-    {{
+    {
         "hyde_doc": "模拟一份关于该问题的简短政策文档段落",
         "keywords": "提取3-5个核心关键词，用空格分隔",
-        "domain": "确定搜索领域：hfut_postgraduate_admission_policy(保研政策), hfut_news (校园新闻)"
-    }}
-    """
+        "domain": "确定搜索领域：hfut_postgraduate_admission_policy(保研政策), hfut_news (校园新闻), campus_events (讲座/活动)",
+        "event_type": "lecture (讲座) 或 news (新闻)，仅 campus_events 使用",
+        "time_start": "开始时间下限，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM，仅 campus_events 使用",
+        "time_end": "开始时间上限，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM，仅 campus_events 使用",
+        "location": "地点关键词，仅 campus_events 使用"
+    }
+    """,
+    context="""
+    当前时间: {current_time}
+    用户的问题：{question}
+    """,
+)
+
+
+def get_rag_summary_system_prompt():
+    return RAG_SUMMARY.prefix
 
-    return prompt
 
+def get_rag_summary_context(user_message: str):
+    return RAG_SUMMARY.render_context(question=user_message, current_time=current_minute())
 
-def get_rag_query_system_prompt(context_list: list[str]):
-    context = "\n".join(context_list)
-    prompt = f"""
+
+RAG_QUERY = PromptTemplate(
+    name="rag_query",
+    prefix="""
     你是一个专业的智慧校园助手。
-    请根据以下【参考资料】回答用户问题。
+    请根据【参考资料】回答用户问题。
     如果资料中没有提到，请说不知道。
     回答必须严谨，并指明出自第几条或哪个文件。
-
+    """,
+    context="""
     【参考资料】：
     {context}
-    """
-    return prompt
+    """,
+)
+
+
+def get_rag_query_system_prompt():
+    return RAG_QUERY.prefix
+
 
+def get_rag_query_context(context_list: list[str]):
+    return RAG_QUERY.render_context(context="\n".join(context_list))
 
-def get_leave_system_prompt(user_info: UserProfile, current_time: str):
-    prompt = f"""
+
+LEAVE = PromptTemplate(
+    name="leave",
+    prefix="""
     你是一个请假办理助手。
-    当前用户: {user_info['name']} ({'学生' if user_info['role'] == 'student' else '教师'}, id: {user_info['uid']})
-    当前时间: {current_time}
     请你从用户的对话中提取请假信息：
     开始时间，结束时间，请假类型，原因。
     并严格返回json格式：
-    {{
+    {
         "leave_type": "请假类型，必须归一化为 'sick' (病假), 'personal' (事假), 或 'other' (其他)",
         "start_date": "开始日期，格式：YYYY-MM-DD",
         "end_date": "结束日期，格式：YYYY-MM-DD",
         "reason": "请假具体原因"
-    }}
-    """
-    return prompt
+    }
+    相对日期 (如"明天") 请根据最后一条消息中的当前时间换算。
+    """,
+    context="""
+    当前用户: {name} ({role}, id: {uid})
+    当前时间: {current_time}
+    """,
+)
+
+
+def get_leave_system_prompt():
+    return LEAVE.prefix
+
+
+def get_leave_context(user_info: UserProfile, current_time: str):
+    return LEAVE.render_context(
+        name=user_info['name'], role=_role_name(user_info), uid=user_info['uid'], current_time=current_time
+    )
+
+
+MEMORY_SUMMARY = PromptTemplate(
+    name="memory_summary",
+    prefix="""
+    你负责维护智慧校园助手与用户之间对话的滚动摘要。
+    请把【已有摘要】与【需要合并的对话】合并成一份新的摘要：
+    1. 保留用户身份相关的事实、提出过的需求、已经给出的关键结论 (如成绩、课程、政策要点、请假进度)。
+    2. 删除寒暄和重复内容，不要编造对话中没有的信息。
+    3. 使用第三人称，控制在 300 字以内，直接输出摘要正文。
+    """,
+    context="""
+    【已有摘要】：
+    {summary}
+
+    【需要合并的对话】：
+    {dialogue}
+    """,
+)
+
+
+def get_memory_summary_system_prompt():
+    return MEMORY_SUMMARY.prefix
+
+
+def get_memory_summary_context(summary: str, dialogue: str):
+    return MEMORY_SUMMARY.render_context(summary=summary or "无", dialogue=dialogue)
+
+
+CONVERSATION_SUMMARY = PromptTemplate(
+    name="conversation_summary",
+    prefix="",
+    context="""
+    【之前对话的摘要】：
+    {summary}
+    """,
+)
+
+
+def get_conversation_summary_context(summary: str):
+    return CONVERSATION_SUMMARY.render_context(summary=summary)
+
+
+PROMPT_TEMPLATES = [ACADEMIC_AGENT, ROUTER, RAG_SUMMARY, RAG_QUERY, LEAVE, MEMORY_SUMMARY]
+
+
+def prompt_fingerprints() -> dict:
+    return {template.name: template.fingerprint for template in PROMPT_TEMPLATES}
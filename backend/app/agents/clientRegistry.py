@@ -0,0 +1,159 @@
+"""进程级 LLM / 嵌入模型客户端注册表
+
+所有节点共享同一批长连接客户端，避免每次请求都新建 ChatOpenAI / OllamaEmbeddings
+(以及它们各自的 HTTP 连接池)，让 TLS / keep-alive 连接可以被复用。
+"""
+from typing import Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_ollama import OllamaEmbeddings
+
+from .llmScheduler import ScheduledChatOpenAI
+from .onnxEmbeddings import OnnxEmbeddings
+from ..core.config import get_settings
+from ..utils.instrumentation import InstrumentedEmbeddings
+
+
+class ClientRegistry:
+    def __init__(self):
+        self.settings = get_settings()
+        self.http_client: Optional[httpx.Client] = None
+        self.http_async_client: Optional[httpx.AsyncClient] = None
+        self._llm_clients: dict[tuple, BaseChatModel] = {}
+        self._embedding_clients: dict[tuple, Embeddings] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.settings.http_max_connections,
+            max_keepalive_connections=self.settings.http_max_keepalive_connections,
+            keepalive_expiry=self.settings.http_keepalive_expiry,
+        )
+
+    def init_resources(self):
+        """应用启动时调用"""
+        if self.http_async_client is not None:
+            return
+        timeout = httpx.Timeout(self.settings.llm_timeout, connect=10.0)
+        self.http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=timeout)
+        self.http_client = httpx.Client(limits=self._limits(), timeout=timeout)
+
+    def get_llm(
+            self,
+            model: str,
+            api_key: str,
+            base_url: str,
+            temperature: float,
+            max_tokens: Optional[int],
+            timeout: Optional[int],
+            tier: str = "large",
+    ) -> BaseChatModel:
+        key = (model, base_url, api_key, temperature, max_tokens, timeout, tier)
+        client = self._llm_clients.get(key)
+        if client is not None:
+            self.hits += 1
+            return client
+        self.misses += 1
+        # 脚本 / CLI 场景下可能没有经过 lifespan，这里兜底初始化
+        self.init_resources()
+        client = ScheduledChatOpenAI(
+            model=model,
+            api_key=api_key,
+            base_url=base_url,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            # 重试由 llm_scheduler 统一负责，避免 SDK 内部重试绕过限流
+            max_retries=0,
+            # 流式输出时也返回 token 用量，用于按层级统计成本
+            stream_usage=True,
+            tier=tier,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+        self._llm_clients[key] = client
+        return client
+
+    def get_embedding(self, embedding_type: str, model: str, base_url: str) -> Optional[Embeddings]:
+        key = (embedding_type, model, base_url)
+        client = self._embedding_clients.get(key)
+        if client is not None:
+            self.hits += 1
+            return client
+        self.misses += 1
+        if embedding_type == "ollama":
+            client = OllamaEmbeddings(
+                base_url=base_url,
+                model=model,
+                client_kwargs={"limits": self._limits(), "timeout": self.settings.llm_timeout},
+            )
+        elif embedding_type == "onnx":
+            # 进程内 CPU 推理，model 为本地模型目录，base_url 不使用
+            client = OnnxEmbeddings(model)
+        if client is not None and self.settings.metrics_enabled:
+            client = InstrumentedEmbeddings(client, backend=embedding_type)
+        if client is not None:
+            self._embedding_clients[key] = client
+        return client
+
+    @staticmethod
+    def _unwrap(embedding: Embeddings) -> Embeddings:
+        return embedding.embeddings if isinstance(embedding, InstrumentedEmbeddings) else embedding
+
+    @staticmethod
+    def _pool_stats(client) -> dict:
+        # httpx 没有公开连接池统计接口，这里读取 httpcore 连接池的内部状态
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "llm_clients": len(self._llm_clients),
+            "embedding_clients": len(self._embedding_clients),
+            # 本地嵌入后端的微批处理统计 (吞吐、批大小直方图)
+            "embedding_backends": [
+                client.stats() for client in map(self._unwrap, self._embedding_clients.values())
+                if isinstance(client, OnnxEmbeddings)
+            ],
+            "hits": self.hits,
+            "misses": self.misses,
+            "http_pool": self._pool_stats(self.http_async_client) if self.http_async_client else None,
+            "http_pool_limits": {
+                "max_connections": self.settings.http_max_connections,
+                "max_keepalive_connections": self.settings.http_max_keepalive_connections,
+                "keepalive_expiry": self.settings.http_keepalive_expiry,
+            },
+        }
+
+    async def close_resources(self):
+        """应用关闭时调用"""
+        for embedding in map(self._unwrap, self._embedding_clients.values()):
+            if isinstance(embedding, OnnxEmbeddings):
+                embedding.close()
+                continue
+            # OllamaEmbeddings 内部持有 ollama.AsyncClient / Client，各自带一个 httpx 客户端
+            async_client = getattr(getattr(embedding, "_async_client", None), "_client", None)
+            if async_client is not None:
+                await async_client.aclose()
+            sync_client = getattr(getattr(embedding, "_client", None), "_client", None)
+            if sync_client is not None:
+                sync_client.close()
+        self._embedding_clients.clear()
+        self._llm_clients.clear()
+        if self.http_async_client:
+            await self.http_async_client.aclose()
+            self.http_async_client = None
+        if self.http_client:
+            self.http_client.close()
+            self.http_client = None
+
+
+# 实例化单例
+client_registry = ClientRegistry()
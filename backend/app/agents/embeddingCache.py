@@ -0,0 +1,171 @@
+"""内容寻址的嵌入向量缓存
+
+两级缓存：进程内 LRU -> Redis，key 为 hash(模型名, 归一化文本)。
+Redis 与进程内 LRU 中向量都以 float32 小端字节存储，比 JSON / Python 列表更紧凑，
+读取时才转换为列表，调用方修改返回值不会污染缓存。
+文档向量 (批量入库) 只写 Redis，不进 LRU，避免挤掉会被反复查询的问题向量。
+"""
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict, Counter
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..core.config import get_settings
+from ..db.session import db_manager
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、合并空白，保证同一问题的不同写法命中同一个 key"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            model_name: str,
+            lru_size: Optional[int] = None,
+            ttl: Optional[int] = None,
+            prefix: str = "emb",
+    ):
+        settings = get_settings()
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.lru_size = lru_size or settings.embedding_cache_lru_size
+        self.ttl = ttl or settings.embedding_cache_ttl
+        self.prefix = prefix
+        self._lru: OrderedDict[str, bytes] = OrderedDict()
+        self.counters = Counter()
+
+    def _key(self, text: str, kind: str) -> str:
+        # kind 区分 query / document，兼容查询与文档向量不同的模型
+        digest = hashlib.sha1(f"{self.model_name}\x00{kind}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    @staticmethod
+    def _pack(vector: list[float]) -> bytes:
+        return np.asarray(vector, dtype="<f4").tobytes()
+
+    @staticmethod
+    def _unpack(data: bytes) -> list[float]:
+        return np.frombuffer(data, dtype="<f4").tolist()
+
+    def _lru_get(self, key: str) -> Optional[list[float]]:
+        data = self._lru.get(key)
+        if data is None:
+            return None
+        self._lru.move_to_end(key)
+        return self._unpack(data)
+
+    def _lru_put(self, key: str, data: bytes):
+        self._lru[key] = data
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def _aembed(self, texts: list[str], kind: str) -> list[list[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        results: dict[str, list[float]] = {}
+
+        use_lru = kind != "document"
+
+        # 1. 进程内 LRU
+        if use_lru:
+            for key in keys:
+                vector = self._lru_get(key)
+                if vector is not None:
+                    results[key] = vector
+            self.counters["lru_hit"] += len(results)
+
+        # 2. Redis 批量查询
+        missing = list(dict.fromkeys(k for k in keys if k not in results))
+        redis_client = db_manager.redis_binary
+        if missing and redis_client is not None:
+            try:
+                for key, data in zip(missing, await redis_client.mget(missing)):
+                    if data:
+                        results[key] = self._unpack(data)
+                        if use_lru:
+                            self._lru_put(key, data)
+                        self.counters["redis_hit"] += 1
+            except Exception as e:
+                print(f"嵌入缓存读取 Redis 失败: {e}")
+
+        # 3. 调用模型，同一批次中的重复文本只计算一次
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in pending:
+                pending[key] = text
+        if pending:
+            self.counters["miss"] += len(pending)
+            if kind == "query" and len(pending) == 1:
+                vectors = [await self.embeddings.aembed_query(next(iter(pending.values())))]
+            else:
+                vectors = await self.embeddings.aembed_documents(list(pending.values()))
+            packed = [self._pack(vector) for vector in vectors]
+            for key, vector, data in zip(pending, vectors, packed):
+                results[key] = vector
+                if use_lru:
+                    self._lru_put(key, data)
+            if redis_client is not None:
+                try:
+                    async with redis_client.pipeline(transaction=False) as pipe:
+                        for key, data in zip(pending, packed):
+                            pipe.set(key, data, ex=self.ttl)
+                        await pipe.execute()
+                except Exception as e:
+                    print(f"嵌入缓存写入 Redis 失败: {e}")
+
+        return [results[key] for key in keys]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed(texts, "document")
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self._aembed([text], "query"))[0]
+
+    # 同步接口只使用进程内 LRU (Redis 客户端为异步)，文档向量不缓存
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        vector = self._lru_get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._lru_put(key, self._pack(vector))
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.counters["lru_hit"] + self.counters["redis_hit"] + self.counters["miss"]
+        return {
+            "model": self.model_name,
+            "lru_size": len(self._lru),
+            "lru_max_size": self.lru_size,
+            "lru_hit": self.counters["lru_hit"],
+            "redis_hit": self.counters["redis_hit"],
+            "miss": self.counters["miss"],
+            "hit_rate": (lookups - self.counters["miss"]) / lookups if lookups else 0.0,
+        }
+
+
+_cached_embeddings: dict[tuple, CachedEmbeddings] = {}
+
+
+def get_cached_embeddings(embeddings: Embeddings, key: tuple, model_name: str) -> CachedEmbeddings:
+    """同一个底层模型只包装一次，保证进程内 LRU 在所有调用方之间共享"""
+    cached = _cached_embeddings.get(key)
+    if cached is None or cached.embeddings is not embeddings:
+        cached = CachedEmbeddings(embeddings, model_name)
+        _cached_embeddings[key] = cached
+    return cached
+
+
+def embedding_cache_stats() -> list[dict]:
+    return [cached.stats() for cached in _cached_embeddings.values()]
@@ -1,5 +1,5 @@
-from langchain_ollama import OllamaEmbeddings
-
+from .clientRegistry import client_registry
+from .embeddingCache import get_cached_embeddings
 from ..core.config import get_settings
 
 
@@ -10,7 +10,15 @@ class EmbeddingModelBase:
         self.embedding_api_key = settings.embedding_api_key
         self.embedding_base_url = settings.embedding_base_url
         self.embedding_type = settings.embedding_type
+        self.embedding_cache_enabled = settings.embedding_cache_enabled
 
-    def get_model(self):
-        if self.embedding_type == "ollama":
-            return OllamaEmbeddings(base_url=self.embedding_base_url, model=self.embedding_model)
+    def get_model(self, cached: bool = True):
+        model = client_registry.get_embedding(self.embedding_type, self.embedding_model, self.embedding_base_url)
+        if model is None or not (cached and self.embedding_cache_enabled):
+            return model
+        # 所有嵌入调用方都经过缓存层
+        return get_cached_embeddings(
+            model,
+            key=(self.embedding_type, self.embedding_model, self.embedding_base_url),
+            model_name=self.embedding_model,
+        )
@@ -0,0 +1,196 @@
+"""本地快速意图路由
+
+分层路由：
+1. 关键词规则 (来自路由 prompt 的 ROUTER_KEYWORDS)
+2. 基于标注样例库的最近邻匹配 (样例在启动时向量化一次)
+3. 以上置信度都不足时，才调用 LLM 做结构化路由
+
+同时统计快速路径命中率以及与 LLM 的一致率，用于根据线上流量调整阈值。
+"""
+import random
+from collections import Counter
+from typing import Optional, Awaitable, Callable
+
+import numpy as np
+
+from .agentPrompts import ROUTER_KEYWORDS
+from .embeddingModelBase import EmbeddingModelBase
+from .llmScheduler import llm_priority, Priority
+from ..core.config import get_settings
+from ..utils.backgroundTasks import spawn
+
+# 关键词之外的补充规则，只放歧义很小的短语
+# 主图还没有 chat 分支，快速路由不产出 chat，问候类输入仍交给 LLM
+EXTRA_KEYWORDS = {
+    "academic": ["考了多少", "下节课", "什么课", "学分"],
+    "info": ["图书馆", "开馆", "闭馆", "招聘会"],
+}
+
+# 关键词命中的置信度：只命中一个词时低于默认阈值 (0.8)，还需最近邻或 LLM 确认；每多命中一个词提高一档
+KEYWORD_BASE_CONFIDENCE = 0.7
+KEYWORD_STEP_CONFIDENCE = 0.15
+KEYWORD_MAX_CONFIDENCE = 0.95
+
+# 标注样例库：用于最近邻匹配，可以持续从线上 LLM 路由结果中补充
+ROUTER_EXAMPLES = [
+    ("我高数考了多少分？", "academic"),
+    ("周五上午有什么课？", "academic"),
+    ("张三老师的办公室在哪？", "academic"),
+    ("帮我查一下这学期的成绩", "academic"),
+    ("我这学期的绩点是多少", "academic"),
+    ("明天第一节课在哪个教室", "academic"),
+    ("我有没有挂科", "academic"),
+    ("最近有什么关于AI的讲座？", "info"),
+    ("图书馆几点关门？", "info"),
+    ("挂科了还能保研吗？", "info"),
+    ("保研对绩点有什么要求", "info"),
+    ("学校最近有什么新闻", "info"),
+    ("这学期什么时候放寒假", "info"),
+    ("推免需要什么条件", "info"),
+    ("我要请假三天", "admin"),
+    ("帮我预约羽毛球场", "admin"),
+    ("我想申请病假", "admin"),
+    ("明天有事想请个事假", "admin"),
+    ("我要报名参加比赛", "admin"),
+]
+
+
+class IntentRouter:
+    def __init__(self):
+        self.settings = get_settings()
+        self.threshold = self.settings.router_fast_threshold
+        self.top_k = self.settings.router_knn_top_k
+        self.shadow_rate = self.settings.router_shadow_sample_rate
+        self._example_vectors: Optional[np.ndarray] = None
+        self._example_labels: list[str] = []
+        self.counters = Counter()
+
+    async def init_resources(self):
+        """应用启动时调用：向量化标注样例库"""
+        embedding_model = EmbeddingModelBase().get_model()
+        if embedding_model is None:
+            print("⚠️ 警告：未配置嵌入模型，快速路由仅使用关键词规则")
+            return
+        try:
+            vectors = await embedding_model.aembed_documents([text for text, _ in ROUTER_EXAMPLES])
+        except Exception as e:
+            print(f"⚠️ 警告：路由样例库向量化失败，快速路由仅使用关键词规则: {e}")
+            return
+        self._example_vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        self._example_labels = [label for _, label in ROUTER_EXAMPLES]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def classify_by_keywords(self, text: str) -> tuple[Optional[str], float]:
+        text = text.lower()
+        hits = Counter()
+        for keywords in (ROUTER_KEYWORDS, EXTRA_KEYWORDS):
+            for label, words in keywords.items():
+                hits[label] += sum(1 for word in words if word.lower() in text)
+        hits = {label: count for label, count in hits.items() if count}
+        # 多个类别同时命中 (如 "挂科了还能保研吗") 视为有歧义，交给后续层处理
+        if len(hits) != 1:
+            return None, 0.0
+        label, count = next(iter(hits.items()))
+        return label, min(KEYWORD_MAX_CONFIDENCE, KEYWORD_BASE_CONFIDENCE + KEYWORD_STEP_CONFIDENCE * (count - 1))
+
+    async def classify_by_examples(self, text: str) -> tuple[Optional[str], float]:
+        if self._example_vectors is None:
+            return None, 0.0
+        embedding_model = EmbeddingModelBase().get_model()
+        query = self._normalize(np.asarray(await embedding_model.aembed_query(text), dtype=np.float32))
+        similarities = self._example_vectors @ query
+        top = np.argsort(-similarities)[:self.top_k]
+        votes = Counter()
+        for idx in top:
+            votes[self._example_labels[idx]] += float(max(similarities[idx], 0.0))
+        total = sum(votes.values())
+        if not total:
+            return None, 0.0
+        label, weight = votes.most_common(1)[0]
+        best_similarity = max(float(similarities[idx]) for idx in top if self._example_labels[idx] == label)
+        # 置信度 = 投票占比 × 该类别最高相似度
+        return label, (weight / total) * best_similarity
+
+    async def classify(self, text: str) -> tuple[Optional[str], float, str]:
+        """
+        返回 (label, confidence, source)，source 为 keyword / knn
+        置信度低于阈值时 label 仍返回最佳猜测，供与 LLM 结果对比
+        """
+        label, confidence = self.classify_by_keywords(text)
+        if label and confidence >= self.threshold:
+            return label, confidence, "keyword"
+        try:
+            knn_label, knn_confidence = await self.classify_by_examples(text)
+        except Exception as e:
+            print(f"快速路由最近邻匹配失败: {e}")
+            knn_label, knn_confidence = None, 0.0
+        if knn_confidence > confidence:
+            return knn_label, knn_confidence, "knn"
+        return label, confidence, "keyword"
+
+    async def route(
+            self,
+            text: str,
+            llm_route: Callable[[], Awaitable[str]],
+            on_llm_fallback: Optional[Callable[[], None]] = None,
+    ) -> str:
+        """
+        Args:
+            text: 用户输入
+            llm_route: 调用 LLM 路由的协程函数，只在本地置信度不足时调用
+            on_llm_fallback: 确定要走 LLM 路由时的回调 (用于启动投机执行)
+        """
+        label, confidence, source = await self.classify(text)
+        if label and confidence >= self.threshold:
+            self.counters[f"fast_{source}"] += 1
+            if self.shadow_rate and random.random() < self.shadow_rate:
+                # 抽样调用 LLM 复核快速路径，不阻塞当前请求
+                spawn(self._shadow_check(label, llm_route))
+            return label
+
+        self.counters["llm"] += 1
+        if on_llm_fallback:
+            on_llm_fallback()
+        llm_label = await llm_route()
+        if label:
+            self.counters["llm_compared"] += 1
+            self.counters["llm_agree"] += int(label == llm_label)
+        return llm_label
+
+    async def _shadow_check(self, label: str, llm_route: Callable[[], Awaitable[str]]):
+        try:
+            # 抽样复核不影响用户请求，使用最低优先级
+            with llm_priority(Priority.BACKGROUND):
+                llm_label = await llm_route()
+        except Exception as e:
+            print(f"快速路由抽样复核失败: {e}")
+            return
+        self.counters["shadow_checked"] += 1
+        self.counters["shadow_agree"] += int(label == llm_label)
+
+    def stats(self) -> dict:
+        fast = self.counters["fast_keyword"] + self.counters["fast_knn"]
+        total = fast + self.counters["llm"]
+        return {
+            "threshold": self.threshold,
+            "examples": len(self._example_labels),
+            "total": total,
+            "fast_keyword": self.counters["fast_keyword"],
+            "fast_knn": self.counters["fast_knn"],
+            "llm": self.counters["llm"],
+            "fast_hit_rate": fast / total if total else 0.0,
+            # 快速路径抽样复核时与 LLM 的一致率
+            "shadow_agreement": (self.counters["shadow_agree"] / self.counters["shadow_checked"]
+                                 if self.counters["shadow_checked"] else None),
+            # 低于阈值时本地最佳猜测与 LLM 的一致率，用于判断阈值是否过高
+            "below_threshold_agreement": (self.counters["llm_agree"] / self.counters["llm_compared"]
+                                          if self.counters["llm_compared"] else None),
+        }
+
+
+# 实例化单例
+intent_router = IntentRouter()
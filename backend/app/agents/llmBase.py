@@ -1,10 +1,15 @@
-from typing import Optional
+from typing import Optional, Type, TypeVar
 
+from langchain_core.exceptions import OutputParserException
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AnyMessage
-from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
 
+from .clientRegistry import client_registry
 from ..core.config import get_settings
+from ..utils.instrumentation import record_llm_parse_failure, record_llm_escalation
+
+T = TypeVar("T", bound=BaseModel)
 
 
 class LLMBase:
@@ -16,25 +21,63 @@ class LLMBase:
             temperature: float = 0.7,
             max_tokens: Optional[int] = None,
             timeout: Optional[int] = None,
+            tier: str = "large",
             **kwargs
     ):
         setting = get_settings()
-        self.model = model or setting.llm_model
+        self.tier = tier
         self.temperature = temperature or setting.temperature
-        self.max_tokens = max_tokens or setting.max_tokens
         self.timeout = timeout or setting.llm_timeout
         self.kwargs = kwargs
-        self.api_key = api_key or setting.llm_api_key
-        self.base_url = base_url or setting.llm_base_url
+        if tier == "small":
+            # 小模型未单独配置的项回退到默认模型配置
+            self.model = model or setting.llm_small_model or setting.llm_model
+            self.max_tokens = max_tokens or setting.llm_small_max_tokens
+            self.api_key = api_key or setting.llm_small_api_key or setting.llm_api_key
+            self.base_url = base_url or setting.llm_small_base_url or setting.llm_base_url
+        else:
+            self.model = model or setting.llm_model
+            self.max_tokens = max_tokens or setting.max_tokens
+            self.api_key = api_key or setting.llm_api_key
+            self.base_url = base_url or setting.llm_base_url
         self.client = self.__create_client()
 
+    @classmethod
+    def for_node(cls, node: str, **kwargs) -> "LLMBase":
+        """按 Settings.llm_node_tiers 为图节点选择模型层级"""
+        return cls(tier=get_settings().llm_node_tiers.get(node, "large"), **kwargs)
+
     def __create_client(self) -> BaseChatModel:
-        return ChatOpenAI(
+        # 从进程级注册表获取共享客户端，相同配置复用同一个连接池
+        return client_registry.get_llm(
             model=self.model,
             api_key=self.api_key,
             base_url=self.base_url,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
             timeout=self.timeout,
+            tier=self.tier,
+        )
+
+    def _can_escalate(self) -> bool:
+        setting = get_settings()
+        return (
+                setting.llm_escalate_on_parse_error
+                and self.tier != "large"
+                and (self.model, self.base_url) != (setting.llm_model, setting.llm_base_url)
         )
 
+    async def ainvoke_structured(self, schema: Type[T], messages: list[AnyMessage]) -> T:
+        """
+        结构化输出调用，小模型解析失败时按配置升级到大模型重试一次
+        """
+        result = await self.client.with_structured_output(schema, include_raw=True).ainvoke(messages)
+        if result["parsing_error"] is None and result["parsed"] is not None:
+            return result["parsed"]
+
+        record_llm_parse_failure(self.tier, self.model)
+        if not self._can_escalate():
+            raise result["parsing_error"] or OutputParserException(f"模型 {self.model} 未返回 {schema.__name__} 结构化结果")
+        print(f"模型 {self.model} 结构化输出解析失败，升级到大模型重试: {result['parsing_error']}")
+        record_llm_escalation(self.tier, self.model)
+        return await LLMBase(tier="large").ainvoke_structured(schema, messages)
@@ -0,0 +1,50 @@
+"""按模型层级 (small / large) 汇总 LLM 调用的延迟与 token 消耗
+
+不单独计数，直接从 /metrics 的 Prometheus 指标 (utils/instrumentation.py) 按 tier 聚合，
+两处口径始终一致。延迟均值由直方图 sum / count 得到，p95 由分桶插值估算。
+"""
+from collections import defaultdict
+from typing import Optional
+
+from ..utils.instrumentation import LLM_DURATION, LLM_TOKENS, LLM_PARSE_FAILURES, LLM_ESCALATIONS
+
+
+def _sum_by_tier(counter, kind: Optional[str] = None) -> dict[str, float]:
+    """按 tier 汇总计数器；kind 不为空时只统计该 kind (prompt / completion)"""
+    tier_idx = counter.labelnames.index("tier")
+    kind_idx = counter.labelnames.index("kind") if kind else None
+    totals = defaultdict(float)
+    for labels, value in counter.values().items():
+        if kind is None or labels[kind_idx] == kind:
+            totals[labels[tier_idx]] += value
+    return totals
+
+
+def tier_stats() -> dict:
+    tier_idx, model_idx = LLM_DURATION.labelnames.index("tier"), LLM_DURATION.labelnames.index("model")
+    models = defaultdict(set)
+    for labels in LLM_DURATION.label_sets():
+        models[labels[tier_idx]].add(labels[model_idx])
+    input_tokens = _sum_by_tier(LLM_TOKENS, "prompt")
+    output_tokens = _sum_by_tier(LLM_TOKENS, "completion")
+    parse_failures = _sum_by_tier(LLM_PARSE_FAILURES)
+    escalations = _sum_by_tier(LLM_ESCALATIONS)
+
+    stats = {}
+    for tier in models.keys() | parse_failures.keys() | escalations.keys():
+        counts, total = LLM_DURATION.aggregate(lambda labels: labels[tier_idx] == tier)
+        calls = sum(counts)
+        p95 = LLM_DURATION.quantile(counts, 0.95)
+        tokens_in, tokens_out = int(input_tokens[tier]), int(output_tokens[tier])
+        stats[tier] = {
+            "models": sorted(models[tier]),
+            "calls": calls,
+            "latency_avg_ms": total / calls * 1000 if calls else None,
+            "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+            "input_tokens": tokens_in,
+            "output_tokens": tokens_out,
+            "avg_tokens_per_call": (tokens_in + tokens_out) / calls if calls else None,
+            "parse_failures": int(parse_failures[tier]),
+            "escalations": int(escalations[tier]),
+        }
+    return stats
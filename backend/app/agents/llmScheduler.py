@@ -0,0 +1,298 @@
+"""全局 LLM 准入调度
+
+所有 LLMBase 客户端的调用都经过这里：
+- 按模型限制在途请求数，超出的请求按优先级排队 (路由 > 交互式回答 > 后台任务)
+- 收到 429 时按 AIMD 调整并发上限，并遵守 Retry-After 暂停派发
+- 连接错误 / 5xx 按指数退避 (带随机抖动) 后重试，退避不超过请求截止时间
+- 预估排队时间超过请求截止时间时提前拒绝，避免无意义的等待
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Optional, Awaitable, Callable, Any
+
+import openai
+from langchain_openai import ChatOpenAI
+
+from ..core.config import get_settings
+from ..utils.backgroundTasks import request_scoped
+from ..utils.instrumentation import record_llm_call, record_llm_error
+
+
+class Priority(IntEnum):
+    ROUTING = 0  # 路由等廉价调用
+    INTERACTIVE = 1  # 用户正在等待的回答
+    BACKGROUND = 2  # 抽样复核、摘要等后台任务
+
+
+class LLMOverloadedError(Exception):
+    """预估排队时间超过请求截止时间"""
+
+
+_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.INTERACTIVE)
+# 后台任务 (记忆摘要、抽样复核、答案缓存写入) 不受发起请求的截止时间约束
+_deadline: ContextVar[Optional[float]] = request_scoped(ContextVar("llm_deadline", default=None))
+
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """在该上下文内发起的 LLM 调用使用指定优先级"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_request_deadline(seconds: Optional[float] = None):
+    """设置当前请求的截止时间 (相对当前时刻的秒数)，对之后的所有 LLM 调用生效"""
+    seconds = seconds if seconds is not None else get_settings().llm_request_deadline
+    _deadline.set(time.monotonic() + seconds)
+
+
+def _retry_after(error: openai.RateLimitError) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ModelLane:
+    """单个模型的并发控制与优先级队列"""
+
+    def __init__(self, model: str, max_concurrency: int, min_concurrency: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatch_handle: Optional[asyncio.TimerHandle] = None
+        # 单次调用耗时的指数滑动平均，用于预估排队时间
+        self.avg_service_time = 2.0
+        self.wait_times = deque(maxlen=1000)
+        self.counters = Counter()
+
+    def queue_depth(self) -> dict:
+        depth = Counter(Priority(p).name for p, _, f in self._queue if not f.done())
+        return {p.name: depth.get(p.name, 0) for p in Priority}
+
+    def _estimate_wait(self, priority: Priority) -> float:
+        ahead = sum(1 for p, _, f in self._queue if p <= priority and not f.done())
+        pause = max(0.0, self.paused_until - time.monotonic())
+        return pause + (ahead + 1) / max(self.limit, 1.0) * self.avg_service_time
+
+    def _can_dispatch(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.min_concurrency) and time.monotonic() >= self.paused_until
+
+    def _dispatch(self):
+        self._dispatch_handle = None
+        while self._queue and self._can_dispatch():
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+        # 处于 Retry-After 暂停期时，到期后再派发
+        if self._queue and self._dispatch_handle is None:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                self._dispatch_handle = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: Priority, deadline: Optional[float]):
+        start = time.monotonic()
+        if not self._queue and self._can_dispatch():
+            self.in_flight += 1
+            self.wait_times.append(0.0)
+            return
+        if deadline is not None and start + self._estimate_wait(priority) > deadline:
+            self.counters["rejected"] += 1
+            raise LLMOverloadedError(f"模型 {self.model} 排队时间预计超过请求截止时间")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), future))
+        self._dispatch()
+        try:
+            if deadline is not None:
+                await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - time.monotonic(), 0))
+            else:
+                await future
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            self.counters["timeout"] += 1
+            raise LLMOverloadedError(f"模型 {self.model} 排队超过请求截止时间")
+        except BaseException:
+            self._abandon(future)
+            raise
+        self.wait_times.append(time.monotonic() - start)
+
+    def _abandon(self, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # 已经拿到名额但调用方放弃了，归还名额
+            self.release()
+        else:
+            future.cancel()
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def on_success(self, duration: float):
+        self.counters["completed"] += 1
+        self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * duration
+        # 加性增：每完成一轮 (limit 次) 调用，上限 +1
+        self.limit = min(float(self.max_concurrency), self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_rate_limited(self, retry_after: Optional[float]):
+        self.counters["rate_limited"] += 1
+        # 乘性减
+        self.limit = max(float(self.min_concurrency), self.limit / 2)
+        pause = retry_after if retry_after is not None else get_settings().llm_default_retry_after
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        return {
+            "limit": round(self.limit, 2),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+            "avg_service_time": self.avg_service_time,
+            "wait_avg_ms": sum(waits) / len(waits) * 1000 if waits else None,
+            "wait_p95_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else None,
+            **{k: self.counters[k] for k in ("completed", "rate_limited", "rejected", "timeout", "retried")},
+        }
+
+
+class LLMScheduler:
+    def __init__(self):
+        self.settings = get_settings()
+        self._lanes: dict[str, ModelLane] = {}
+
+    def lane(self, model: str) -> ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = ModelLane(model, self.settings.llm_max_concurrency, self.settings.llm_min_concurrency)
+            self._lanes[model] = lane
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """占用一个调用名额，退出时归还；429 会触发该模型的降速"""
+        lane = self.lane(model)
+        await lane.acquire(_priority.get(), _deadline.get())
+        start = time.monotonic()
+        try:
+            yield lane
+        except openai.RateLimitError as e:
+            lane.on_rate_limited(_retry_after(e))
+            raise
+        else:
+            lane.on_success(time.monotonic() - start)
+        finally:
+            lane.release()
+
+    async def backoff(self, attempt: int) -> bool:
+        """
+        连接错误 / 5xx 后的重试等待：full jitter 指数退避，避免上游故障时所有排队请求同时重试
+        Returns:
+            False 表示等待后会超过请求截止时间，不应再重试
+        """
+        delay = random.uniform(0, min(self.settings.llm_retry_backoff_max,
+                                      self.settings.llm_retry_backoff_base * 2 ** attempt))
+        deadline = _deadline.get()
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    async def run(self, model: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """排队执行一次调用，429 与连接类错误时在截止时间内重新排队重试"""
+        retries = self.settings.llm_rate_limit_retries
+        for attempt in range(retries + 1):
+            try:
+                async with self.slot(model):
+                    return await call()
+            except openai.RateLimitError:
+                # 429 由 lane 的 Retry-After 暂停统一控制派发节奏
+                if attempt >= retries:
+                    raise
+                self.lane(model).counters["retried"] += 1
+            except (openai.APIConnectionError, openai.InternalServerError):
+                if attempt >= retries or not await self.backoff(attempt):
+                    raise
+                self.lane(model).counters["retried"] += 1
+
+    def stats(self) -> dict:
+        return {model: lane.stats() for model, lane in self._lanes.items()}
+
+
+# 实例化单例
+llm_scheduler = LLMScheduler()
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """所有请求都经过 llm_scheduler 排队的 ChatOpenAI，并按层级记录延迟与 token 消耗"""
+
+    tier: str = "large"
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._agenerate
+
+        async def call():
+            # 只统计实际调用耗时，不含排队等待
+            start = time.perf_counter()
+            try:
+                result = await parent(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception:
+                record_llm_error(self.tier, self.model_name)
+                raise
+            usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+            latency = time.perf_counter() - start
+            record_llm_call(self.tier, self.model_name, latency, usage)
+            return result
+
+        return await llm_scheduler.run(self.model_name, call)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        retries = llm_scheduler.settings.llm_rate_limit_retries
+        for attempt in range(retries + 1):
+            yielded = False
+            try:
+                # 流式调用在整个生成过程中占用名额
+                async with llm_scheduler.slot(self.model_name):
+                    start = time.perf_counter()
+                    usage = None
+                    async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        yielded = True
+                        # stream_usage=True 时最后一个 chunk 携带 token 用量
+                        usage = getattr(chunk.message, "usage_metadata", None) or usage
+                        yield chunk
+                    latency = time.perf_counter() - start
+                    record_llm_call(self.tier, self.model_name, latency, usage)
+                return
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+                record_llm_error(self.tier, self.model_name)
+                # 已经向前端输出过 token 的流无法重放，只能向上抛出
+                if yielded or attempt >= retries:
+                    raise
+                if not isinstance(e, openai.RateLimitError) and not await llm_scheduler.backoff(attempt):
+                    raise
+                llm_scheduler.lane(self.model_name).counters["retried"] += 1
+            except LLMOverloadedError:
+                # 排队被拒绝，没有发出调用
+                raise
+            except Exception:
+                record_llm_error(self.tier, self.model_name)
+                raise
@@ -0,0 +1,121 @@
+"""进程内 CPU 嵌入模型 (ONNX Runtime)
+
+embedding_type = "onnx" 时使用，embedding_model 填本地模型目录 (包含导出的 ONNX 模型与 tokenizer.json)。
+查询向量经过 MicroBatcher：几毫秒内并发到达的 aembed_query 合并为一次批量前向计算；
+文档向量本身就是批量调用，按 max_batch_size 切块直接计算。
+查询与文档使用各自的推理线程池，入库时的大批量文档不会让在线查询排队等待。
+依赖 onnxruntime 与 tokenizers (可选依赖，使用该后端时才需要安装)。
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..core.config import get_settings
+from ..utils.microBatcher import MicroBatcher
+
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model_dir: str):
+        settings = get_settings()
+        self.model_dir = Path(model_dir)
+        self.model_file = settings.embedding_onnx_file
+        self.max_length = settings.embedding_max_length
+        self.intra_op_threads = settings.embedding_intra_op_threads
+        self.max_batch_size = settings.embedding_batch_max_size
+        self._session = None
+        self._tokenizer = None
+        self._input_names: set[str] = set()
+        self._load_lock = threading.Lock()
+        # 推理线程数即同时进行的批次数；单个批次内部由 onnxruntime 的 intra-op 线程并行
+        self.executor = ThreadPoolExecutor(max_workers=settings.embedding_inference_workers, thread_name_prefix="onnx-embed")
+        # 文档向量化单独一个线程池，onnxruntime 的 InferenceSession 支持多线程并发 run
+        self.document_executor = ThreadPoolExecutor(
+            max_workers=settings.embedding_document_workers, thread_name_prefix="onnx-embed-docs"
+        )
+        self.batcher = MicroBatcher(
+            name="onnx_query",
+            process=self._encode,
+            executor=self.executor,
+            max_batch_size=settings.embedding_batch_max_size,
+            max_wait_ms=settings.embedding_batch_max_wait_ms,
+        )
+
+    def _load(self):
+        if self._session is not None:
+            return
+        with self._load_lock:
+            if self._session is None:
+                self._load_model()
+
+    def _load_model(self):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_length)
+        # 按批内最长文本补齐，而不是固定补到 max_length
+        tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = onnxruntime.InferenceSession(
+            str(self.model_dir / self.model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in session.get_inputs()}
+        self._tokenizer = tokenizer
+        self._session = session
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        """一次前向计算完成整批向量化 (在线程池中执行)"""
+        self._load()
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        output = self._session.run(None, feeds)[0]
+
+        if output.ndim == 3:
+            # last_hidden_state：按 attention_mask 做均值池化
+            mask = attention_mask[..., None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.clip(norms, 1e-12, None)).tolist()
+
+    def _encode_chunked(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.max_batch_size):
+            vectors.extend(self._encode(texts[i:i + self.max_batch_size]))
+        return vectors
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.batcher.submit(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return await asyncio.get_running_loop().run_in_executor(self.document_executor, self._encode_chunked, texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._encode_chunked(texts)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "onnx",
+            "model_dir": str(self.model_dir),
+            "loaded": self._session is not None,
+            "intra_op_threads": self.intra_op_threads,
+            **self.batcher.stats(),
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.document_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,93 @@
+"""CPU 交叉编码器重排序模型
+
+对 (query, chunk) 对做一次批量前向计算，只保留 top-k / 分数超过阈值的分片，
+减少送入回答 LLM 的上下文 token。依赖 sentence-transformers (可选依赖，启用重排序时才需要安装)。
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from ..core.config import get_settings
+
+
+class RerankModelBase:
+    def __init__(self):
+        settings = get_settings()
+        self.model_name = settings.rerank_model
+        self.top_k = settings.rerank_top_k
+        self.score_threshold = settings.rerank_score_threshold
+        self.max_length = settings.rerank_max_length
+        self._model = None
+        self._lock = asyncio.Lock()
+        # 最近若干批次的耗时，用于和节省的 LLM token 对比调参
+        self._latencies = deque(maxlen=1000)
+        self.batches = 0
+        self.docs_in = 0
+        self.docs_out = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def _load_model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu", max_length=self.max_length)
+        return self._model
+
+    async def rerank(self, query: str, documents: list[str]) -> list[tuple[int, float]]:
+        """
+        Returns:
+            按分数降序排列、经过 top-k 与阈值过滤后的 [(原始下标, 分数)]
+        """
+        if not documents:
+            return []
+        async with self._lock:
+            # 首次调用时在线程中加载模型，避免阻塞事件循环
+            model = await asyncio.to_thread(self._load_model)
+        start = time.perf_counter()
+        # 一次前向计算完成整批打分，推理放到线程池中执行
+        scores = await asyncio.to_thread(
+            model.predict,
+            [(query, doc) for doc in documents],
+            batch_size=len(documents),
+            show_progress_bar=False,
+        )
+        latency = time.perf_counter() - start
+
+        ranked = sorted(enumerate(float(s) for s in scores), key=lambda x: x[1], reverse=True)
+        if self.score_threshold is not None:
+            ranked = [(i, s) for i, s in ranked if s >= self.score_threshold]
+        ranked = ranked[:self.top_k]
+
+        self._latencies.append(latency)
+        self.batches += 1
+        self.docs_in += len(documents)
+        self.docs_out += len(ranked)
+        self.chars_in += sum(len(d) for d in documents)
+        self.chars_out += sum(len(documents[i]) for i, _ in ranked)
+        return ranked
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "model": self.model_name,
+            "top_k": self.top_k,
+            "score_threshold": self.score_threshold,
+            "batches": self.batches,
+            "latency_avg_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+            "latency_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+            "docs_in": self.docs_in,
+            "docs_out": self.docs_out,
+            # 被过滤掉的上下文字符数，近似为节省的回答 LLM 输入 token
+            "context_chars_saved": self.chars_in - self.chars_out,
+        }
+
+
+_rerank_model: Optional[RerankModelBase] = None
+
+
+def get_rerank_model() -> RerankModelBase:
+    global _rerank_model
+    if _rerank_model is None:
+        _rerank_model = RerankModelBase()
+    return _rerank_model
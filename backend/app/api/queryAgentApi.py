@@ -1,12 +1,27 @@
-from fastapi import APIRouter
-from langchain_core.messages import HumanMessage
+import json
+
+from fastapi import APIRouter, File, Form, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage, AIMessageChunk
 from langgraph.types import Command
 
+from backend.app.agents.llmScheduler import set_request_deadline
 from backend.app.graph.graph import get_graph
-from backend.app.models.frontModels import FrontUserQuery, FrontUserQueryInterrupt
+from backend.app.models.frontModels import FrontUserQuery, FrontUserQueryInterrupt, ChatStreamEvent
 
 router = APIRouter()
 
+# 需要把 token 流式推给前端的回答节点
+ANSWER_NODES = {"info_query_node", "academic_query_node"}
+
+# 成绩上传与其确认必须使用同一个教师身份，才能落在同一个 thread 上恢复中断
+UPLOAD_USER_INFO = {
+    'uid': 1,
+    'role': 'teacher',
+    'name': '教师',
+}
+
 
 @router.post("/chat")
 async def userQuery(user_query: FrontUserQuery):
@@ -19,6 +34,7 @@ async def userQuery(user_query: FrontUserQuery):
     }
     graph = get_graph()
     config = {"configurable": {"thread_id": f"{user_info['uid']}-{user_info['role']}"}}
+    set_request_deadline()
     response = await graph.ainvoke(
         {
             "messages": [HumanMessage(query_text)],
@@ -40,8 +56,123 @@ async def userQueryInterrupt(user_query: FrontUserQueryInterrupt):
     }
     graph = get_graph()
     config = {"configurable": {"thread_id": f"{user_info['uid']}-{user_info['role']}"}}
+    set_request_deadline()
+    response = await graph.ainvoke(
+        Command(resume=user_query.resume_data),
+        config=config
+    )
+    return response
+
+
+@router.post("/chat/upload")
+async def userQueryUpload(chat_text: str = Form(...), file: UploadFile = File(...)):
+    """带文件的对话 (如教师上传期末成绩表)，文件内容以 bytes 传入图状态"""
+    user_info = UPLOAD_USER_INFO
+    graph = get_graph()
+    config = {"configurable": {"thread_id": f"{user_info['uid']}-{user_info['role']}"}}
+    set_request_deadline()
+    response = await graph.ainvoke(
+        {
+            "messages": [HumanMessage(chat_text)],
+            "user_info": user_info,
+            "file_name": file.filename,
+            "file_content": await file.read()
+        },
+        config=config
+    )
+    return response
+
+
+@router.post("/chat/upload/interrupt")
+async def userQueryUploadInterrupt(user_query: FrontUserQueryInterrupt):
+    """教师确认 / 取消成绩上传，恢复 /chat/upload 所在 thread 上的中断"""
+    user_info = UPLOAD_USER_INFO
+    graph = get_graph()
+    config = {"configurable": {"thread_id": f"{user_info['uid']}-{user_info['role']}"}}
+    set_request_deadline()
     response = await graph.ainvoke(
         Command(resume=user_query.resume_data),
         config=config
     )
     return response
+
+
+def _to_sse(event: ChatStreamEvent) -> str:
+    data = json.dumps(jsonable_encoder(event.data), ensure_ascii=False)
+    return f"event: {event.event}\ndata: {data}\n\n"
+
+
+async def _stream_graph(graph, graph_input, config):
+    """
+    将 graph.astream 的输出转换为 SSE 事件流：
+    - updates 模式: 节点完成进度 (路由结果、检索完成、中断)
+    - messages 模式: 回答节点中 LLM 生成的 token
+    subgraphs=True 是为了拿到 AgentBase 内部嵌套 agent 的 token
+    """
+    # 在生成器内设置，保证截止时间作用于实际执行图的上下文
+    set_request_deadline()
+    try:
+        async for namespace, mode, chunk in graph.astream(
+                graph_input,
+                config=config,
+                stream_mode=["updates", "messages"],
+                subgraphs=True,
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                # 嵌套 agent 的 namespace 形如 ("info_query_node:<task_id>",)
+                node = namespace[0].split(":")[0] if namespace else metadata.get("langgraph_node")
+                if node in ANSWER_NODES and isinstance(message, AIMessageChunk) and message.content:
+                    yield _to_sse(ChatStreamEvent(event="token", data={"node": node, "content": message.content}))
+                continue
+
+            # 只关心主图的节点进度，嵌套 agent 内部的 model/tools 节点忽略
+            if namespace:
+                continue
+            for node, update in chunk.items():
+                if node == "__interrupt__":
+                    yield _to_sse(ChatStreamEvent(event="interrupt", data=[i.value for i in update]))
+                elif node == "router_node":
+                    yield _to_sse(ChatStreamEvent(event="route", data={"intent": (update or {}).get("intent")}))
+                elif node == "retrieve_node":
+                    results = (update or {}).get("rag_query_results") or []
+                    yield _to_sse(ChatStreamEvent(event="retrieval", data={"count": len(results)}))
+                else:
+                    yield _to_sse(ChatStreamEvent(event="node", data={"node": node}))
+
+        state = await graph.aget_state(config)
+        messages = state.values.get("messages") or []
+        yield _to_sse(ChatStreamEvent(event="done", data={
+            "answer": messages[-1].content if messages and not state.interrupts else None,
+            "structured_data": state.values.get("structured_data"),
+            "intent": state.values.get("intent"),
+        }))
+    except Exception as e:
+        print(f"流式对话出错: {e}")
+        yield _to_sse(ChatStreamEvent(event="error", data={"message": str(e)}))
+
+
+@router.post("/chat/stream")
+async def userQueryStream(user_query: FrontUserQuery):
+    query_text = user_query.chat_text
+    user_info = {
+        'uid': 1,
+        'role': 'student',
+        'name': '李逍遥',
+    }
+    graph = get_graph()
+    # stream_tokens: 回答节点不与其他请求合并生成，保证本请求能收到 token 事件
+    config = {"configurable": {"thread_id": f"{user_info['uid']}-{user_info['role']}", "stream_tokens": True}}
+    graph_input = {
+        "messages": [HumanMessage(query_text)],
+        "user_info": user_info,
+        "file_content": user_query.file
+    }
+    return StreamingResponse(
+        _stream_graph(graph, graph_input, config),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 禁止 nginx 缓冲，保证首字节尽快到达
+        }
+    )
@@ -0,0 +1,109 @@
+from fastapi import APIRouter
+
+from backend.app.agents.agentBase import get_agent_cache
+from backend.app.agents.agentPrompts import prompt_fingerprints
+from backend.app.agents.clientRegistry import client_registry
+from backend.app.agents.embeddingCache import embedding_cache_stats
+from backend.app.agents.intentRouter import intent_router
+from backend.app.agents.llmMetrics import tier_stats
+from backend.app.agents.llmScheduler import llm_scheduler
+from backend.app.agents.rerankModelBase import get_rerank_model
+from backend.app.graph.infoGraphNodes import rewrite_flight, retrieve_flight, answer_flight
+from backend.app.graph.speculation import speculation_manager
+from backend.app.services.classroomIndex import classroom_index
+from backend.app.services.eventSync import get_event_sync
+from backend.app.services.qdrantSchema import schema_reconciler
+from backend.app.services.timetableIndex import timetable_index
+from backend.app.services.toolCache import tool_cache
+
+status_router = APIRouter()
+
+
+@status_router.get("/status/clients")
+async def clientStatus():
+    """LLM / 嵌入模型客户端与连接池统计"""
+    return client_registry.stats()
+
+
+@status_router.get("/status/agents")
+async def agentStatus():
+    """预编译 agent 缓存统计"""
+    return get_agent_cache().stats()
+
+
+@status_router.get("/status/router")
+async def routerStatus():
+    """快速路由命中率与 LLM 一致率"""
+    return intent_router.stats()
+
+
+@status_router.get("/status/embeddings")
+async def embeddingStatus():
+    """嵌入向量缓存命中率"""
+    return embedding_cache_stats()
+
+
+@status_router.get("/status/reranker")
+async def rerankerStatus():
+    """重排序批次耗时与过滤掉的上下文量"""
+    return get_rerank_model().stats()
+
+
+@status_router.get("/status/speculation")
+async def speculationStatus():
+    """投机改写节省与浪费的时间"""
+    return speculation_manager.stats()
+
+
+@status_router.get("/status/singleflight")
+async def singleFlightStatus():
+    """请求合并统计"""
+    return [flight.stats() for flight in (rewrite_flight, retrieve_flight, answer_flight)]
+
+
+@status_router.get("/status/llm")
+async def llmStatus():
+    """LLM 调度队列深度、等待时间与限流情况"""
+    return llm_scheduler.stats()
+
+
+@status_router.get("/status/tiers")
+async def tierStatus():
+    """small / large 模型层级的延迟、token 消耗与升级次数"""
+    return tier_stats()
+
+
+@status_router.get("/status/prompts")
+async def promptStatus():
+    """各 agent 静态前缀的指纹，部署之间变化说明前缀缓存会失效"""
+    return prompt_fingerprints()
+
+
+@status_router.get("/status/toolcache")
+async def toolCacheStatus():
+    """成绩 / 课表工具结果缓存命中率与失效次数"""
+    return tool_cache.stats()
+
+
+@status_router.get("/status/timetable")
+async def timetableStatus():
+    """课表索引已加载的学生数与重建次数"""
+    return timetable_index.stats()
+
+
+@status_router.get("/status/classrooms")
+async def classroomStatus():
+    """教室占用索引规模、冲突数与重建耗时"""
+    return classroom_index.stats()
+
+
+@status_router.get("/status/eventsync")
+async def eventSyncStatus():
+    """campus_events 增量同步的处理量与最近一轮情况"""
+    return get_event_sync().stats()
+
+
+@status_router.get("/status/qdrant")
+async def qdrantSchemaStatus():
+    """Qdrant 集合结构最近一次校正执行的变更"""
+    return schema_reconciler.stats()
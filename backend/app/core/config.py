@@ -1,6 +1,6 @@
 """配置管理模块"""
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 
 from pydantic import computed_field
 from pydantic_settings import BaseSettings
@@ -27,11 +27,145 @@ class Settings(BaseSettings):
     max_tokens: int = 4096
     temperature: float = 0.7
 
+    # 分层模型配置：路由 / 查询改写 / 请假信息抽取只产出很小的结构化结果，使用小模型
+    llm_small_model: str = ""  # 为空时回退到 llm_model
+    llm_small_api_key: str = ""  # 为空时回退到 llm_api_key
+    llm_small_base_url: str = ""  # 为空时回退到 llm_base_url
+    llm_small_max_tokens: int = 512
+    llm_node_tiers: Dict[str, str] = {
+        "router_node": "small",
+        "rewrite_query_node": "small",
+        "admin_leave_node": "small",
+        "memory_summary": "small",
+    }  # 未列出的节点使用 large
+    llm_escalate_on_parse_error: bool = True  # 小模型结构化输出解析失败时升级到大模型重试
+
+    # 本地快速路由配置
+    router_fast_threshold: float = 0.8  # 本地置信度达到该值时跳过 LLM 路由
+    router_knn_top_k: int = 5
+    router_shadow_sample_rate: float = 0.05  # 快速路径抽样交给 LLM 复核的比例
+
+    # RAG 语义答案缓存
+    answer_cache_enabled: bool = True
+    answer_cache_collection: str = "answer_cache"
+    answer_cache_threshold: float = 0.92  # 问题向量相似度达到该值才直接复用答案
+    answer_cache_ttl: int = 7 * 24 * 3600
+    answer_cache_sweep_interval: int = 3600  # 过期答案的后台删除间隔(秒)
+
+    # 检索配置
+    retrieval_mode: str = "dense"  # dense: 仅向量检索; hybrid: 稠密 + 稀疏(BM25) 向量 RRF 融合
+    dense_vector_name: str = ""  # 稠密向量名，空字符串表示 Qdrant 默认的未命名向量
+    sparse_vector_name: str = "sparse"
+    sparse_avg_doc_len: float = 600.0  # 分片平均词项数，用于 BM25 长度归一化
+    retrieval_limit: int = 10  # dense 模式返回条数
+    hybrid_prefetch_limit: int = 20  # hybrid 模式每一路召回条数
+    hybrid_limit: int = 5  # hybrid 模式融合后返回条数
+
+    # 重排序配置 (CPU 交叉编码器，需要安装 sentence-transformers)
+    rerank_enabled: bool = False
+    rerank_model: str = "BAAI/bge-reranker-base"
+    rerank_top_k: int = 3
+    rerank_score_threshold: Optional[float] = None  # 低于该分数的分片丢弃，None 表示只按 top_k 截断
+    rerank_max_length: int = 512
+
+    # 知识库入库配置
+    ingestion_batch_size: int = 64  # 每批向量化 / upsert 的分片数
+    ingestion_concurrency: int = 4  # 同时进行的批次数
+    ingestion_chunk_size: int = 500  # 分片最大字符数
+    ingestion_chunk_overlap: int = 50  # 相邻分片重叠字符数
+
+    # 投机执行：路由走 LLM 时并行启动 RAG 查询改写
+    speculative_rewrite: bool = False
+    speculative_embed_hyde: bool = True  # 改写完成后顺带预热 HyDE 向量
+
+    # 单飞请求合并 (改写 / 检索 / 回答)
+    single_flight_enabled: bool = True
+    single_flight_redis: bool = False  # 通过 Redis 锁在多个 worker 之间去重
+    single_flight_lock_ttl: int = 30
+    single_flight_result_ttl: int = 10
+
+    # 对话记忆
+    memory_keep_turns: int = 6  # 原样保留的最近轮数
+    memory_summarize_batch_turns: int = 4  # 超出保留窗口的轮数攒够该值才触发一次摘要，避免每轮都调用 LLM
+    memory_history_token_budget: int = 3000  # 送入 agent 的历史消息 token 预算 (近似计数)
+    memory_summary_lock_ttl: int = 120
+
+    # 教务工具结果缓存 (成绩 / 课表)
+    tool_cache_enabled: bool = True
+    tool_cache_ttl: int = 6 * 3600
+    tool_cache_warm_up: bool = False  # 启动及学期切换时为当前学期所有选课学生预热缓存
+    tool_cache_warm_concurrency: int = 8
+
+    # 课表索引
+    class_period_starts: List[str] = [
+        "08:00", "08:50", "10:00", "10:50", "14:00", "14:50", "16:00", "16:50", "19:00", "19:50", "20:40"
+    ]  # 第 1~n 节的开始时间
+    class_period_minutes: int = 45
+    timetable_fast_path: bool = True  # "下节课在哪" 等固定句式直接查课表索引回答，不经过 LLM
+    building_coordinates: Dict[str, List[float]] = {}  # 楼栋平面坐标 (米)，用于就近空教室排序，如 {"翡翠湖A": [0, 0]}
+
+    # 成绩批量上传
+    grade_upload_chunk_size: int = 1000  # 解析与校验的分块行数
+
+    # campus_events -> Qdrant 增量同步
+    event_collection: str = "campus_events"
+    event_sync_enabled: bool = False
+    event_sync_interval: float = 30.0  # 追平后两轮之间的间隔(秒)
+    event_sync_batch_size: int = 64
+    event_sync_max_batches: int = 20  # 每轮最多处理的批次数
+    event_sync_time_budget: float = 10.0  # 每轮时间预算(秒)，超出后下一轮继续
+    event_sync_lag_seconds: int = 2
+    event_search_limit: int = 10  # 讲座/活动查询在过滤后的候选集中语义排序取前 N 条
+
+    # Qdrant 集合结构 (payload 索引 / 量化 / HNSW)，见 services/qdrantSchema.py
+    qdrant_schema_reconcile: bool = True  # 启动时按声明校正已存在的集合
+    qdrant_schema_reconcile_lock_ttl: int = 300  # 启动校正锁的有效期(秒)，期间其他 worker 不再重复校正
+    qdrant_quantization: bool = True  # int8 标量量化，量化向量常驻内存
+    qdrant_quantization_quantile: float = 0.99
+    qdrant_rescore: bool = True  # 量化召回后用原始向量重新打分
+    qdrant_oversampling: float = 2.0  # 重打分前的过采样倍数
+    qdrant_vectors_on_disk: bool = True  # 原始向量放磁盘，只用于重打分
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 100
+    qdrant_hnsw_ef: int = 128  # 查询时的 ef，越大召回越高、延迟越高
+
+    # Prometheus 指标 (/metrics)
+    metrics_enabled: bool = True  # 记录各节点、LLM、嵌入、Qdrant、MySQL 的耗时与错误
+
+    # 预编译 agent 缓存 (LRU 上限)
+    agent_cache_size: int = 32
+
+    # LLM 准入调度
+    llm_max_concurrency: int = 16  # 每个模型的最大在途请求数
+    llm_min_concurrency: int = 1  # 429 降速时的并发下限
+    llm_request_deadline: float = 60.0  # 单个用户请求的截止时间(秒)，排队预计超时则提前拒绝
+    llm_rate_limit_retries: int = 3
+    llm_default_retry_after: float = 1.0  # 429 未携带 Retry-After 时的暂停时长(秒)
+    llm_retry_backoff_base: float = 0.5  # 连接错误 / 5xx 重试的指数退避基数(秒)，实际等待在 [0, base * 2^n] 内随机
+    llm_retry_backoff_max: float = 8.0  # 单次退避等待的上限(秒)
+
+    # HTTP 连接池配置 (LLM / 嵌入模型客户端共享)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+
     # 嵌入模型
     embedding_model: str = "nomic-embed-text"
     embedding_base_url: str = "http://localhost:11434"
-    embedding_type: str = "ollama"
+    embedding_type: str = "ollama"  # ollama: 远程 Ollama 服务; onnx: 进程内 CPU 推理，embedding_model 填本地模型目录
     embedding_api_key: str
+    # 嵌入向量缓存 (进程内 LRU + Redis)
+    embedding_cache_enabled: bool = True
+    embedding_cache_lru_size: int = 10000
+    embedding_cache_ttl: int = 7 * 24 * 3600
+    # 本地 ONNX 嵌入 (需要安装 onnxruntime 与 tokenizers)
+    embedding_onnx_file: str = "model.onnx"  # 模型目录下的 ONNX 文件名，同目录需有 tokenizer.json
+    embedding_max_length: int = 512
+    embedding_intra_op_threads: int = 4  # 单次前向计算使用的线程数
+    embedding_inference_workers: int = 1  # 同时进行的批次数
+    embedding_document_workers: int = 1  # 文档向量化 (入库) 独立使用的推理线程数
+    embedding_batch_max_size: int = 32  # 查询微批处理的最大批大小
+    embedding_batch_max_wait_ms: float = 5.0  # 凑批的最长等待时间
 
     # LangSmit配置
     langchain_api_key: str = ""
@@ -49,6 +183,11 @@ class Settings(BaseSettings):
     redis_cache_expire: int = 3600
     redis_port: int = 6379
 
+    # LangGraph Checkpoint配置 (Redis 持久化)
+    checkpoint_ttl: int = 7 * 24 * 3600  # 线程无活动多久后过期(秒)
+    checkpoint_max_versions: int = 20  # 每个线程(命名空间)最多保留的 checkpoint 版本数
+    checkpoint_sweep_interval: int = 600  # 后台清理任务执行间隔(秒)
+
     # Qdrant配置
     qdrant_port: int = 6333
     qdrant_api_key: str
@@ -0,0 +1,318 @@
+"""基于 Redis 的 LangGraph Checkpointer
+
+替代进程内的 MemorySaver：
+- 所有 worker 共享同一份线程状态，/chat/interrupt 可以在任意 worker 上恢复
+- 每个线程的 key 带 TTL，无活动的线程自动过期
+- 每个线程(命名空间)只保留最近 N 个 checkpoint 版本
+- 后台清理任务定期移除过期线程的残留索引，保证内存占用平稳
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Optional, Sequence
+
+import redis.asyncio as redis
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from .session import db_manager
+from ..core.config import get_settings
+
+_SEP = b"\x00"
+
+
+class RedisCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    Key 结构 (prefix 默认为 checkpoint):
+        {prefix}:{thread_id}:{ns}:{checkpoint_id}   HASH  checkpoint 与 metadata
+        {prefix}:{thread_id}:{ns}:__index__         ZSET  该命名空间下的 checkpoint_id (按字典序即时间序)
+        {prefix}_writes:{thread_id}:{ns}:{cid}      HASH  pending writes
+        {prefix}:{thread_id}:__ns__                 SET   线程下出现过的命名空间
+        {prefix}:__threads__                        ZSET  thread_id -> 最近写入时间，供清理任务使用
+    """
+
+    def __init__(
+            self,
+            client: Optional[redis.Redis] = None,
+            ttl: Optional[int] = None,
+            max_versions: Optional[int] = None,
+            sweep_interval: Optional[int] = None,
+            prefix: str = "checkpoint",
+    ):
+        super().__init__()
+        settings = get_settings()
+        self._client = client
+        self.ttl = ttl or settings.checkpoint_ttl
+        self.max_versions = max_versions or settings.checkpoint_max_versions
+        self.sweep_interval = sweep_interval or settings.checkpoint_sweep_interval
+        self.prefix = prefix
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        # 延迟获取：图可能在 lifespan 初始化连接池之前就被构建
+        return self._client or db_manager.redis_binary
+
+    # ---------- key 工具 ----------
+    def _checkpoint_key(self, thread_id: str, ns: str, checkpoint_id: str) -> str:
+        return f"{self.prefix}:{thread_id}:{ns}:{checkpoint_id}"
+
+    def _writes_key(self, thread_id: str, ns: str, checkpoint_id: str) -> str:
+        return f"{self.prefix}_writes:{thread_id}:{ns}:{checkpoint_id}"
+
+    def _index_key(self, thread_id: str, ns: str) -> str:
+        return f"{self.prefix}:{thread_id}:{ns}:__index__"
+
+    def _ns_key(self, thread_id: str) -> str:
+        return f"{self.prefix}:{thread_id}:__ns__"
+
+    @property
+    def _threads_key(self) -> str:
+        return f"{self.prefix}:__threads__"
+
+    # ---------- 读 ----------
+    async def _load_tuple(self, thread_id: str, ns: str, checkpoint_id: str) -> Optional[CheckpointTuple]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._checkpoint_key(thread_id, ns, checkpoint_id))
+            pipe.hgetall(self._writes_key(thread_id, ns, checkpoint_id))
+            data, writes = await pipe.execute()
+        if not data:
+            return None
+
+        checkpoint = self.serde.loads_typed((data[b"type"].decode(), data[b"checkpoint"]))
+        metadata = self.serde.loads_typed((data[b"metadata_type"].decode(), data[b"metadata"]))
+        parent_id = data.get(b"parent", b"").decode()
+
+        pending_writes = []
+        # field = task_id \x00 idx，按 (task_id, idx) 排序保证写入顺序稳定
+        for field in sorted(writes, key=lambda f: (f.split(_SEP)[0], int(f.split(_SEP)[1]))):
+            task_id = field.split(_SEP)[0].decode()
+            type_, channel, _task_path, payload = writes[field].split(_SEP, 3)
+            pending_writes.append((task_id, channel.decode(), self.serde.loads_typed((type_.decode(), payload))))
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": ns,
+                    "checkpoint_id": parent_id,
+                }
+            } if parent_id else None,
+            pending_writes=pending_writes,
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            latest = await self.client.zrevrangebylex(self._index_key(thread_id, ns), "+", "-", start=0, num=1)
+            if not latest:
+                return None
+            checkpoint_id = latest[0].decode()
+        return await self._load_tuple(thread_id, ns, checkpoint_id)
+
+    async def alist(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config:
+            thread_ids = [config["configurable"]["thread_id"]]
+            ns_filter = config["configurable"].get("checkpoint_ns")
+            checkpoint_id_filter = get_checkpoint_id(config)
+        else:
+            thread_ids = [t.decode() for t in await self.client.zrange(self._threads_key, 0, -1)]
+            ns_filter = None
+            checkpoint_id_filter = None
+        before_id = get_checkpoint_id(before) if before else None
+
+        for thread_id in thread_ids:
+            if ns_filter is not None:
+                namespaces = [ns_filter]
+            else:
+                namespaces = [n.decode() for n in await self.client.smembers(self._ns_key(thread_id))]
+            for ns in namespaces:
+                upper = f"({before_id}" if before_id else "+"
+                for raw_id in await self.client.zrevrangebylex(self._index_key(thread_id, ns), upper, "-"):
+                    checkpoint_id = raw_id.decode()
+                    if checkpoint_id_filter and checkpoint_id != checkpoint_id_filter:
+                        continue
+                    checkpoint_tuple = await self._load_tuple(thread_id, ns, checkpoint_id)
+                    if checkpoint_tuple is None:
+                        continue
+                    if filter and not all(
+                            checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()
+                    ):
+                        continue
+                    if limit is not None:
+                        if limit <= 0:
+                            return
+                        limit -= 1
+                    yield checkpoint_tuple
+
+    # ---------- 写 ----------
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id") or ""
+        checkpoint_id = checkpoint["id"]
+
+        type_, payload = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_payload = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        checkpoint_key = self._checkpoint_key(thread_id, ns, checkpoint_id)
+        index_key = self._index_key(thread_id, ns)
+        ns_key = self._ns_key(thread_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(checkpoint_key, mapping={
+                "type": type_,
+                "checkpoint": payload,
+                "metadata_type": metadata_type,
+                "metadata": metadata_payload,
+                "parent": parent_id,
+            })
+            pipe.expire(checkpoint_key, self.ttl)
+            pipe.zadd(index_key, {checkpoint_id: 0})
+            pipe.expire(index_key, self.ttl)
+            pipe.sadd(ns_key, ns)
+            pipe.expire(ns_key, self.ttl)
+            pipe.zadd(self._threads_key, {thread_id: time.time()})
+            pipe.zcard(index_key)
+            results = await pipe.execute()
+
+        if results[-1] > self.max_versions:
+            await self._trim(thread_id, ns, results[-1] - self.max_versions)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    async def aput_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[tuple[str, Any]],
+            task_id: str,
+            task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        writes_key = self._writes_key(thread_id, ns, checkpoint_id)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                field = f"{task_id}\x00{write_idx}"
+                type_, payload = self.serde.dumps_typed(value)
+                packed = _SEP.join([type_.encode(), channel.encode(), task_path.encode(), payload])
+                # 与 MemorySaver 一致：普通写入不覆盖，特殊通道(idx < 0)允许覆盖
+                if write_idx >= 0:
+                    pipe.hsetnx(writes_key, field, packed)
+                else:
+                    pipe.hset(writes_key, field, packed)
+            pipe.expire(writes_key, self.ttl)
+            await pipe.execute()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        namespaces = [n.decode() for n in await self.client.smembers(self._ns_key(thread_id))]
+        keys = [self._ns_key(thread_id)]
+        for ns in namespaces:
+            index_key = self._index_key(thread_id, ns)
+            for raw_id in await self.client.zrange(index_key, 0, -1):
+                checkpoint_id = raw_id.decode()
+                keys.append(self._checkpoint_key(thread_id, ns, checkpoint_id))
+                keys.append(self._writes_key(thread_id, ns, checkpoint_id))
+            keys.append(index_key)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            pipe.zrem(self._threads_key, thread_id)
+            await pipe.execute()
+
+    async def _trim(self, thread_id: str, ns: str, count: int) -> None:
+        """删除最旧的 count 个 checkpoint 版本"""
+        index_key = self._index_key(thread_id, ns)
+        # 所有成员 score 都为 0，ZRANGE 按字典序(即 uuid6 时间序)返回
+        oldest = [raw.decode() for raw in await self.client.zrange(index_key, 0, count - 1)]
+        if not oldest:
+            return
+        keys = []
+        for checkpoint_id in oldest:
+            keys.append(self._checkpoint_key(thread_id, ns, checkpoint_id))
+            keys.append(self._writes_key(thread_id, ns, checkpoint_id))
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            pipe.zrem(index_key, *oldest)
+            await pipe.execute()
+
+    # ---------- 后台清理 ----------
+    async def sweep(self) -> int:
+        """清理超过 TTL 未活动的线程，返回清理的线程数"""
+        deadline = time.time() - self.ttl
+        stale = [t.decode() for t in await self.client.zrangebyscore(self._threads_key, "-inf", deadline)]
+        for thread_id in stale:
+            await self.adelete_thread(thread_id)
+        return len(stale)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    print(f"checkpoint 清理完成，移除过期线程 {removed} 个")
+            except Exception as e:
+                print(f"checkpoint 清理失败: {e}")
+
+    def start_sweeper(self):
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self):
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+
+
+_checkpointer = None
+
+
+def get_checkpointer() -> RedisCheckpointSaver:
+    global _checkpointer
+    if _checkpointer is None:
+        _checkpointer = RedisCheckpointSaver()
+    return _checkpointer
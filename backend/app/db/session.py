@@ -6,6 +6,7 @@ import redis.asyncio as redis
 from qdrant_client import AsyncQdrantClient
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from ..core.config import get_settings
+from ..utils.instrumentation import InstrumentedQdrant, register_sql_metrics
 
 
 class DatabaseManager:
@@ -14,6 +15,7 @@ class DatabaseManager:
         self.engine = None
         self.session_factory = None
         self.redis = None
+        self.redis_binary = None
         self.qdrant = None
 
     def init_resources(self):
@@ -26,6 +28,8 @@ class DatabaseManager:
             max_overflow=10,  # 瞬时高峰额外允许连接数
             pool_recycle=3600,  # 1小时回收连接，防止 MySQL 服务器主动断开
         )
+        if self.settings.metrics_enabled:
+            register_sql_metrics(self.engine)
         self.session_factory = async_sessionmaker(
             bind=self.engine,
             expire_on_commit=False,
@@ -41,11 +45,21 @@ class DatabaseManager:
             max_connections=100,  # 企业级必设，防止连接泄露耗尽资源
             health_check_interval=30  # 定时心跳，防止防火墙或代理断开连接
         )
+        # Redis 二进制连接池 (不做 utf-8 解码，用于 checkpoint 等二进制序列化数据)
+        self.redis_binary = redis.from_url(
+            self.settings.redis_url,
+            password=self.settings.redis_password,
+            max_connections=50,
+            health_check_interval=30
+        )
         # Qdrant连接
         self.qdrant = AsyncQdrantClient(
             url=self.settings.qdrant_url,
             api_key=self.settings.qdrant_api_key
         )
+        if self.settings.metrics_enabled:
+            # 透明代理，为检索 / 写入请求计时
+            self.qdrant = InstrumentedQdrant(self.qdrant)
 
     async def close_resources(self):
         """应用关闭时调用"""
@@ -53,6 +67,8 @@ class DatabaseManager:
             await self.engine.dispose()
         if self.redis:
             await self.redis.close()
+        if self.redis_binary:
+            await self.redis_binary.close()
         if self.qdrant:
             await self.qdrant.close()
 
@@ -1,12 +1,62 @@
 import datetime
 import json
+import re
+from typing import Optional
 
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import ToolMessage, AIMessage
 
 from ..models.graphState import GraphState
 from ..agents.agentBase import AgentBase
+from .memory import build_history, memory_context
 from ..tools.campusTools import create_campus_tools
-from ..agents.agentPrompts import get_academic_agent_prompt
+from ..agents.agentPrompts import get_academic_agent_prompt, get_academic_agent_context, current_minute
+from ..core.config import get_settings
+from ..models.graphState import UserProfile
+from ..services.timetableIndex import timetable_index
+
+# 课表快速路径只处理完整匹配的固定句式，其他问题仍交给 agent
+_NEXT_CLASS = re.compile(r"(我的?)?(下一?节课|接下来(是)?什么课|接下来的课)(是什么|是啥|在哪[里儿]?|在哪个教室|上什么)?[？?。!！]*")
+_DAY_CLASS = re.compile(
+    r"(我的?)?(今天|明天|后天|(?:周|星期|礼拜)([一二三四五六日天]))(有什么课|有哪些课|有课吗|的课表?|上什么课|有几节课)[？?。!！]*"
+)
+_DAY_CHARS = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "日": 7, "天": 7}
+_RELATIVE_DAYS = {"今天": 0, "明天": 1, "后天": 2}
+
+
+def _describe(session: dict) -> str:
+    return f"第{session['week']}周{session['day_name']}第{session['start_period']}-{session['end_period']}节 " \
+           f"{session['course_name']}（{session['teacher_name']}），地点：{session['classroom']}"
+
+
+async def timetable_fast_path(question: str, user_info: UserProfile) -> Optional[tuple[str, dict]]:
+    """命中固定句式时直接查课表索引，返回 (回答, 结构化数据)，否则返回 None"""
+    if not get_settings().timetable_fast_path or user_info.get("role") != "student":
+        return None
+    question = re.sub(r"\s+", "", question)
+
+    if _NEXT_CLASS.fullmatch(question):
+        data = await timetable_index.next_class(user_info["uid"])
+        parts = []
+        if data["ongoing"]:
+            parts.append(f"你现在正在上：{_describe(data['ongoing'])}。")
+        parts.append(f"你的下一节课是：{_describe(data['next'])}。" if data["next"] else "本学期后面已经没有课了。")
+        return "\n".join(parts), data
+
+    match = _DAY_CLASS.fullmatch(question)
+    if match:
+        label = match.group(2)
+        if label in _RELATIVE_DAYS:
+            now = datetime.datetime.now() + datetime.timedelta(days=_RELATIVE_DAYS[label])
+            data = await timetable_index.classes_on(user_info["uid"], now=now)
+        else:
+            data = await timetable_index.classes_on(user_info["uid"], day_of_week=_DAY_CHARS[match.group(3)])
+        classes = data["classes"]
+        if not classes:
+            return f"{label}没有课。", data
+        lines = [f"{label}（第{data['week']}周{data['day_name']}）共有 {len(classes)} 节课："]
+        lines += [f"{i}. {_describe(c)}" for i, c in enumerate(classes, 1)]
+        return "\n".join(lines), data
+    return None
 
 
 async def academic_graph(state: GraphState):
@@ -15,13 +65,28 @@ async def academic_graph(state: GraphState):
 
 
 async def academic_query_node(state: GraphState):
-    messages = state['messages']
     user_info = state['user_info']
-    agent = AgentBase(
-        system_prompt=get_academic_agent_prompt(user_info=user_info, current_time=str(datetime.datetime.now())),
-        tools=create_campus_tools(),
+    try:
+        fast = await timetable_fast_path(str(state['messages'][-1].content), user_info)
+    except Exception as e:
+        print(f"课表快速路径失败，交给 agent 处理: {e}")
+        fast = None
+    if fast:
+        content, structured_data = fast
+        return {
+            "messages": [AIMessage(content=content)],
+            "structured_data": structured_data
+        }
+    # 预编译 agent 只包含静态 prompt 与工具，用户信息和时间在调用时注入
+    agent = AgentBase.get_or_create(
+        name="academic_agent",
+        system_prompt=get_academic_agent_prompt(),
+        tools_factory=create_campus_tools,
+    )
+    response = await agent.arun(
+        messages=build_history(state),
+        context=get_academic_agent_context(user_info=user_info, current_time=current_minute()) + memory_context(state),
     )
-    response = await agent.arun(messages=messages)
     # 1. 提取结构化数据
     structured_data = []
     # 从后往前找第一个 ToolMessage
@@ -1,20 +1,22 @@
 from datetime import datetime
 
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, AIMessage
 from langgraph.types import interrupt, Command
 
 from backend.app.agents.agentBase import AgentBase
 from backend.app.agents.agentPrompts import get_rag_summary_system_prompt, get_rag_query_system_prompt, \
-    get_leave_system_prompt
+    get_leave_system_prompt, get_leave_context
 from backend.app.agents.llmBase import LLMBase
 from backend.app.models.frontModels import LeaveData
 from backend.app.models.graphState import GraphState
+from backend.app.graph.memory import build_history, memory_context
 
 from backend.app.agents.embeddingModelBase import EmbeddingModelBase
 from backend.app.db.session import get_qdrant, get_async_db
 from qdrant_client.http import models
 
 from backend.app.models.tableModels import LeaveRequest, LeaveStatus
+from backend.app.services.gradeUpload import prepare_upload, apply_upload, GradeUploadError
 
 
 async def admin_graph(state: GraphState):
@@ -22,12 +24,19 @@ async def admin_graph(state: GraphState):
     return {}
 
 
+def admin_condition(state: GraphState):
+    # 教师上传了文件时进入成绩上传流程，其余走请假流程
+    if state.get("file_content") and state["user_info"].get("role") == "teacher":
+        return "grade_upload"
+    return "leave"
+
+
 async def admin_leave_node(state: GraphState):
-    messages = state['messages']
-    system_prompt = get_leave_system_prompt(state["user_info"], datetime.now().strftime("%Y-%m-%d"))
-    llm = LLMBase().client
-    llm = llm.with_structured_output(LeaveData)
-    extracted = await llm.ainvoke([SystemMessage(content=system_prompt), HumanMessage(content=messages)])
+    context = get_leave_context(state["user_info"], datetime.now().strftime("%Y-%m-%d")) + memory_context(state)
+    extracted = await LLMBase.for_node("admin_leave_node").ainvoke_structured(
+        LeaveData,
+        [SystemMessage(content=get_leave_system_prompt()), *build_history(state), SystemMessage(content=context)]
+    )
 
     missing_fields = []
     if not extracted.leave_type:
@@ -65,6 +74,51 @@ async def admin_leave_node(state: GraphState):
     )
 
 
+async def grade_upload_node(state: GraphState):
+    """解析并校验上传的成绩表，生成待确认的 diff；文件内容用完即从状态中清除"""
+    try:
+        upload = await prepare_upload(state["file_content"], state.get("file_name"), state["user_info"]["uid"])
+    except GradeUploadError as e:
+        return {
+            "messages": [AIMessage(content=f"成绩文件无法导入：{e}")],
+            "file_content": None,
+        }
+    return {"grade_upload": upload, "file_content": None}
+
+
+def grade_upload_condition(state: GraphState):
+    return "confirm" if state.get("grade_upload") else "end"
+
+
+async def grade_confirm_node(state: GraphState):
+    # 中断恢复时本节点会重新执行，因此解析放在上一个节点，这里只读取状态
+    upload = state["grade_upload"]
+    summary = upload["summary"]
+    response = f"共解析 {summary['rows']} 行：新录入 {summary['new']} 条，修改 {summary['changed']} 条，" \
+               f"未变化 {summary['unchanged']} 条，错误 {summary['errors']} 条。请确认后提交。"
+    user_response = interrupt({
+        "ui_type": "grade_upload_confirm",
+        "interrupt_data": {k: upload[k] for k in ("summary", "changes", "errors")},
+        "messages": [AIMessage(content=response)]
+    })
+
+    if user_response.get("action") == "cancel":
+        return {"messages": [AIMessage(content="您已取消成绩上传。")], "grade_upload": None}
+    return Command(
+        goto="save_grades_db_node",
+        update={"messages": [AIMessage(content="正在为您提交成绩...")]}
+    )
+
+
+async def save_grades_db_node(state: GraphState):
+    result = await apply_upload(state["grade_upload"]["updates"])
+    return {
+        "messages": [AIMessage(content=f"✅ 已成功更新 {result['updated']} 条成绩记录。")],
+        "structured_data": result,
+        "grade_upload": None  # 释放状态
+    }
+
+
 async def save_leave_db_node(state: GraphState):
     data = state["interrupt_data"]
     user_id = state["user_info"]["uid"]
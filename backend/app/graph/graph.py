@@ -1,24 +1,65 @@
 from langchain_core.messages import SystemMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 
 from backend.app.models.graphState import GraphState, RouteDecision
 from .academicGraphNodes import academic_graph, academic_query_node
-from .infoGraphNodes import info_graph, rewrite_query_node, retrieve_node, info_query_node
-from .adminGraphNodes import admin_graph, admin_leave_node, save_leave_db_node
+from .infoGraphNodes import info_graph, rewrite_query_node, retrieve_node, info_query_node, \
+    answer_cache_lookup_node, answer_cache_condition, answer_cache_store_node, rerank_node
+from .adminGraphNodes import admin_graph, admin_leave_node, save_leave_db_node, admin_condition, \
+    grade_upload_node, grade_upload_condition, grade_confirm_node, save_grades_db_node
+from .memory import memory_node
 from ..agents.agentPrompts import get_router_system_prompt
 from ..agents.llmBase import LLMBase
+from ..agents.intentRouter import intent_router
+from ..agents.llmScheduler import llm_priority, Priority
+from .speculation import speculation_manager
+from ..core.config import get_settings
+from ..db.redisCheckpointer import get_checkpointer
+from ..utils.instrumentation import instrument_node
 
 
-async def router_node(state: GraphState):
+async def router_node(state: GraphState, config: RunnableConfig):
     messages = state['messages']
-    prompt = get_router_system_prompt()
-    llm = LLMBase().client
-    llm = llm.with_structured_output(RouteDecision)
-    decision = await llm.ainvoke([SystemMessage(content=prompt), messages[-1]])
-    return {
-        "intent": decision.destination
+    # 教师上传文件 (成绩表) 直接进入行政流程
+    if state.get("file_content") and state["user_info"].get("role") == "teacher":
+        return {"intent": "admin"}
+
+    async def llm_route() -> str:
+        prompt = get_router_system_prompt()
+        # 路由调用排在队列最前面
+        with llm_priority(Priority.ROUTING):
+            decision = await LLMBase.for_node("router_node").ainvoke_structured(
+                RouteDecision, [SystemMessage(content=prompt), messages[-1]]
+            )
+        return decision.destination
+
+    speculative = None
+
+    def start_speculation():
+        # 路由需要等待 LLM 时，并行启动 RAG 查询改写
+        nonlocal speculative
+        if speculation_manager.enabled:
+            speculative = speculation_manager.start(messages[-1].content)
+
+    # 先走本地关键词 / 最近邻快速路由，置信度不足时才调用 LLM
+    try:
+        intent = await intent_router.route(str(messages[-1].content), llm_route, start_speculation)
+    except BaseException:
+        if speculative:
+            speculation_manager.cancel(speculative)
+        raise
+
+    update = {
+        "intent": intent
     }
+    if speculative:
+        if intent == "info":
+            # 不在这里等待：语义答案缓存命中时改写结果用不上
+            speculation_manager.park(config["configurable"]["thread_id"], speculative)
+        else:
+            speculation_manager.cancel(speculative)
+    return update
 
 
 # 定义条件逻辑函数
@@ -31,18 +72,26 @@ _graph = None
 
 
 def build_graph():
+    settings = get_settings()
     graph = StateGraph(GraphState)
 
     nodes = [
-        router_node,
+        memory_node, router_node,
         academic_graph, academic_query_node,
-        info_graph, rewrite_query_node, retrieve_node, info_query_node,
-        admin_graph, admin_leave_node, save_leave_db_node
+        info_graph, answer_cache_lookup_node, rewrite_query_node, retrieve_node, info_query_node,
+        answer_cache_store_node,
+        admin_graph, admin_leave_node, save_leave_db_node,
+        grade_upload_node, grade_confirm_node, save_grades_db_node
         ]
+    if settings.rerank_enabled:
+        nodes.append(rerank_node)
     for node in nodes:
-        graph.add_node(node.__name__, node)
+        # 路由之前的节点拿不到本轮意图，指标中单独标记
+        graph.add_node(node.__name__, instrument_node(node, routed=node not in (memory_node, router_node)))
 
-    graph.add_edge(START, "router_node")
+    # 每轮先整理对话记忆，再进入路由
+    graph.add_edge(START, "memory_node")
+    graph.add_edge("memory_node", "router_node")
     graph.add_conditional_edges(
         "router_node",
         route_condition,
@@ -58,16 +107,49 @@ def build_graph():
     graph.add_edge("academic_graph", "academic_query_node")
     graph.add_edge("academic_query_node", END)
     # info子图
-    graph.add_edge("info_graph", "rewrite_query_node")
+    # 语义答案缓存在改写之前查询，命中时不再调用任何 LLM
+    graph.add_edge("info_graph", "answer_cache_lookup_node")
+    graph.add_conditional_edges(
+        "answer_cache_lookup_node",
+        answer_cache_condition,
+        {
+            "hit": END,
+            "miss": "rewrite_query_node",
+        }
+    )
     graph.add_edge("rewrite_query_node", "retrieve_node")
-    graph.add_edge("retrieve_node", "info_query_node")
-    graph.add_edge("info_query_node", END)
+    if settings.rerank_enabled:
+        # 检索 -> 交叉编码器重排序 -> 回答
+        graph.add_edge("retrieve_node", "rerank_node")
+        graph.add_edge("rerank_node", "info_query_node")
+    else:
+        graph.add_edge("retrieve_node", "info_query_node")
+    graph.add_edge("info_query_node", "answer_cache_store_node")
+    graph.add_edge("answer_cache_store_node", END)
     # admin子图
-    graph.add_edge("admin_graph", "admin_leave_node")
+    graph.add_conditional_edges(
+        "admin_graph",
+        admin_condition,
+        {
+            "leave": "admin_leave_node",
+            "grade_upload": "grade_upload_node",
+        }
+    )
+    graph.add_conditional_edges(
+        "grade_upload_node",
+        grade_upload_condition,
+        {
+            "confirm": "grade_confirm_node",
+            "end": END,
+        }
+    )
+    graph.add_edge("grade_confirm_node", END)
+    graph.add_edge("save_grades_db_node", END)
     graph.add_edge("admin_leave_node", END)
     graph.add_edge("save_leave_db_node", END)
 
-    checkpointer = MemorySaver()
+    # Redis checkpointer：多 worker 共享线程状态，带 TTL 与版本上限
+    checkpointer = get_checkpointer()
     graph = graph.compile(checkpointer=checkpointer)
     return graph
 
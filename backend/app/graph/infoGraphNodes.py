@@ -1,34 +1,175 @@
-from langchain_core.messages import SystemMessage, HumanMessage
+import hashlib
+import json
+import re
+from typing import Optional
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, message_to_dict, messages_from_dict
+from langchain_core.runnables import RunnableConfig
 
 from backend.app.agents.agentBase import AgentBase
-from backend.app.agents.agentPrompts import get_rag_summary_system_prompt, get_rag_query_system_prompt
+from backend.app.agents.agentPrompts import get_rag_summary_system_prompt, get_rag_query_system_prompt, \
+    get_rag_query_context, get_rag_summary_context
 from backend.app.agents.llmBase import LLMBase
 from backend.app.models.graphState import GraphState
 from backend.app.models.ragModels import RagQuery
+from backend.app.agents.embeddingCache import normalize_text
 from backend.app.agents.embeddingModelBase import EmbeddingModelBase
+from backend.app.agents.rerankModelBase import get_rerank_model
+from backend.app.core.config import get_settings
 from backend.app.db.session import get_qdrant
+from backend.app.graph.memory import build_history, memory_context
+from backend.app.graph.speculation import speculation_manager
+from backend.app.services.answerCache import get_answer_cache
+from backend.app.services.eventSearch import EVENT_DOMAIN, search_events
+from backend.app.services.qdrantSchema import search_params
+from backend.app.utils.backgroundTasks import spawn
+from backend.app.utils.singleFlight import SingleFlight
+from backend.app.utils.sparseVector import encode_query
 from qdrant_client.http import models
 
+# 无状态步骤的单飞合并：相同问题的并发请求共享一次计算，checkpoint 写入仍按线程各自进行
+rewrite_flight = SingleFlight("rewrite")
+retrieve_flight = SingleFlight("retrieve")
+# 回答共享完整的 AIMessage (含 id 与 usage_metadata)，跨 worker 时按 langchain 的消息字典序列化
+answer_flight = SingleFlight(
+    "answer",
+    encode=lambda message: json.dumps(message_to_dict(message), ensure_ascii=False),
+    decode=lambda raw: messages_from_dict([json.loads(raw)])[0],
+)
+
+
+def _flight_key(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+# 语义答案缓存在改写之前查询，领域由关键词规则粗判，不调用 LLM
+ANSWER_CACHE_DOMAIN_KEYWORDS = {
+    EVENT_DOMAIN: ["讲座", "活动", "报告会", "宣讲会", "比赛"],
+    "hfut_postgraduate_admission_policy": ["保研", "推免", "免试"],
+    "hfut_news": ["新闻"],
+}
+# 指代 / 省略上文的追问 (如 "那它的绩点要求呢")，答案依赖之前的对话
+_FOLLOW_UP = re.compile(r"它|他|她|这个|那个|这些|那些|这样|那样|上面|刚才|之前|前面|还有|另外|其他|呢[？?]?$|^那")
+# 去掉标点后过短的问题通常是省略了上文的追问
+_MIN_STANDALONE_LENGTH = 6
+
+
+def guess_domain(question: str) -> Optional[str]:
+    """按关键词粗判检索领域；讲座/活动优先，其余多个领域同时命中时视为未知"""
+    hits = {domain for domain, words in ANSWER_CACHE_DOMAIN_KEYWORDS.items() if any(w in question for w in words)}
+    if EVENT_DOMAIN in hits:
+        return EVENT_DOMAIN
+    return hits.pop() if len(hits) == 1 else None
+
+
+def is_standalone_question(question: str, earlier: list, summary: Optional[str]) -> bool:
+    """
+    问题脱离之前的对话是否仍然完整；不完整的问题不能读写语义答案缓存，
+    否则其他对话中写入的答案会被当成这次追问的答案
+    Args:
+        earlier: 本轮问题之前的消息
+        summary: 已折叠的对话摘要
+    """
+    if not earlier and not summary:
+        return True
+    return len(normalize_text(question)) >= _MIN_STANDALONE_LENGTH and not _FOLLOW_UP.search(question)
+
 
 async def info_graph(state: GraphState):
     print(f"info: {state}")
     return {}
 
 
-async def rewrite_query_node(state: GraphState):
+async def answer_cache_lookup_node(state: GraphState, config: RunnableConfig):
     messages = state['messages']
-    prompt = get_rag_summary_system_prompt(messages[-1].content)
-    llm = LLMBase().client
-    llm = llm.with_structured_output(RagQuery)
-    result = await llm.ainvoke([HumanMessage(content=prompt)])
+    question = str(messages[-1].content)
+    domain = guess_domain(question)
+    # 讲座/活动的回答不写入缓存，也就不必查询；依赖上文的追问同样跳过
+    if domain == EVENT_DOMAIN or not is_standalone_question(
+            question, messages[:-1], state.get("conversation_summary")
+    ):
+        return {"answer_cache_hit": False}
+    try:
+        # 关键词判断出领域时只在该领域内匹配，否则不限领域
+        cached = await get_answer_cache().lookup(question, domain)
+    except Exception as e:
+        print(f"语义答案缓存查询失败: {e}")
+        cached = None
+    if not cached:
+        return {"answer_cache_hit": False}
+    # 命中后路由阶段启动的投机改写不再需要
+    speculative = speculation_manager.claim(config["configurable"]["thread_id"])
+    if speculative:
+        speculation_manager.cancel(speculative)
     return {
-        "rag_query_params": result.dict()
+        "answer_cache_hit": True,
+        "messages": [AIMessage(content=cached["answer"])],
+        "rag_query_source_ids": cached["source_ids"],
+        "structured_data": {"source_ids": cached["source_ids"], "cache_score": cached["score"]},
+    }
+
+
+def answer_cache_condition(state: GraphState):
+    return "hit" if state.get("answer_cache_hit") else "miss"
+
+
+async def generate_rag_query(question: str) -> dict:
+    # 静态前缀在前，问题放在最后一条消息，便于服务端复用前缀缓存
+    result = await LLMBase.for_node("rewrite_query_node").ainvoke_structured(RagQuery, [
+        SystemMessage(content=get_rag_summary_system_prompt()),
+        HumanMessage(content=get_rag_summary_context(question)),
+    ])
+    return result.dict()
+
+
+async def rewrite_query_node(state: GraphState, config: RunnableConfig):
+    # 路由阶段已经启动了投机改写，直接等待其结果；失败时走串行改写兜底
+    speculative = speculation_manager.claim(config["configurable"]["thread_id"])
+    if speculative:
+        params = await speculation_manager.commit(speculative)
+        if params:
+            return {"rag_query_params": params}
+    messages = state['messages']
+    question = messages[-1].content
+    params = await rewrite_flight.do(
+        _flight_key(normalize_text(str(question))),
+        lambda: generate_rag_query(question),
+    )
+    return {
+        "rag_query_params": dict(params)
     }
 
 
 async def retrieve_node(state: GraphState):
     # 1. 获取 LLM 生成的参数
     params = state["rag_query_params"]
+    question = str(state['messages'][-1].content)
+    settings = get_settings()
+    if params.get("domain") == EVENT_DOMAIN:
+        # 讲座/活动：payload 预过滤 + 向量排序，命中行回表后同时交给前端
+        # 没有 HyDE 文本时按原问题检索，原问题也要纳入合并 key
+        key = _flight_key(params, normalize_text(params.get("hyde_doc") or question))
+        result = await retrieve_flight.do(key, lambda: search_events(params, question))
+        return {
+            "rag_query_results": list(result["texts"]),
+            "rag_query_source_ids": list(result["source_ids"]),
+            "structured_data": {"events": result["events"]},
+        }
+
+    # hybrid 模式的稀疏查询会用到原问题，需要纳入合并 key
+    key = _flight_key(params, normalize_text(question) if settings.retrieval_mode == "hybrid" else None)
+    result = await retrieve_flight.do(key, lambda: search_policy(params, question))
+
+    if not result["texts"]:
+        print("⚠️ 警告：检索结果为空！请检查 Qdrant 里的 metadata.domain 是否一致。")
+
+    return {
+        "rag_query_results": list(result["texts"]),
+        "rag_query_source_ids": list(result["source_ids"])
+    }
+
+
+async def search_policy(params: dict, question: str) -> dict:
     hyde_text = params.get("hyde_doc", "")
     keywords = params.get("keywords", "").split(" ")
     domain_val = params.get("domain", "")
@@ -41,51 +182,143 @@ async def retrieve_node(state: GraphState):
     query_vector = await embedding_model.aembed_query(hyde_text)
 
     # 4. 执行检索
-    search_results = await qdrant_client.query_points(
-        collection_name="hfut_policy",
-        query=query_vector,
-        limit=10,
-        with_payload=True,
-        query_filter=models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="metadata.domain",
-                    match=models.MatchValue(value=domain_val)
-                )
+    settings = get_settings()
+    domain_filter = models.Filter(
+        must=[
+            models.FieldCondition(
+                key="metadata.domain",
+                match=models.MatchValue(value=domain_val)
+            )
+        ]
+    )
+    if settings.retrieval_mode == "hybrid":
+        # 稠密(HyDE) + 稀疏(关键词 BM25) 两路召回，在 Qdrant 内用 RRF 融合排序
+        indices, values = encode_query(" ".join([*keywords, question]))
+        search_results = await qdrant_client.query_points(
+            collection_name="hfut_policy",
+            prefetch=[
+                models.Prefetch(
+                    query=query_vector,
+                    using=settings.dense_vector_name or None,
+                    limit=settings.hybrid_prefetch_limit,
+                    filter=domain_filter,
+                    params=search_params(),
+                ),
+                models.Prefetch(
+                    query=models.SparseVector(indices=indices, values=values),
+                    using=settings.sparse_vector_name,
+                    limit=settings.hybrid_prefetch_limit,
+                    filter=domain_filter,
+                ),
             ],
-            should=[
-                models.FieldCondition(
-                    key="content",
-                    match=models.MatchText(text=keyword)
-                ) for keyword in keywords
-            ]
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=settings.hybrid_limit,
+            with_payload=True,
+        )
+    else:
+        search_results = await qdrant_client.query_points(
+            collection_name="hfut_policy",
+            query=query_vector,
+            using=settings.dense_vector_name or None,
+            limit=settings.retrieval_limit,
+            search_params=search_params(),
+            with_payload=True,
+            query_filter=models.Filter(
+                must=domain_filter.must,
+                should=[
+                    models.FieldCondition(
+                        key="content",
+                        match=models.MatchText(text=keyword)
+                    ) for keyword in keywords
+                ]
+            )
         )
-    )
 
     # 6. 处理结果
     retrieved_texts = [hit.payload["content"] for hit in search_results.points]
+    source_ids = [str(hit.id) for hit in search_results.points]
 
     # # 打印调试信息，查看得分
     # for hit in search_results.points:
     #     print(f"DEBUG: Score: {hit.score:.4f} | Content: {hit.payload['content']}")
 
-    if not retrieved_texts:
-        print("⚠️ 警告：检索结果为空！请检查 Qdrant 里的 metadata.domain 是否一致。")
+    return {
+        "texts": retrieved_texts,
+        "source_ids": source_ids
+    }
+
 
+async def rerank_node(state: GraphState):
+    texts = state.get("rag_query_results") or []
+    source_ids = state.get("rag_query_source_ids") or []
+    question = str(state['messages'][-1].content)
+    try:
+        ranked = await get_rerank_model().rerank(question, texts)
+    except Exception as e:
+        # 重排序失败时退化为原始检索结果
+        print(f"重排序失败: {e}")
+        return {}
     return {
-        "rag_query_results": retrieved_texts
+        "rag_query_results": [texts[i] for i, _ in ranked],
+        "rag_query_source_ids": [source_ids[i] for i, _ in ranked] if source_ids else [],
     }
 
 
-async def info_query_node(state: GraphState):
+async def info_query_node(state: GraphState, config: RunnableConfig):
     context_list = state["rag_query_results"]
-    system_prompt = get_rag_query_system_prompt(context_list)
-    messages = state['messages']
-    agent = AgentBase(
-        system_prompt=system_prompt
+    messages = build_history(state)
+    summary = memory_context(state)
+    agent = AgentBase.get_or_create(
+        name="rag_agent",
+        system_prompt=get_rag_query_system_prompt()
+    )
+
+    async def answer() -> AIMessage:
+        response = await agent.arun(messages=messages, context=get_rag_query_context(context_list) + summary)
+        return response[-1]
+
+    # 流式请求需要本线程自己的 LLM 调用产生 token 事件，合并后的跟随者拿不到 token，因此不参与单飞
+    if config.get("configurable", {}).get("stream_tokens"):
+        return {"messages": [await answer()]}
+
+    # 对话历史与参考资料都相同的请求 (典型是各线程的首轮提问) 共享一次回答生成
+    key = _flight_key(
+        [normalize_text(str(m.content)) for m in messages],
+        summary,
+        (state.get("rag_query_params") or {}).get("domain"),
+        context_list,
     )
-    response = await agent.arun(messages=messages)
+    message = await answer_flight.do(key, answer)
+    # 各线程拿到各自的副本，避免共享同一个消息对象
     return {
-        "messages": [response[-1]]
+        "messages": [message.model_copy()]
     }
 
+
+async def answer_cache_store_node(state: GraphState):
+    source_ids = state.get("rag_query_source_ids") or []
+    # 没有检索到资料的回答 (通常是 "不知道") 不写入缓存
+    if not source_ids:
+        return {}
+    messages = state['messages']
+    # messages[-1] 为本轮回答，messages[-2] 为用户问题
+    question = str(messages[-2].content)
+    answer = str(messages[-1].content)
+    # 依赖上文的追问，其回答不能被其他对话复用
+    if not is_standalone_question(question, messages[:-2], state.get("conversation_summary")):
+        return {}
+    domain = (state.get("rag_query_params") or {}).get("domain", "")
+    # 讲座/活动的回答依赖当前时间 ("明天的讲座")，不能被之后的相似问题复用
+    if domain == EVENT_DOMAIN:
+        return {}
+
+    async def store():
+        try:
+            await get_answer_cache().store(question, answer, domain, source_ids)
+        except Exception as e:
+            print(f"语义答案缓存写入失败: {e}")
+
+    # 写缓存不阻塞响应
+    spawn(store())
+    return {}
+
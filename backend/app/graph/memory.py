@@ -0,0 +1,116 @@
+"""对话记忆管理
+
+GraphState.messages 会一直累积，这里负责把它控制在有界范围内：
+- 每轮开始时由 memory_node 检查：超出最近 memory_keep_turns 轮的旧消息在后台折叠进滚动摘要
+- 摘要生成完成后先暂存在 Redis，下一轮进入 memory_node 时才写回状态并删除旧消息，不阻塞当前请求
+- 送入 agent 的历史按 token 预算截断，摘要作为上下文注入
+"""
+import json
+
+from langchain_core.messages import AnyMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+from langchain_core.runnables import RunnableConfig
+
+from ..agents.agentPrompts import get_memory_summary_system_prompt, get_memory_summary_context, \
+    get_conversation_summary_context
+from ..agents.llmBase import LLMBase
+from ..agents.llmScheduler import llm_priority, Priority
+from ..core.config import get_settings
+from ..db.session import db_manager
+from ..models.graphState import GraphState
+from ..utils.backgroundTasks import spawn
+
+SUMMARY_KEY = "memory:summary:{thread_id}"
+LOCK_KEY = "memory:summary:{thread_id}:lock"
+
+
+def _split_turns(messages: list[AnyMessage]) -> list[list[AnyMessage]]:
+    """按用户消息切分轮次，每轮为一条 HumanMessage 及其后的回复"""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def _format_dialogue(messages: list[AnyMessage]) -> str:
+    return "\n".join(
+        f"{'用户' if isinstance(m, HumanMessage) else '助手'}: {m.content}" for m in messages
+    )
+
+
+async def _summarize(thread_id: str, summary: str, folded: list[AnyMessage]):
+    settings = get_settings()
+    redis_client = db_manager.redis
+    try:
+        with llm_priority(Priority.BACKGROUND):
+            response = await LLMBase.for_node("memory_summary").client.ainvoke([
+                SystemMessage(content=get_memory_summary_system_prompt()),
+                HumanMessage(content=get_memory_summary_context(summary, _format_dialogue(folded))),
+            ])
+        payload = {"summary": str(response.content), "folded_ids": [m.id for m in folded]}
+        await redis_client.set(
+            SUMMARY_KEY.format(thread_id=thread_id),
+            json.dumps(payload, ensure_ascii=False),
+            ex=settings.checkpoint_ttl,
+        )
+    except Exception as e:
+        print(f"对话摘要生成失败: {e}")
+    finally:
+        await redis_client.delete(LOCK_KEY.format(thread_id=thread_id))
+
+
+async def memory_node(state: GraphState, config: RunnableConfig):
+    settings = get_settings()
+    thread_id = config["configurable"]["thread_id"]
+    redis_client = db_manager.redis
+    messages = state["messages"]
+    summary = state.get("conversation_summary") or ""
+    update = {}
+    try:
+        # 1. 写回上一次后台生成的摘要，并删除已被折叠的消息
+        pending = await redis_client.get(SUMMARY_KEY.format(thread_id=thread_id))
+        if pending:
+            data = json.loads(pending)
+            folded_ids = set(data["folded_ids"])
+            summary = data["summary"]
+            update = {
+                "conversation_summary": summary,
+                "messages": [RemoveMessage(id=m.id) for m in messages if m.id in folded_ids],
+            }
+            messages = [m for m in messages if m.id not in folded_ids]
+            await redis_client.delete(SUMMARY_KEY.format(thread_id=thread_id))
+
+        # 2. 超出保留窗口的轮次攒够一批后，在后台折叠进摘要
+        turns = _split_turns(messages)
+        overflow = len(turns) - settings.memory_keep_turns
+        if overflow >= settings.memory_summarize_batch_turns and await redis_client.set(
+                LOCK_KEY.format(thread_id=thread_id), "1", nx=True, ex=settings.memory_summary_lock_ttl
+        ):
+            folded = [m for turn in turns[:overflow] for m in turn]
+            spawn(_summarize(thread_id, summary, folded))
+    except Exception as e:
+        # 记忆管理失败不影响本轮对话
+        print(f"对话记忆管理失败: {e}")
+    return update
+
+
+def build_history(state: GraphState) -> list[AnyMessage]:
+    """按 token 预算从后往前截断的对话历史，至少保留本轮问题"""
+    messages = state["messages"]
+    trimmed = trim_messages(
+        messages,
+        max_tokens=get_settings().memory_history_token_budget,
+        strategy="last",
+        token_counter=count_tokens_approximately,
+        start_on="human",
+    )
+    return trimmed or messages[-1:]
+
+
+def memory_context(state: GraphState) -> str:
+    """滚动摘要作为 agent 上下文的一部分，没有摘要时为空字符串"""
+    summary = state.get("conversation_summary")
+    return get_conversation_summary_context(summary) if summary else ""
@@ -0,0 +1,108 @@
+"""路由与 RAG 查询改写的投机并行执行
+
+路由需要调用 LLM 时，同时启动 RAG 查询改写 (以及可选的 HyDE 向量化)：
+- 路由结果为 info：改写任务按线程暂存，rewrite_query_node 直接使用其结果，省去一次串行 LLM 往返；
+  在此之前命中语义答案缓存时取消该任务
+- 路由结果为其他意图：取消改写任务，记录浪费的计算时间
+"""
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from ..core.config import get_settings
+
+
+@dataclass
+class SpeculativeTask:
+    task: asyncio.Task
+    started_at: float
+    finished_at: Optional[float] = None
+
+
+class SpeculationManager:
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.speculative_rewrite
+        self.embed_hyde = settings.speculative_embed_hyde
+        self.counters = Counter()
+        self.saved_seconds = 0.0
+        self.wasted_seconds = 0.0
+        # thread_id -> 已路由到 info、尚未被 rewrite_query_node 取走的改写任务
+        self._parked: dict[str, SpeculativeTask] = {}
+
+    def start(self, question: str) -> SpeculativeTask:
+        # 延迟导入，避免与 infoGraphNodes 循环依赖
+        from .infoGraphNodes import generate_rag_query
+
+        async def run():
+            params = await generate_rag_query(question)
+            if self.embed_hyde and params.get("hyde_doc"):
+                from ..agents.embeddingModelBase import EmbeddingModelBase
+                # 预热嵌入缓存，retrieve_node 随后会直接命中
+                await EmbeddingModelBase().get_model().aembed_query(params["hyde_doc"])
+            return params
+
+        self.counters["started"] += 1
+        speculative = SpeculativeTask(task=asyncio.create_task(run()), started_at=time.perf_counter())
+        speculative.task.add_done_callback(lambda _: setattr(speculative, "finished_at", time.perf_counter()))
+        return speculative
+
+    @staticmethod
+    def _run_time(speculative: SpeculativeTask) -> float:
+        """任务到目前为止(或到完成时)实际运行的时长"""
+        return (speculative.finished_at or time.perf_counter()) - speculative.started_at
+
+    async def commit(self, speculative: SpeculativeTask) -> Optional[dict]:
+        """路由选择了 info：等待并返回改写结果，失败时返回 None 由 rewrite_query_node 兜底"""
+        # 路由决策时改写已经运行的时长，即与路由重叠、被节省下来的时间
+        self.saved_seconds += self._run_time(speculative)
+        try:
+            params = await speculative.task
+        except Exception as e:
+            print(f"投机改写失败，回退到串行改写: {e}")
+            self.counters["failed"] += 1
+            return None
+        self.counters["committed"] += 1
+        return params
+
+    def park(self, thread_id: str, speculative: SpeculativeTask):
+        """路由选择了 info：暂存改写任务，不在路由节点中等待"""
+        previous = self._parked.pop(thread_id, None)
+        if previous:
+            # 上一轮的任务没有被取走 (如图执行中途出错)
+            self.cancel(previous)
+        self._parked[thread_id] = speculative
+
+    def claim(self, thread_id: str) -> Optional[SpeculativeTask]:
+        return self._parked.pop(thread_id, None)
+
+    def cancel(self, speculative: SpeculativeTask):
+        """路由选择了其他意图：取消改写任务"""
+        if speculative.task.done():
+            # 已经完成的任务，整段计算都被浪费；取出异常避免 "never retrieved" 警告
+            if not speculative.task.cancelled():
+                speculative.task.exception()
+            self.counters["discarded"] += 1
+        else:
+            speculative.task.cancel()
+            self.counters["cancelled"] += 1
+        self.wasted_seconds += self._run_time(speculative)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "started": self.counters["started"],
+            "committed": self.counters["committed"],
+            "cancelled": self.counters["cancelled"],
+            "discarded": self.counters["discarded"],
+            "failed": self.counters["failed"],
+            "parked": len(self._parked),
+            "saved_seconds": self.saved_seconds,
+            "wasted_seconds": self.wasted_seconds,
+        }
+
+
+# 实例化单例
+speculation_manager = SpeculationManager()
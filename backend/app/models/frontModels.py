@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Any, Literal
 
 from fastapi import UploadFile
 from pydantic import BaseModel, Field
@@ -20,6 +20,12 @@ class FrontUserQueryInterrupt(BaseModel):
     resume_data: Optional[dict]
 
 
+class ChatStreamEvent(BaseModel):
+    """/chat/stream 推送给前端的 SSE 事件"""
+    event: Literal["route", "node", "retrieval", "token", "interrupt", "done", "error"]
+    data: Any = Field(default=None)
+
+
 class LeaveData(BaseModel):
     """提取请假所需信息"""
     leave_type: Optional[str] = Field(None, description="请假类型，必须归一化为 'sick' (病假), 'personal' (事假), 或 'other' (其他)")
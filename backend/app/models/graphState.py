@@ -16,6 +16,7 @@ class UserProfile(TypedDict):
 
 class GraphState(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
+    conversation_summary: Optional[str]  # 已折叠出保留窗口的历史对话摘要
 
     # 2. 上下文层 (Context Layer)
     # 当前对话的用户是谁？从 API Gateway 传入，贯穿全流程
@@ -34,10 +35,13 @@ class GraphState(TypedDict):
     file_name: Optional[str]
     file_path: Optional[str]
     file_content: Optional[bytes]
+    grade_upload: Optional[Dict[str, Any]]  # 成绩上传待确认的 diff 与待写入数据
 
     # rag数据
     rag_query_params: Optional[dict]
     rag_query_results: Optional[list[str]]
+    rag_query_source_ids: Optional[list[str]]  # 检索命中的 hfut_policy 分片 ID (讲座/活动查询时为 campus_events.id)
+    answer_cache_hit: Optional[bool]  # 本轮是否命中语义答案缓存
 
 
 # 定义路由的目标选项
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -7,3 +9,8 @@ class RagQuery(BaseModel):
     keywords: str = Field(description="提取3-5个核心关键词，用空格分隔")
     domain: str = Field(description="确定搜索领域：academic (教务), life (生活), news (新闻)",
                         default="hfut_postgraduate_admission_policy")
+    # 以下字段只在 domain 为 campus_events (讲座/活动) 时使用，作为 Qdrant payload 过滤条件
+    event_type: Optional[str] = Field(description="活动类型：lecture (讲座) 或 news (新闻)，未提及时为空", default=None)
+    time_start: Optional[str] = Field(description="开始时间下限，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM", default=None)
+    time_end: Optional[str] = Field(description="开始时间上限，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM", default=None)
+    location: Optional[str] = Field(description="地点关键词，如 图书馆、翡翠湖校区", default=None)
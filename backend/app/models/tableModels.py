@@ -2,7 +2,7 @@ import enum
 from datetime import date, datetime
 from typing import List, Optional
 
-from sqlalchemy import String, Integer, Boolean, ForeignKey, DECIMAL, Text, Date, DateTime, func, Enum
+from sqlalchemy import String, Integer, Boolean, ForeignKey, DECIMAL, Text, Date, DateTime, func, Enum, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
@@ -176,6 +176,13 @@ class CampusEvent(Base):
     location: Mapped[Optional[str]] = mapped_column(String(100))
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    # 由数据库维护，直接改表的 SQL 也会更新；作为 Qdrant 增量同步的水位
+    # 已有数据库需先执行 files/migrations/001_campus_events_updated_at.sql
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        index=True,
+    )
     status: Mapped[int] = mapped_column(Integer, default=1, comment="1正常 0删除")
 
 
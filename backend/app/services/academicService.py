@@ -0,0 +1,134 @@
+"""教务数据查询
+
+campusTools 中的工具通过这里读取成绩与课表，查询结果经过 tool_cache 缓存。
+也可以直接运行预热当前学期所有选课学生的缓存 (学期初执行)：
+    python -m backend.app.services.academicService --warm
+"""
+import asyncio
+from typing import Optional
+
+from sqlalchemy import select
+
+from .toolCache import tool_cache
+from ..core.config import get_settings
+from ..db.session import get_async_db
+from ..models.tableModels import Enrollment, CourseSchedule, Course, Teacher, Semester
+from ..models.toolTableModels import ScoreToolResponse, CourseToolResponse
+
+
+async def query_grades(user_id: int) -> list[dict]:
+    async with get_async_db() as db:
+        stmt = (
+            select(
+                Course.name.label("course_name"),
+                Enrollment.score,
+                Enrollment.grade_point,
+                Enrollment.status,
+                Semester.name.label("semester_name")
+            )
+            .select_from(Enrollment)
+            .join(CourseSchedule, Enrollment.schedule_id == CourseSchedule.id)
+            .join(Course, CourseSchedule.course_id == Course.id)
+            .join(Semester, CourseSchedule.semester_id == Semester.id)
+            .where(Enrollment.student_id == user_id)
+            .where(Enrollment.score.isnot(None))  # 使用 .isnot(None)
+            .order_by(Semester.id.desc())
+        )
+
+        result = await db.execute(stmt)
+        score_data = result.mappings().all()
+        return [ScoreToolResponse.model_validate(s).model_dump() for s in score_data]
+
+
+async def query_current_courses(user_id: int) -> Optional[list[dict]]:
+    async with get_async_db() as db:
+        try:
+            # 我们从 Enrollment 出发，因为只有学生选了课才会在课表里
+            stmt = (
+                select(
+                    Course.name.label("course_name"),
+                    Teacher.name.label("teacher_name"),
+                    CourseSchedule.classroom,
+                    CourseSchedule.day_of_week,
+                    CourseSchedule.start_period,
+                    CourseSchedule.end_period,
+                    CourseSchedule.week_range,
+                    Semester.name.label("semester_name")
+                )
+                # 显式指定起始表，按照关系链条依次连接
+                .select_from(Enrollment)
+                .join(CourseSchedule, Enrollment.schedule_id == CourseSchedule.id)
+                .join(Course, CourseSchedule.course_id == Course.id)
+                .join(Teacher, CourseSchedule.teacher_id == Teacher.id)
+                .join(Semester, CourseSchedule.semester_id == Semester.id)
+                .where(Enrollment.student_id == user_id)
+                .where(Semester.is_current == True)
+                .where(Enrollment.status == "enrolled")
+                .order_by(CourseSchedule.day_of_week, CourseSchedule.start_period)
+            )
+
+            result = await db.execute(stmt)
+            schedule_data = result.mappings().all()
+            return [CourseToolResponse.model_validate(s).model_dump() for s in schedule_data]
+
+        except Exception as e:
+            print(f"查询课表时发生错误: {str(e)}")
+            return None
+
+
+async def get_grades(user_id: int) -> list[dict]:
+    return await tool_cache.get_or_load("grades", user_id, lambda: query_grades(user_id))
+
+
+async def get_current_courses(user_id: int) -> Optional[list[dict]]:
+    return await tool_cache.get_or_load("courses", user_id, lambda: query_current_courses(user_id))
+
+
+async def warm_up_tool_cache() -> int:
+    """为当前学期所有选课学生预热成绩与课表缓存，返回预热的学生数"""
+    async with get_async_db() as db:
+        result = await db.execute(
+            select(Enrollment.student_id)
+            .join(CourseSchedule, Enrollment.schedule_id == CourseSchedule.id)
+            .join(Semester, CourseSchedule.semester_id == Semester.id)
+            .where(Semester.is_current == True)
+            .distinct()
+        )
+        student_ids = result.scalars().all()
+
+    # 先清掉旧值，保证 get_or_load 重新查询
+    await tool_cache.invalidate_students(student_ids)
+    semaphore = asyncio.Semaphore(get_settings().tool_cache_warm_concurrency)
+
+    async def warm(student_id: int):
+        async with semaphore:
+            await get_grades(student_id)
+            await get_current_courses(student_id)
+
+    await asyncio.gather(*(warm(student_id) for student_id in student_ids))
+    tool_cache.counters["warmed_students"] += len(student_ids)
+    print(f"工具结果缓存预热完成: {len(student_ids)} 名学生")
+    return len(student_ids)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ..db.session import db_manager
+
+    parser = argparse.ArgumentParser(description="教务工具结果缓存维护")
+    parser.add_argument("--warm", action="store_true", help="预热当前学期所有选课学生的缓存")
+    parser.add_argument("--switch-semester", action="store_true", help="学期切换后失效所有课表缓存")
+    args = parser.parse_args()
+
+    async def main():
+        db_manager.init_resources()
+        try:
+            if args.switch_semester:
+                await tool_cache.invalidate_semester()
+            if args.warm:
+                await warm_up_tool_cache()
+        finally:
+            await db_manager.close_resources()
+
+    asyncio.run(main())
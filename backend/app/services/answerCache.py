@@ -0,0 +1,172 @@
+"""RAG 语义答案缓存
+
+同一个问题的不同问法 (如 "保研对绩点有什么要求") 通过向量相似度命中同一条缓存，
+在改写之前查询 (领域由关键词规则粗判，判断不出时不限领域)，命中时直接返回已生成的答案与出处，跳过改写、检索和回答。
+依赖上文的追问既不查询也不写入缓存。
+每条缓存记录它引用的 hfut_policy 分片 ID，分片重新入库时据此失效；超过 answer_cache_ttl 的条目由后台任务定期删除。
+"""
+import asyncio
+import time
+import uuid
+from typing import Optional
+
+from qdrant_client.http import models
+
+from .qdrantSchema import answer_cache_schema, ensure_collection, search_params
+from ..agents.embeddingCache import normalize_text
+from ..agents.embeddingModelBase import EmbeddingModelBase
+from ..core.config import get_settings
+from ..db.session import get_qdrant
+
+
+class SemanticAnswerCache:
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.answer_cache_enabled
+        self.collection_name = settings.answer_cache_collection
+        self.threshold = settings.answer_cache_threshold
+        self.ttl = settings.answer_cache_ttl
+        self.sweep_interval = settings.answer_cache_sweep_interval
+        self._collection_ready = False
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    async def _ensure_collection(self, vector_size: int):
+        if self._collection_ready:
+            return
+        await ensure_collection(answer_cache_schema(), vector_size)
+        self._collection_ready = True
+
+    async def _embed(self, question: str) -> list[float]:
+        embedding_model = EmbeddingModelBase().get_model()
+        return await embedding_model.aembed_query(normalize_text(question))
+
+    async def lookup(self, question: str, domain: Optional[str] = None) -> Optional[dict]:
+        """
+        Args:
+            question: 用户原始问题
+            domain: 检索领域，已知时只在该领域内匹配
+        Returns:
+            命中时返回 {"answer", "source_ids", "domain", "score"}，否则 None
+        """
+        if not self.enabled:
+            return None
+        qdrant_client = await get_qdrant()
+        if not self._collection_ready and not await qdrant_client.collection_exists(self.collection_name):
+            return None
+        must = [
+            models.FieldCondition(key="created_at", range=models.Range(gte=time.time() - self.ttl))
+        ]
+        if domain:
+            must.append(models.FieldCondition(key="domain", match=models.MatchValue(value=domain)))
+        results = await qdrant_client.query_points(
+            collection_name=self.collection_name,
+            query=await self._embed(question),
+            limit=1,
+            score_threshold=self.threshold,
+            search_params=search_params(),
+            with_payload=True,
+            query_filter=models.Filter(must=must),
+        )
+        if not results.points:
+            return None
+        hit = results.points[0]
+        return {
+            "answer": hit.payload["answer"],
+            "source_ids": hit.payload.get("source_ids", []),
+            "domain": hit.payload.get("domain"),
+            "score": hit.score,
+        }
+
+    async def store(self, question: str, answer: str, domain: str, source_ids: list[str]):
+        if not self.enabled:
+            return
+        vector = await self._embed(question)
+        await self._ensure_collection(len(vector))
+        qdrant_client = await get_qdrant()
+        await qdrant_client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                models.PointStruct(
+                    # 同一领域下同一问题只保留一条
+                    id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{domain}:{normalize_text(question)}")),
+                    vector=vector,
+                    payload={
+                        "question": question,
+                        "answer": answer,
+                        "domain": domain,
+                        "source_ids": [str(i) for i in source_ids],
+                        "created_at": time.time(),
+                    },
+                )
+            ],
+        )
+
+    async def invalidate_sources(self, source_ids: list[str]):
+        """删除引用了这些 hfut_policy 分片的缓存答案"""
+        if not source_ids:
+            return
+        qdrant_client = await get_qdrant()
+        if not await qdrant_client.collection_exists(self.collection_name):
+            return
+        await qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key="source_ids",
+                            match=models.MatchAny(any=[str(i) for i in source_ids])
+                        )
+                    ]
+                )
+            ),
+        )
+
+    async def purge_expired(self):
+        """按 created_at 删除已过期的缓存答案"""
+        qdrant_client = await get_qdrant()
+        if not await qdrant_client.collection_exists(self.collection_name):
+            return
+        await qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(key="created_at", range=models.Range(lt=time.time() - self.ttl))
+                    ]
+                )
+            ),
+        )
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                print(f"语义答案缓存清理失败: {e}")
+
+    def start_sweeper(self):
+        if not self.enabled:
+            return
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self):
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+
+
+_answer_cache = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache()
+    return _answer_cache
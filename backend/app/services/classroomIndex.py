@@ -0,0 +1,169 @@
+"""空教室 / 排课冲突查询
+
+从当前学期的 course_schedules 构建 RoomIndex (见 utils/roomIndex.py)，常驻内存；
+收到 tool_cache 的排课 / 学期失效广播后在后台整体重建，重建完成前继续使用旧索引。
+"""
+import asyncio
+import datetime
+from typing import Optional
+
+from sqlalchemy import select
+
+from .toolCache import tool_cache
+from ..core.config import get_settings
+from ..db.session import get_async_db
+from ..models.tableModels import CourseSchedule, Course, Teacher, Semester
+from ..utils.academicCalendar import parse_week_range, parse_clock, teaching_week, current_period, DAY_NAMES
+from ..utils.backgroundTasks import spawn
+from ..utils.roomIndex import RoomIndex, ScheduleSlot
+
+
+class ClassroomIndex:
+    def __init__(self):
+        settings = get_settings()
+        self.period_starts = [parse_clock(t) for t in settings.class_period_starts]
+        self.building_coordinates = settings.building_coordinates
+        self._index: Optional[RoomIndex] = None
+        self._semester: Optional[dict] = None
+        self._lock = asyncio.Lock()
+        self._stale = False
+        self.rebuilds = 0
+        self.last_build_ms: Optional[float] = None
+        tool_cache.add_invalidation_handler(self._on_invalidation)
+
+    async def _build(self):
+        start = asyncio.get_running_loop().time()
+        async with get_async_db() as db:
+            result = await db.execute(select(Semester).where(Semester.is_current == True).limit(1))
+            semester = result.scalar_one_or_none()
+            if semester is None:
+                return None, None
+            result = await db.execute(
+                select(
+                    CourseSchedule.id,
+                    Course.name.label("course_name"),
+                    CourseSchedule.teacher_id,
+                    Teacher.name.label("teacher_name"),
+                    CourseSchedule.classroom,
+                    CourseSchedule.day_of_week,
+                    CourseSchedule.start_period,
+                    CourseSchedule.end_period,
+                    CourseSchedule.week_range,
+                )
+                .join(Course, CourseSchedule.course_id == Course.id)
+                .join(Teacher, CourseSchedule.teacher_id == Teacher.id)
+                .where(CourseSchedule.semester_id == semester.id)
+            )
+            rows = result.mappings().all()
+        slots = [
+            ScheduleSlot(
+                schedule_id=row["id"],
+                course_name=row["course_name"],
+                teacher_id=row["teacher_id"],
+                teacher_name=row["teacher_name"],
+                classroom=row["classroom"] or "",
+                day_of_week=row["day_of_week"],
+                start_period=row["start_period"],
+                end_period=row["end_period"],
+                weeks=parse_week_range(row["week_range"]),
+            )
+            for row in rows
+            if row["day_of_week"] and row["start_period"] and row["end_period"]
+        ]
+        # 构建是纯 CPU 计算，放到线程中避免阻塞事件循环
+        index = await asyncio.to_thread(RoomIndex, slots, self.building_coordinates)
+        self.rebuilds += 1
+        self.last_build_ms = (asyncio.get_running_loop().time() - start) * 1000
+        return index, {"id": semester.id, "name": semester.name, "start_date": semester.start_date}
+
+    async def rebuild(self):
+        async with self._lock:
+            self._stale = False
+            self._index, self._semester = await self._build()
+
+    async def get(self) -> Optional[RoomIndex]:
+        if self._index is None:
+            async with self._lock:
+                if self._index is None:
+                    self._index, self._semester = await self._build()
+        return self._index
+
+    def _on_invalidation(self, data: dict):
+        if not (data.get("schedules") or data.get("semester")) or self._index is None:
+            return
+        # 连续多条广播只触发一次重建
+        if not self._stale:
+            self._stale = True
+            spawn(self.rebuild())
+
+    def _position(self, now: datetime.datetime) -> tuple[int, int, int]:
+        """当前时刻对应的 (教学周, 星期, 节次)，课间按下一节计算"""
+        week = teaching_week(self._semester["start_date"], now.date()) if self._semester["start_date"] else 1
+        return week, now.isoweekday(), max(current_period(now.time(), self.period_starts), 1)
+
+    async def find_free(
+            self,
+            day_of_week: Optional[int] = None,
+            start_period: Optional[int] = None,
+            end_period: Optional[int] = None,
+            week: Optional[int] = None,
+            building: Optional[str] = None,
+            limit: int = 20,
+    ) -> dict:
+        """空教室，未指定的参数取当前时刻"""
+        index = await self.get()
+        if index is None:
+            return {"rooms": []}
+        current_week, today, period = self._position(datetime.datetime.now())
+        week = week or current_week
+        day_of_week = day_of_week or today
+        start_period = start_period or period
+        end_period = max(end_period or start_period, start_period)
+        result = {
+            "week": week,
+            "day_of_week": day_of_week,
+            "day_name": DAY_NAMES[day_of_week] if 0 < day_of_week < len(DAY_NAMES) else "",
+            "start_period": start_period,
+            "end_period": end_period,
+            "building": building,
+            "rooms": index.free_rooms(week, day_of_week, start_period, end_period, building=building, limit=limit),
+        }
+        if building:
+            resolved = index.resolve_building(building)
+            result["building"] = resolved or building
+            if resolved is None:
+                # 让模型如实告知用户，而不是把全校结果说成该楼栋的
+                result["building_unknown"] = True
+        return result
+
+    async def find_conflicts(self, kind: Optional[str] = None, name: Optional[str] = None) -> list[dict]:
+        """
+        Args:
+            kind: room (教室冲突) / teacher (教师冲突)，None 表示全部
+            name: 只返回涉及该教室或教师姓名的冲突
+        """
+        index = await self.get()
+        if index is None:
+            return []
+        conflicts = index.conflicts(kind)
+        if name:
+            conflicts = [
+                c for c in conflicts
+                if name in (c["a"]["classroom"], c["a"]["teacher_name"], c["b"]["classroom"], c["b"]["teacher_name"])
+            ]
+        return conflicts
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "semester": self._semester["name"] if self._semester else None,
+            "rooms": len(index.rooms) if index else 0,
+            "schedules": index.slot_count if index else 0,
+            "conflicts": len(index.conflicts()) if index else 0,
+            "rebuilds": self.rebuilds,
+            "last_build_ms": self.last_build_ms,
+        }
+
+
+# 实例化单例
+classroom_index = ClassroomIndex()
@@ -0,0 +1,112 @@
+"""讲座 / 活动查询：结构化预过滤 + 向量排序
+
+改写阶段从问题中抽取的时间范围、地点、类型转成 campus_events 集合上的 payload 过滤条件
+(start_time 的 DATETIME 索引、location 的全文索引、event_type 的 KEYWORD 索引)，
+Qdrant 只在满足条件的候选集合内做语义排序，返回的 point ID 即 campus_events.id，
+再用一次 IN (...) 查询回表取出完整行，供回答上下文与前端 structured_data 使用。
+"""
+import datetime
+from typing import Optional
+
+from qdrant_client.http import models
+from sqlalchemy import select
+
+from ..agents.embeddingModelBase import EmbeddingModelBase
+from ..core.config import get_settings
+from ..db.session import get_async_db, get_qdrant
+from ..models.tableModels import CampusEvent, EventType
+from .qdrantSchema import search_params
+
+# RagQuery.domain 取该值时走本模块检索
+EVENT_DOMAIN = "campus_events"
+
+
+def parse_time_bound(value: Optional[str], end_of_day: bool = False) -> Optional[datetime.datetime]:
+    """解析改写结果中的时间，只有日期时按区间起点 / 终点补全时分，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if end_of_day and len(value.strip()) <= 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed
+
+
+def build_event_filter(params: dict) -> Optional[models.Filter]:
+    must = []
+    start = parse_time_bound(params.get("time_start"))
+    end = parse_time_bound(params.get("time_end"), end_of_day=True)
+    if start or end:
+        must.append(models.FieldCondition(key="start_time", range=models.DatetimeRange(gte=start, lte=end)))
+    location = (params.get("location") or "").strip()
+    if location:
+        must.append(models.FieldCondition(key="location", match=models.MatchText(text=location)))
+    event_type = params.get("event_type")
+    if event_type in EventType._value2member_map_:
+        must.append(models.FieldCondition(key="event_type", match=models.MatchValue(value=event_type)))
+    return models.Filter(must=must) if must else None
+
+
+def _event_row(event: CampusEvent) -> dict:
+    return {
+        "id": event.id,
+        "title": event.title,
+        "summary": event.summary,
+        "event_type": event.event_type.value if event.event_type else None,
+        "start_time": event.start_time.isoformat(sep=" ", timespec="minutes") if event.start_time else None,
+        "end_time": event.end_time.isoformat(sep=" ", timespec="minutes") if event.end_time else None,
+        "location": event.location,
+    }
+
+
+def _event_text(row: dict) -> str:
+    lines = [f"【{row['title']}】"]
+    if row["start_time"]:
+        lines.append(f"时间: {row['start_time']}" + (f" ~ {row['end_time']}" if row["end_time"] else ""))
+    if row["location"]:
+        lines.append(f"地点: {row['location']}")
+    if row["summary"]:
+        lines.append(row["summary"])
+    return "\n".join(lines)
+
+
+async def hydrate_events(event_ids: list[int]) -> list[dict]:
+    """一次 IN 查询取回所有命中的活动，并保持向量排序的顺序"""
+    if not event_ids:
+        return []
+    async with get_async_db() as db:
+        result = await db.execute(
+            select(CampusEvent).where(CampusEvent.id.in_(event_ids), CampusEvent.status == 1)
+        )
+        events = {e.id: e for e in result.scalars().all()}
+    # 同步有延迟时，Qdrant 中可能还残留刚被软删除的活动，这里直接跳过
+    return [_event_row(events[i]) for i in event_ids if i in events]
+
+
+async def search_events(params: dict, question: str) -> dict:
+    settings = get_settings()
+    query_filter = build_event_filter(params)
+    query_text = params.get("hyde_doc") or question
+
+    embedding_model = EmbeddingModelBase().get_model()
+    qdrant_client = await get_qdrant()
+    query_vector = await embedding_model.aembed_query(query_text)
+
+    # 过滤条件由 payload 索引完成，向量只在候选集合内排序；只需要 ID，不取 payload
+    search_results = await qdrant_client.query_points(
+        collection_name=settings.event_collection,
+        query=query_vector,
+        query_filter=query_filter,
+        search_params=search_params(),
+        limit=settings.event_search_limit,
+        with_payload=False,
+    )
+    rows = await hydrate_events([int(hit.id) for hit in search_results.points])
+
+    return {
+        "texts": [_event_text(row) for row in rows],
+        "source_ids": [str(row["id"]) for row in rows],
+        "events": rows,
+    }
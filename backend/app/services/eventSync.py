@@ -0,0 +1,292 @@
+"""campus_events -> Qdrant 增量同步
+
+以 (updated_at, id) 作为高水位，每轮只读取水位之后变化过的行：
+- status=0 (软删除) 的行删除对应 point
+- 嵌入文本 (标题 + 摘要) 的 hash 与 Qdrant 中一致时只覆盖 payload，不重新向量化
+- 其余行按批次向量化后 upsert，point ID 直接使用 campus_events.id
+每轮有时间预算与批次上限，开销只与变化的行数有关，与表的总行数无关。
+多个 worker 通过 Redis 锁保证同一时刻只有一个在同步：锁的值是本轮的随机 token，
+每批完成后续期，只有 token 仍匹配时才续期 / 释放；锁已被其他 worker 接手时本轮立即停止，不再推进水位。
+截止时间取自 MySQL 的 NOW()，与 updated_at (CURRENT_TIMESTAMP) 处于同一时区。
+
+用法 (在仓库根目录):
+    python -m backend.app.services.eventSync            # 追平一次
+    python -m backend.app.services.eventSync --reset    # 清空水位后全量重建
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from qdrant_client.http import models
+from sqlalchemy import func, select, tuple_
+
+from .qdrantSchema import ensure_collection, event_schema
+from ..agents.embeddingModelBase import EmbeddingModelBase
+from ..core.config import get_settings
+from ..db.session import db_manager, get_async_db, get_qdrant
+from ..models.tableModels import CampusEvent
+
+WATERMARK_KEY = "eventsync:watermark"
+LOCK_KEY = "eventsync:lock"
+# 只有锁仍归自己所有时才释放 / 续期，避免误删其他 worker 的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+RENEW_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+# 未写入过水位时的起点
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def event_text(event: CampusEvent) -> str:
+    """参与向量化的文本：标题 + 向量化摘要，没有摘要时取正文开头"""
+    body = event.summary or (event.content or "")[:500]
+    return f"{event.title}\n{body}".strip()
+
+
+def event_payload(event: CampusEvent, text_hash: str) -> dict:
+    return {
+        "event_id": event.id,
+        "title": event.title,
+        "event_type": event.event_type.value if event.event_type else None,
+        "start_time": event.start_time.isoformat() if event.start_time else None,
+        "end_time": event.end_time.isoformat() if event.end_time else None,
+        "location": event.location,
+        "text_hash": text_hash,
+    }
+
+
+class CampusEventSync:
+    def __init__(self):
+        settings = get_settings()
+        self.settings = settings
+        self.collection_name = settings.event_collection
+        self.batch_size = settings.event_sync_batch_size
+        self.max_batches = settings.event_sync_max_batches
+        self.time_budget = settings.event_sync_time_budget
+        # 只同步 lag 秒之前更新的行，避免同一秒内稍后提交的行被水位跳过
+        self.lag = datetime.timedelta(seconds=settings.event_sync_lag_seconds)
+        self.embedding_model = EmbeddingModelBase().get_model(cached=False)
+        self._collection_ready = False
+        self._task: Optional[asyncio.Task] = None
+        self.counters = Counter()
+        self.last_cycle: dict = {}
+
+    async def _ensure_collection(self, vector_size: int):
+        if self._collection_ready:
+            return
+        # 集合结构 (start_time / location / event_type 索引) 在 qdrantSchema 中声明
+        await ensure_collection(event_schema(), vector_size)
+        self._collection_ready = True
+
+    async def _read_watermark(self) -> tuple[datetime.datetime, int]:
+        raw = await db_manager.redis.get(WATERMARK_KEY)
+        if not raw:
+            return EPOCH, 0
+        data = json.loads(raw)
+        return datetime.datetime.fromisoformat(data["updated_at"]), data["id"]
+
+    async def _write_watermark(self, updated_at: datetime.datetime, event_id: int):
+        await db_manager.redis.set(WATERMARK_KEY, json.dumps({"updated_at": updated_at.isoformat(), "id": event_id}))
+
+    async def _db_now(self) -> datetime.datetime:
+        """数据库会话时区下的当前时间，与 updated_at 的 CURRENT_TIMESTAMP 一致"""
+        async with get_async_db() as db:
+            return (await db.execute(select(func.now()))).scalar_one()
+
+    async def _fetch_batch(self, watermark: tuple[datetime.datetime, int], until: datetime.datetime) -> list[CampusEvent]:
+        async with get_async_db() as db:
+            result = await db.execute(
+                select(CampusEvent)
+                .where(tuple_(CampusEvent.updated_at, CampusEvent.id) > tuple_(*watermark))
+                .where(CampusEvent.updated_at <= until)
+                .order_by(CampusEvent.updated_at, CampusEvent.id)
+                .limit(self.batch_size)
+            )
+            return list(result.scalars().all())
+
+    async def _apply_batch(self, events: list[CampusEvent]):
+        qdrant_client = await get_qdrant()
+        deleted = [e.id for e in events if e.status == 0]
+        alive = [e for e in events if e.status != 0]
+        if deleted and await qdrant_client.collection_exists(self.collection_name):
+            await qdrant_client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=deleted),
+            )
+            self.counters["deleted"] += len(deleted)
+        if not alive:
+            return
+
+        texts = {e.id: event_text(e) for e in alive}
+        hashes = {e.id: hashlib.sha256(texts[e.id].encode("utf-8")).hexdigest() for e in alive}
+        existing = {}
+        if self._collection_ready or await qdrant_client.collection_exists(self.collection_name):
+            points = await qdrant_client.retrieve(
+                collection_name=self.collection_name,
+                ids=[e.id for e in alive],
+                with_payload=["text_hash"],
+                with_vectors=False,
+            )
+            existing = {int(p.id): (p.payload or {}).get("text_hash") for p in points}
+
+        # 只改了时间、地点等字段的行：覆盖 payload，不重新向量化；整批合并为一次请求
+        payload_only = [e for e in alive if existing.get(e.id) == hashes[e.id]]
+        if payload_only:
+            await qdrant_client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    models.OverwritePayloadOperation(
+                        overwrite_payload=models.SetPayload(
+                            payload=event_payload(e, hashes[e.id]),
+                            points=[e.id],
+                        )
+                    )
+                    for e in payload_only
+                ],
+            )
+            self.counters["payload_only"] += len(payload_only)
+
+        to_embed = [e for e in alive if existing.get(e.id) != hashes[e.id]]
+        if to_embed:
+            vectors = await self.embedding_model.aembed_documents([texts[e.id] for e in to_embed])
+            await self._ensure_collection(len(vectors[0]))
+            await qdrant_client.upsert(
+                collection_name=self.collection_name,
+                points=[
+                    models.PointStruct(id=e.id, vector=vector, payload=event_payload(e, hashes[e.id]))
+                    for e, vector in zip(to_embed, vectors)
+                ],
+                wait=True,
+            )
+            self.counters["embedded"] += len(to_embed)
+
+    async def run_cycle(self) -> dict:
+        """追平一轮：直到没有新变化、达到批次上限或超出时间预算"""
+        redis_client = db_manager.redis
+        token = uuid.uuid4().hex
+        lock_ttl = int(self.time_budget * 2) + 10
+        if not await redis_client.set(LOCK_KEY, token, nx=True, ex=lock_ttl):
+            return {"skipped": "其他 worker 正在同步"}
+        start = time.perf_counter()
+        processed, batches = 0, 0
+        drained = False
+        try:
+            watermark = await self._read_watermark()
+            until = await self._db_now() - self.lag
+            while batches < self.max_batches and time.perf_counter() - start < self.time_budget:
+                events = await self._fetch_batch(watermark, until)
+                if not events:
+                    drained = True
+                    break
+                await self._apply_batch(events)
+                # 单批耗时超过锁有效期时锁可能已被其他 worker 接手：此时不推进水位，交给对方继续
+                if not await redis_client.eval(RENEW_LOCK_SCRIPT, 1, LOCK_KEY, token, lock_ttl):
+                    self.counters["lock_lost"] += 1
+                    break
+                # 每批成功后推进水位，中途失败下一轮从失败的批次重试
+                watermark = (events[-1].updated_at, events[-1].id)
+                await self._write_watermark(*watermark)
+                processed += len(events)
+                batches += 1
+                if len(events) < self.batch_size:
+                    drained = True
+                    break
+        finally:
+            await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+        self.counters["cycles"] += 1
+        self.counters["processed"] += processed
+        self.last_cycle = {
+            "processed": processed,
+            "batches": batches,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "watermark": watermark[0].isoformat(),
+            # 本轮是否因预算用尽而提前结束，下一轮继续追
+            "caught_up": drained,
+        }
+        return self.last_cycle
+
+    async def reset(self):
+        """清空水位，下一轮全量重建"""
+        await db_manager.redis.delete(WATERMARK_KEY)
+
+    async def _loop(self):
+        while True:
+            try:
+                cycle = await self.run_cycle()
+                # 还没追平时立即进入下一轮
+                if cycle.get("caught_up", True):
+                    await asyncio.sleep(self.settings.event_sync_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"campus_events 同步失败: {e}")
+                self.counters["errors"] += 1
+                await asyncio.sleep(self.settings.event_sync_interval)
+
+    def start(self):
+        """应用启动时调用"""
+        if self._task is None and self.settings.event_sync_enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """应用关闭时调用"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.settings.event_sync_enabled,
+            "collection": self.collection_name,
+            **{k: self.counters[k] for k in ("cycles", "processed", "embedded", "payload_only", "deleted", "errors", "lock_lost")},
+            "last_cycle": self.last_cycle,
+        }
+
+
+_event_sync: Optional[CampusEventSync] = None
+
+
+def get_event_sync() -> CampusEventSync:
+    global _event_sync
+    if _event_sync is None:
+        _event_sync = CampusEventSync()
+    return _event_sync
+
+
+async def main(args: argparse.Namespace):
+    db_manager.init_resources()
+    try:
+        sync = get_event_sync()
+        if args.reset:
+            await sync.reset()
+        while True:
+            cycle = await sync.run_cycle()
+            print(f"同步一轮: {cycle}")
+            if cycle.get("caught_up", True):
+                break
+    finally:
+        await db_manager.close_resources()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="campus_events 增量同步到 Qdrant")
+    parser.add_argument("--reset", action="store_true", help="清空水位后全量重建")
+    asyncio.run(main(parser.parse_args()))
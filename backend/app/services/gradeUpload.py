@@ -0,0 +1,359 @@
+"""教师期末成绩批量上传
+
+流程 (对应 SystemDesign.md 中 "期末成绩上传")：
+1. parse: Excel / CSV 按块读取，每块用 pandas 向量化校验学号、分数，并批量计算绩点
+2. diff: 一次查询取出该教师本学期所有选课记录，与上传数据 merge，得到新增 / 修改 / 未变化 / 无法匹配
+3. 教师在中断确认界面看到 diff 摘要，确认后 apply 用一条 INSERT ... ON DUPLICATE KEY UPDATE 批量写入
+
+表头支持中英文：学号(student_number)、成绩/分数(score)、课程代码(course_code)、课程名称(course_name)。
+课程列可省略，此时要求该教师本学期只有一门课。
+
+性能自检 (在仓库根目录):
+    python -m backend.app.services.gradeUpload --rows 5000                 # 合成数据上的校验 + 绩点计算 + upsert 语句构造耗时
+    python -m backend.app.services.gradeUpload --rows 5000 --teacher-id 3  # 另外计时批量 upsert (事务回滚，不改数据)
+"""
+import argparse
+import asyncio
+import io
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects.mysql import insert
+
+from .toolCache import tool_cache
+from ..core.config import get_settings
+from ..db.session import db_manager, get_async_db
+from ..models.tableModels import Enrollment, CourseSchedule, Course, Semester, Student, EnrollmentStatus
+
+COLUMN_ALIASES = {
+    "学号": "student_number",
+    "student_number": "student_number",
+    "成绩": "score",
+    "分数": "score",
+    "总评": "score",
+    "score": "score",
+    "课程代码": "course_code",
+    "course_code": "course_code",
+    "课程名称": "course_name",
+    "课程": "course_name",
+    "course_name": "course_name",
+}
+
+# 百分制到绩点：分数下限与对应绩点，按分数升序
+GRADE_POINT_BINS = np.array([60, 64, 68, 72, 75, 78, 82, 85, 90], dtype=np.float64)
+GRADE_POINT_VALUES = np.array([0.0, 1.0, 1.5, 2.0, 2.3, 2.7, 3.0, 3.3, 3.7, 4.0], dtype=np.float64)
+
+PREVIEW_ROWS = 50
+
+
+class GradeUploadError(Exception):
+    """文件格式错误或无法确定课程"""
+
+
+def grade_points(scores: np.ndarray) -> np.ndarray:
+    return GRADE_POINT_VALUES[np.searchsorted(GRADE_POINT_BINS, scores, side="right")]
+
+
+def _normalize_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    if "student_number" not in frame.columns or "score" not in frame.columns:
+        raise GradeUploadError("表头中缺少 学号 或 成绩 列")
+    return frame[[c for c in ("student_number", "score", "course_code", "course_name") if c in frame.columns]]
+
+
+def iter_chunks(content: bytes, file_name: Optional[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按块读取上传文件，全部列先按字符串读入，后续统一向量化转换"""
+    if file_name and file_name.lower().endswith(".csv"):
+        for chunk in pd.read_csv(io.BytesIO(content), dtype=str, chunksize=chunk_size):
+            yield _normalize_columns(chunk)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield _normalize_columns(pd.DataFrame(batch, columns=header, dtype=str))
+                batch = []
+        if batch:
+            yield _normalize_columns(pd.DataFrame(batch, columns=header, dtype=str))
+    finally:
+        workbook.close()
+
+
+def validate_chunk(chunk: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Returns:
+        (合法行, 非法行)；合法行带 score / grade_point 数值列，非法行带 error 列
+    """
+    chunk = chunk.copy()
+    chunk["student_number"] = chunk["student_number"].astype("string").str.strip()
+    for column in ("course_code", "course_name"):
+        if column in chunk.columns:
+            chunk[column] = chunk[column].astype("string").str.strip()
+    raw_score = chunk["score"]
+    chunk["score"] = pd.to_numeric(raw_score, errors="coerce")
+
+    bad_number = ~chunk["student_number"].fillna("").str.fullmatch(r"[0-9A-Za-z]{4,20}")
+    bad_score = chunk["score"].isna() | (chunk["score"] < 0) | (chunk["score"] > 100)
+    error = np.select(
+        [bad_number.to_numpy(dtype=bool), bad_score.to_numpy(dtype=bool)],
+        ["学号格式错误", "成绩不是 0-100 的数字"],
+        default="",
+    )
+    invalid = chunk[error != ""].assign(error=error[error != ""], score=raw_score[error != ""])
+    valid = chunk[error == ""].copy()
+    valid["score"] = valid["score"].round(2)
+    valid["grade_point"] = grade_points(valid["score"].to_numpy(dtype=np.float64))
+    return valid, invalid
+
+
+async def _load_enrollments(teacher_id: int) -> pd.DataFrame:
+    """该教师本学期所负责课程的全部选课记录"""
+    async with get_async_db() as db:
+        result = await db.execute(
+            select(
+                Enrollment.id.label("enrollment_id"),
+                Enrollment.student_id,
+                Enrollment.schedule_id,
+                Enrollment.score.label("old_score"),
+                Student.student_number,
+                Student.name.label("student_name"),
+                Course.code.label("course_code"),
+                Course.name.label("course_name"),
+            )
+            .join(Student, Enrollment.student_id == Student.id)
+            .join(CourseSchedule, Enrollment.schedule_id == CourseSchedule.id)
+            .join(Course, CourseSchedule.course_id == Course.id)
+            .join(Semester, CourseSchedule.semester_id == Semester.id)
+            .where(CourseSchedule.teacher_id == teacher_id)
+            .where(Semester.is_current == True)
+            .where(Enrollment.status != EnrollmentStatus.dropped)
+        )
+        rows = result.mappings().all()
+    frame = pd.DataFrame(rows, columns=[
+        "enrollment_id", "student_id", "schedule_id", "old_score",
+        "student_number", "student_name", "course_code", "course_name",
+    ])
+    frame["old_score"] = pd.to_numeric(frame["old_score"], errors="coerce")
+    for column in ("student_number", "course_code", "course_name"):
+        frame[column] = frame[column].astype("string")
+    return frame
+
+
+def _parse_and_validate(content: bytes, file_name: Optional[str], chunk_size: int) -> tuple[pd.DataFrame, pd.DataFrame, int]:
+    """按块解析并校验整个文件，返回 (合法行, 非法行, 总行数)"""
+    valid_parts, invalid_parts = [], []
+    total_rows = 0
+    for chunk in iter_chunks(content, file_name, chunk_size):
+        total_rows += len(chunk)
+        valid, invalid = validate_chunk(chunk)
+        valid_parts.append(valid)
+        invalid_parts.append(invalid)
+    valid = pd.concat(valid_parts, ignore_index=True) if valid_parts else pd.DataFrame()
+    invalid = pd.concat(invalid_parts, ignore_index=True) if invalid_parts else pd.DataFrame()
+    return valid, invalid, total_rows
+
+
+async def prepare_upload(content: bytes, file_name: Optional[str], teacher_id: int) -> dict:
+    """解析、校验并与现有选课记录比对，返回供确认的 diff 与待写入数据"""
+    settings = get_settings()
+    start = time.perf_counter()
+    # openpyxl / pandas 解析与校验是纯 CPU 计算，放到线程中避免阻塞事件循环
+    valid, invalid, total_rows = await asyncio.to_thread(
+        _parse_and_validate, content, file_name, settings.grade_upload_chunk_size
+    )
+    if valid.empty and invalid.empty:
+        raise GradeUploadError("文件中没有成绩数据")
+
+    enrollments = await _load_enrollments(teacher_id)
+    if enrollments.empty:
+        raise GradeUploadError("本学期没有找到您负责课程的选课记录")
+
+    # 确定匹配键：优先课程代码，其次课程名称；都没有时要求教师本学期只有一门课
+    if "course_code" in valid.columns:
+        keys = ["student_number", "course_code"]
+    elif "course_name" in valid.columns:
+        keys = ["student_number", "course_name"]
+    elif enrollments["schedule_id"].nunique() == 1:
+        keys = ["student_number"]
+    else:
+        raise GradeUploadError("您本学期有多门课程，请在表格中增加 课程代码 或 课程名称 列")
+
+    # 同一学生同一课程重复出现，以最后一行为准
+    duplicated = valid.duplicated(keys, keep="last")
+    if duplicated.any():
+        invalid = pd.concat([invalid, valid[duplicated].assign(error="重复行，已使用最后一行")], ignore_index=True)
+        valid = valid[~duplicated]
+
+    merged = valid[keys + ["score", "grade_point"]].merge(
+        enrollments, on=keys, how="left", suffixes=("", "_db")
+    )
+    unmatched = merged["enrollment_id"].isna()
+    if unmatched.any():
+        invalid = pd.concat(
+            [invalid, merged.loc[unmatched, keys + ["score"]].assign(error="该学生未选修此课程")],
+            ignore_index=True,
+        )
+    matched = merged[~unmatched]
+    unchanged = matched["old_score"].round(2).eq(matched["score"])
+    is_new = matched["old_score"].isna()
+    changes = matched[~unchanged].assign(change=np.where(is_new[~unchanged], "new", "changed"))
+
+    summary = {
+        "rows": total_rows,
+        "new": int(is_new.sum()),
+        "changed": int((~unchanged & ~is_new).sum()),
+        "unchanged": int(unchanged.sum()),
+        "errors": int(len(invalid)),
+        "average_score": round(float(matched["score"].mean()), 2) if len(matched) else None,
+        "fail_count": int((matched["score"] < 60).sum()),
+        "prepare_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    preview_columns = ["student_number", "student_name", "course_name", "old_score", "score", "grade_point", "change"]
+    return {
+        "summary": summary,
+        "changes": _records(changes[preview_columns].head(PREVIEW_ROWS)),
+        "errors": _records(invalid.head(PREVIEW_ROWS)),
+        # 待写入数据只保留写库需要的列，按行紧凑存储在图状态中 (tolist 转为 Python 原生类型，便于 checkpoint 序列化)
+        "updates": [list(row) for row in zip(
+            changes["enrollment_id"].astype(int).tolist(),
+            changes["student_id"].astype(int).tolist(),
+            changes["schedule_id"].astype(int).tolist(),
+            changes["score"].tolist(),
+            changes["grade_point"].tolist(),
+        )],
+    }
+
+
+def _records(frame: pd.DataFrame) -> list[dict]:
+    # NaN / pd.NA 转为 None，便于 JSON 序列化
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def _upsert_values(updates: list[list]) -> list[dict]:
+    return [
+        {
+            "id": int(enrollment_id),
+            "student_id": int(student_id),
+            "schedule_id": int(schedule_id),
+            "score": float(score),
+            "grade_point": float(grade_point),
+            "status": EnrollmentStatus.completed,
+        }
+        for enrollment_id, student_id, schedule_id, score, grade_point in updates
+    ]
+
+
+def _upsert_statement():
+    """
+    单条 INSERT ... ON DUPLICATE KEY UPDATE，行数据作为 executemany 参数传入 (db.execute(stmt, values))，
+    由驱动改写为多行 VALUES；SQLAlchemy 只编译一组占位符，不必在事件循环上渲染数万个绑定参数
+    """
+    stmt = insert(Enrollment)
+    return stmt.on_duplicate_key_update(
+        score=stmt.inserted.score,
+        grade_point=stmt.inserted.grade_point,
+        status=stmt.inserted.status,
+    )
+
+
+async def apply_upload(updates: list[list]) -> dict:
+    """一条 INSERT ... ON DUPLICATE KEY UPDATE 写入全部成绩 (行均已存在，实际只走更新分支)"""
+    if not updates:
+        return {"updated": 0, "apply_ms": 0.0}
+    start = time.perf_counter()
+    values = _upsert_values(updates)
+    async with get_async_db() as db:
+        await db.execute(_upsert_statement(), values)
+        await db.commit()
+    # Core 语句不会触发 ORM 失效钩子，显式失效成绩缓存
+    await tool_cache.invalidate_students(v["student_id"] for v in values)
+    return {"updated": len(values), "apply_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def synthetic_frame(rows: int, error_rate: float = 0.02, seed: int = 0) -> pd.DataFrame:
+    """按上传文件的读取方式 (全部列为字符串) 生成合成成绩表，按比例混入非法学号与分数"""
+    rng = np.random.default_rng(seed)
+    numbers = pd.Series([f"2023{i:06d}" for i in range(rows)], dtype=object)
+    scores = pd.Series(rng.uniform(30, 100, rows).round(1).astype(str), dtype=object)
+    bad = rng.random(rows) < error_rate
+    numbers[bad & (rng.random(rows) < 0.5)] = "学号?"
+    scores[bad & (rng.random(rows) >= 0.5)] = "缺考"
+    return pd.DataFrame({"student_number": numbers, "score": scores, "course_code": "CS101"})
+
+
+def benchmark_validation(rows: int, chunk_size: int) -> dict:
+    frame = synthetic_frame(rows)
+    start = time.perf_counter()
+    valid_rows, invalid_rows = 0, 0
+    for offset in range(0, rows, chunk_size):
+        valid, invalid = validate_chunk(frame.iloc[offset:offset + chunk_size])
+        valid_rows += len(valid)
+        invalid_rows += len(invalid)
+    return {
+        "rows": rows,
+        "valid": valid_rows,
+        "invalid": invalid_rows,
+        "validate_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def benchmark_statement(rows: int) -> dict:
+    """合成 rows 行更新，计时客户端构造参数并编译 upsert 语句 (不连数据库)"""
+    scores = np.linspace(40, 100, rows)
+    updates = [[i, i, 1, float(s), float(g)] for i, (s, g) in enumerate(zip(scores, grade_points(scores)), start=1)]
+    start = time.perf_counter()
+    values = _upsert_values(updates)
+    _upsert_statement().compile(dialect=mysql.dialect(), column_keys=list(values[0]))
+    return {"statement_rows": rows, "build_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+async def benchmark_upsert(teacher_id: int, rows: int) -> dict:
+    """用该教师真实的选课记录拼出最多 rows 行的批量 upsert 并计时，事务最后回滚"""
+    enrollments = (await _load_enrollments(teacher_id)).head(rows)
+    if enrollments.empty:
+        return {"upsert_rows": 0, "upsert_ms": 0.0}
+    scores = enrollments["old_score"].fillna(60.0).to_numpy(dtype=np.float64)
+    values = _upsert_values(list(zip(
+        enrollments["enrollment_id"].astype(int).tolist(),
+        enrollments["student_id"].astype(int).tolist(),
+        enrollments["schedule_id"].astype(int).tolist(),
+        scores.tolist(),
+        grade_points(scores).tolist(),
+    )))
+    async with get_async_db() as db:
+        start = time.perf_counter()
+        await db.execute(_upsert_statement(), values)
+        elapsed = time.perf_counter() - start
+        await db.rollback()
+    return {"upsert_rows": len(values), "upsert_ms": round(elapsed * 1000, 1)}
+
+
+async def main(args: argparse.Namespace):
+    print(benchmark_validation(args.rows, get_settings().grade_upload_chunk_size))
+    print(benchmark_statement(args.rows))
+    if args.teacher_id is None:
+        return
+    db_manager.init_resources()
+    try:
+        print(await benchmark_upsert(args.teacher_id, args.rows))
+    finally:
+        await db_manager.close_resources()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="成绩上传校验与批量写入计时")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--teacher-id", type=int, default=None, help="指定时额外计时批量 upsert (回滚，不改数据)")
+    asyncio.run(main(parser.parse_args()))
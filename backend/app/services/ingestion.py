@@ -0,0 +1,373 @@
+"""hfut_policy 批量入库与增量重建索引
+
+用法 (在仓库根目录):
+    python -m backend.app.services.ingestion ./docs/policy --domain hfut_postgraduate_admission_policy
+    python -m backend.app.services.ingestion --domain hfut_postgraduate_admission_policy --backfill-sparse
+
+流程：
+1. 逐个读取目录下的文档 (流式，不会一次性载入全部文件)
+2. 按句切分为带重叠的分片，用 (来源, 内容 hash) 生成确定性的 point ID
+3. 与 Qdrant 中该来源已有的 point 对比：内容未变的分片直接跳过，
+   新分片按批次向量化并并发 upsert，upsert 成功后才删除已不存在的旧分片
+4. 目录中已不存在的文档，其分片全部删除 (--keep-missing 关闭)
+5. 被删除分片对应的语义答案缓存同步失效
+稀疏向量只在集合声明了稀疏向量配置时写入；早于该配置创建的集合仍只写稠密向量，
+但 hybrid 检索模式或 --backfill-sparse 会直接报错，提示先重建集合。
+"""
+import argparse
+import asyncio
+import hashlib
+import re
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+from qdrant_client.http import models
+
+from .answerCache import get_answer_cache
+from .qdrantSchema import ensure_collection, has_sparse_vector, policy_schema
+from ..agents.embeddingModelBase import EmbeddingModelBase
+from ..core.config import get_settings
+from ..db.session import db_manager, get_qdrant
+from ..utils.sparseVector import encode_document
+
+SUPPORTED_SUFFIXES = {".txt", ".md"}
+# 按中文/英文句末标点与换行切句，标点保留在句尾
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;\n])")
+
+
+class IngestionError(Exception):
+    pass
+
+
+@dataclass
+class Chunk:
+    point_id: str
+    content: str
+    source: str
+    chunk_index: int
+    content_hash: str
+
+
+@dataclass
+class IngestionStats:
+    files: int = 0
+    chunks: int = 0
+    skipped: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    deleted_ids: list[str] = field(default_factory=list)
+
+
+def iter_documents(directory: Path) -> Iterator[tuple[str, str]]:
+    """逐个产出 (相对路径, 文本)"""
+    for path in sorted(directory.rglob("*")):
+        if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES:
+            yield path.relative_to(directory).as_posix(), path.read_text(encoding="utf-8")
+
+
+def split_text(text: str, chunk_size: int, overlap: int) -> list[str]:
+    """按句子装箱切分，相邻分片之间保留约 overlap 个字符的重叠"""
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+    chunks, current = [], []
+    current_len = 0
+    for sentence in sentences:
+        if current and current_len + len(sentence) > chunk_size:
+            chunks.append("".join(current))
+            # 从上一分片末尾回溯若干句作为重叠
+            tail, tail_len = [], 0
+            for prev in reversed(current):
+                if tail_len + len(prev) > overlap:
+                    break
+                tail.insert(0, prev)
+                tail_len += len(prev)
+            current, current_len = tail, tail_len
+        current.append(sentence)
+        current_len += len(sentence)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def build_chunks(source: str, text: str, domain: str, chunk_size: int, overlap: int) -> list[Chunk]:
+    chunks = []
+    for index, content in enumerate(split_text(text, chunk_size, overlap)):
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        # ID 由 (领域, 来源, 内容 hash) 决定：内容不变则 ID 不变，可直接跳过
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{domain}:{source}:{content_hash}"))
+        chunks.append(Chunk(point_id, content, source, index, content_hash))
+    return chunks
+
+
+class PolicyIngestion:
+    def __init__(
+            self,
+            domain: str,
+            collection_name: str = "hfut_policy",
+            batch_size: Optional[int] = None,
+            concurrency: Optional[int] = None,
+            chunk_size: Optional[int] = None,
+            chunk_overlap: Optional[int] = None,
+            prune_missing: bool = True,
+    ):
+        settings = get_settings()
+        self.settings = settings
+        self.domain = domain
+        self.collection_name = collection_name
+        self.batch_size = batch_size or settings.ingestion_batch_size
+        self.concurrency = concurrency or settings.ingestion_concurrency
+        self.chunk_size = chunk_size or settings.ingestion_chunk_size
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.ingestion_chunk_overlap
+        self.prune_missing = prune_missing
+        # 入库的是文档向量，不需要经过查询侧的嵌入缓存
+        self.embedding_model = EmbeddingModelBase().get_model(cached=False)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # 多个批次并发执行，集合只能由其中一个创建
+        self._collection_lock = asyncio.Lock()
+        self._collection_ready = False
+        # 线上集合是否声明了稀疏向量，首次写入前读取
+        self._write_sparse: Optional[bool] = None
+        self.stats = IngestionStats()
+
+    def _domain_condition(self) -> models.FieldCondition:
+        return models.FieldCondition(key="metadata.domain", match=models.MatchValue(value=self.domain))
+
+    async def _existing_ids(self, source: str) -> set[str]:
+        return await self._scroll_ids(models.Filter(must=[
+            self._domain_condition(),
+            models.FieldCondition(key="metadata.source", match=models.MatchValue(value=source)),
+        ]))
+
+    async def _scroll_ids(self, scroll_filter: models.Filter) -> set[str]:
+        qdrant_client = await get_qdrant()
+        if not await qdrant_client.collection_exists(self.collection_name):
+            return set()
+        ids, offset = set(), None
+        while True:
+            points, offset = await qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids.update(str(p.id) for p in points)
+            if offset is None:
+                return ids
+
+    async def _ensure_collection(self, vector_size: int):
+        if self._collection_ready:
+            return
+        async with self._collection_lock:
+            if not self._collection_ready:
+                # 索引 / 量化 / HNSW 参数在 qdrantSchema 中声明
+                await ensure_collection(policy_schema(self.collection_name), vector_size)
+                self._collection_ready = True
+
+    async def _process_batch(self, batch: list[Chunk]):
+        async with self._semaphore:
+            vectors = await self.embedding_model.aembed_documents([c.content for c in batch])
+            await self._ensure_collection(len(vectors[0]))
+            qdrant_client = await get_qdrant()
+            await qdrant_client.upsert(
+                collection_name=self.collection_name,
+                points=[
+                    models.PointStruct(
+                        id=chunk.point_id,
+                        vector=self._vector(chunk, vector),
+                        payload=self._payload(chunk),
+                    ) for chunk, vector in zip(batch, vectors)
+                ],
+                wait=True,
+            )
+            self.stats.upserted += len(batch)
+
+    def _sparse(self, content: str) -> models.SparseVector:
+        indices, values = encode_document(content, self.settings.sparse_avg_doc_len)
+        return models.SparseVector(indices=indices, values=values)
+
+    def _missing_sparse_error(self) -> IngestionError:
+        return IngestionError(
+            f"集合 {self.collection_name} 没有稀疏向量 '{self.settings.sparse_vector_name}' 的配置，"
+            f"请删除该集合后重新入库，按 qdrantSchema 的声明重建"
+        )
+
+    async def _check_sparse(self, required: bool) -> bool:
+        """
+        读取线上集合是否声明了稀疏向量；集合不存在时会按声明 (含稀疏向量) 创建
+        Args:
+            required: 必须写入稀疏向量 (hybrid 检索 / 补写)，集合没有该配置时直接报错
+        """
+        if self._write_sparse is None:
+            qdrant_client = await get_qdrant()
+            if await qdrant_client.collection_exists(self.collection_name):
+                info = await qdrant_client.get_collection(self.collection_name)
+                self._write_sparse = has_sparse_vector(info, self.settings.sparse_vector_name)
+            else:
+                self._write_sparse = True
+            if not self._write_sparse and not required:
+                print(f"⚠️ 警告：{self._missing_sparse_error()}；本次只写入稠密向量")
+        if required and not self._write_sparse:
+            raise self._missing_sparse_error()
+        return self._write_sparse
+
+    def _vector(self, chunk: Chunk, dense: list[float]):
+        # 集合支持时总是写入稀疏向量：未变化的分片会按 ID 跳过，之后切换到 hybrid 时不会再补写
+        if not self._write_sparse:
+            return {self.settings.dense_vector_name: dense}
+        return {
+            self.settings.dense_vector_name: dense,
+            self.settings.sparse_vector_name: self._sparse(chunk.content),
+        }
+
+    async def backfill_sparse(self) -> int:
+        """为该领域下缺少稀疏向量的旧分片补写稀疏向量 (只更新稀疏向量，不重新计算稠密向量)"""
+        qdrant_client = await get_qdrant()
+        if not await qdrant_client.collection_exists(self.collection_name):
+            return 0
+        await self._check_sparse(required=True)
+        updated, offset = 0, None
+        while True:
+            points, offset = await qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=models.Filter(must=[self._domain_condition()]),
+                limit=self.batch_size,
+                offset=offset,
+                with_payload=["content"],
+                with_vectors=[self.settings.sparse_vector_name],
+            )
+            missing = [p for p in points if not (p.vector or {}).get(self.settings.sparse_vector_name)]
+            if missing:
+                await qdrant_client.update_vectors(
+                    collection_name=self.collection_name,
+                    points=[
+                        models.PointVectors(
+                            id=p.id,
+                            vector={self.settings.sparse_vector_name: self._sparse(p.payload["content"])},
+                        ) for p in missing
+                    ],
+                    wait=True,
+                )
+                updated += len(missing)
+            if offset is None:
+                return updated
+
+    def _payload(self, chunk: Chunk) -> dict:
+        # 与 retrieve_node 读取的结构保持一致：payload.content + payload.metadata.domain
+        return {
+            "content": chunk.content,
+            "metadata": {
+                "domain": self.domain,
+                "source": chunk.source,
+                "chunk_index": chunk.chunk_index,
+                "content_hash": chunk.content_hash,
+            },
+        }
+
+    async def _flush(self, pending: list[Chunk]):
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        await asyncio.gather(*(self._process_batch(batch) for batch in batches))
+
+    async def _delete(self, point_ids: list[str]):
+        if not point_ids:
+            return
+        qdrant_client = await get_qdrant()
+        await qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=point_ids),
+        )
+        self.stats.deleted += len(point_ids)
+        self.stats.deleted_ids.extend(point_ids)
+
+    async def _prune_missing_sources(self, seen_sources: list[str]):
+        """删除该领域下来源文件已不在目录中的分片"""
+        if not seen_sources:
+            # 目录为空多半是路径写错，不做清理，避免误删整个领域
+            return
+        stale = await self._scroll_ids(models.Filter(
+            must=[self._domain_condition()],
+            must_not=[models.FieldCondition(key="metadata.source", match=models.MatchAny(any=seen_sources))],
+        ))
+        await self._delete(sorted(stale))
+
+    async def run(self, directory: Path) -> IngestionStats:
+        # 在向量化任何分片之前确认集合结构，hybrid 模式下缺少稀疏向量时尽早失败
+        await self._check_sparse(required=self.settings.retrieval_mode == "hybrid")
+        pending: list[Chunk] = []
+        # 旧分片要等替换它们的新分片 upsert 成功后再删除，避免中途失败导致内容丢失
+        pending_deletes: list[str] = []
+        seen_sources: list[str] = []
+        # 攒够 batch_size * concurrency 个待入库分片再并发处理，兼顾吞吐与内存
+        flush_size = self.batch_size * self.concurrency
+        for source, text in iter_documents(directory):
+            self.stats.files += 1
+            seen_sources.append(source)
+            chunks = build_chunks(source, text, self.domain, self.chunk_size, self.chunk_overlap)
+            self.stats.chunks += len(chunks)
+            existing = await self._existing_ids(source)
+            current = {c.point_id for c in chunks}
+
+            new_chunks = [c for c in chunks if c.point_id not in existing]
+            self.stats.skipped += len(chunks) - len(new_chunks)
+            pending.extend(new_chunks)
+            pending_deletes.extend(sorted(existing - current))
+
+            if len(pending) >= flush_size:
+                await self._flush(pending)
+                await self._delete(pending_deletes)
+                pending, pending_deletes = [], []
+        if pending:
+            await self._flush(pending)
+        await self._delete(pending_deletes)
+        if self.prune_missing:
+            await self._prune_missing_sources(seen_sources)
+
+        # 分片被替换或删除后，引用它们的缓存答案已过期
+        await get_answer_cache().invalidate_sources(self.stats.deleted_ids)
+        return self.stats
+
+
+async def main(args: argparse.Namespace):
+    db_manager.init_resources()
+    try:
+        ingestion = PolicyIngestion(
+            domain=args.domain,
+            collection_name=args.collection,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            prune_missing=not args.keep_missing,
+        )
+        if args.backfill_sparse:
+            updated = await ingestion.backfill_sparse()
+            print(f"稀疏向量补写完成: {updated} 个分片")
+            return
+        stats = await ingestion.run(Path(args.directory))
+        print(
+            f"入库完成: 文件 {stats.files} 个, 分片 {stats.chunks} 个, "
+            f"跳过未变更 {stats.skipped} 个, 写入 {stats.upserted} 个, 删除 {stats.deleted} 个"
+        )
+    except IngestionError as e:
+        print(f"入库失败: {e}")
+    finally:
+        await db_manager.close_resources()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="hfut_policy 批量入库与增量重建索引")
+    parser.add_argument("directory", nargs="?", help="文档目录 (.txt / .md)，--backfill-sparse 时不需要")
+    parser.add_argument("--domain", required=True, help="写入 metadata.domain 的领域名")
+    parser.add_argument("--collection", default="hfut_policy")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--chunk-overlap", type=int, default=None)
+    parser.add_argument("--keep-missing", action="store_true", help="保留目录中已不存在的文档的分片")
+    parser.add_argument("--backfill-sparse", action="store_true", help="只为缺少稀疏向量的旧分片补写稀疏向量")
+    args = parser.parse_args()
+    if not args.directory and not args.backfill_sparse:
+        parser.error("需要指定文档目录")
+    asyncio.run(main(args))
@@ -0,0 +1,376 @@
+"""Qdrant 集合结构声明与校正
+
+每个集合在这里声明期望的结构：payload 索引、int8 标量量化、HNSW 参数与原始向量是否放磁盘。
+- 集合不存在时，由第一次写入方 (入库 / 活动同步 / 答案缓存) 调用 ensure_collection 按声明创建
+- 集合已存在时，reconcile 对比线上配置，补建缺失 / 类型不符的索引，并更新量化与 HNSW 参数
+  (向量维度与距离无法在线修改，只报告不处理)
+  应用启动时的校正由 Redis 锁保证多个 worker 中只有一个执行
+量化后的 int8 向量常驻内存，原始向量放磁盘，查询时先用量化向量过采样召回，再用原始向量重新打分。
+
+用法 (在仓库根目录):
+    python -m backend.app.services.qdrantSchema                       # 校正所有已声明的集合
+    python -m backend.app.services.qdrantSchema --dry-run             # 只打印需要的变更
+    python -m backend.app.services.qdrantSchema --benchmark hfut_policy --samples 50 --k 10
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from qdrant_client.http import models
+
+from ..core.config import get_settings
+from ..db.session import db_manager, get_qdrant
+
+IndexSchema = Union[models.PayloadSchemaType, models.TextIndexParams]
+
+RECONCILE_LOCK_KEY = "qdrant_schema:reconcile"
+
+
+def _text_index() -> models.TextIndexParams:
+    # multilingual 分词器对中文按词切分，"图书馆" 可以匹配 "图书馆报告厅"
+    return models.TextIndexParams(
+        type=models.TextIndexType.TEXT,
+        tokenizer=models.TokenizerType.MULTILINGUAL,
+        lowercase=True,
+    )
+
+
+@dataclass
+class CollectionSchema:
+    name: str
+    payload_indexes: dict[str, IndexSchema] = field(default_factory=dict)
+    vector_name: str = ""  # 空字符串表示未命名的默认向量
+    sparse_vector_name: Optional[str] = None
+    distance: models.Distance = models.Distance.COSINE
+
+    def vector_params(self, vector_size: int) -> models.VectorParams:
+        settings = get_settings()
+        return models.VectorParams(size=vector_size, distance=self.distance, on_disk=settings.qdrant_vectors_on_disk)
+
+
+def policy_schema(name: str = "hfut_policy") -> CollectionSchema:
+    settings = get_settings()
+    return CollectionSchema(
+        name=name,
+        payload_indexes={
+            "metadata.domain": models.PayloadSchemaType.KEYWORD,
+            "metadata.source": models.PayloadSchemaType.KEYWORD,
+            "content": _text_index(),
+        },
+        vector_name=settings.dense_vector_name,
+        # 新建集合始终声明稀疏向量，切换到 hybrid 检索时无需重建集合；
+        # 此前只写稠密向量的旧分片用 ingestion --backfill-sparse 补写。
+        # 早于该声明创建的集合没有稀疏向量配置，只能重建 (reconcile 会报告)
+        sparse_vector_name=settings.sparse_vector_name,
+    )
+
+
+def event_schema() -> CollectionSchema:
+    return CollectionSchema(
+        name=get_settings().event_collection,
+        payload_indexes={
+            "event_type": models.PayloadSchemaType.KEYWORD,
+            "start_time": models.PayloadSchemaType.DATETIME,
+            "location": _text_index(),
+        },
+    )
+
+
+def answer_cache_schema() -> CollectionSchema:
+    return CollectionSchema(
+        name=get_settings().answer_cache_collection,
+        payload_indexes={
+            "domain": models.PayloadSchemaType.KEYWORD,
+            "source_ids": models.PayloadSchemaType.KEYWORD,
+            "created_at": models.PayloadSchemaType.FLOAT,
+        },
+    )
+
+
+def declared_schemas() -> list[CollectionSchema]:
+    return [policy_schema(), event_schema(), answer_cache_schema()]
+
+
+def quantization_config() -> Optional[models.ScalarQuantization]:
+    settings = get_settings()
+    if not settings.qdrant_quantization:
+        return None
+    return models.ScalarQuantization(
+        scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8,
+            quantile=settings.qdrant_quantization_quantile,
+            always_ram=True,
+        )
+    )
+
+
+def hnsw_config() -> models.HnswConfigDiff:
+    settings = get_settings()
+    return models.HnswConfigDiff(m=settings.qdrant_hnsw_m, ef_construct=settings.qdrant_hnsw_ef_construct)
+
+
+def search_params() -> models.SearchParams:
+    """稠密向量查询统一使用的参数：HNSW ef 与量化重打分"""
+    settings = get_settings()
+    quantization = None
+    if settings.qdrant_quantization:
+        quantization = models.QuantizationSearchParams(
+            rescore=settings.qdrant_rescore,
+            oversampling=settings.qdrant_oversampling,
+        )
+    return models.SearchParams(hnsw_ef=settings.qdrant_hnsw_ef, quantization=quantization)
+
+
+async def _create_index(collection_name: str, field_name: str, schema: IndexSchema):
+    qdrant_client = await get_qdrant()
+    await qdrant_client.create_payload_index(collection_name, field_name, schema, wait=True)
+
+
+async def ensure_collection(schema: CollectionSchema, vector_size: int):
+    """集合不存在时按声明创建 (含索引、量化与 HNSW 参数)"""
+    qdrant_client = await get_qdrant()
+    if await qdrant_client.collection_exists(schema.name):
+        return
+    dense_config = schema.vector_params(vector_size)
+    await qdrant_client.create_collection(
+        collection_name=schema.name,
+        vectors_config={schema.vector_name: dense_config} if schema.vector_name else dense_config,
+        sparse_vectors_config=(
+            {schema.sparse_vector_name: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+            if schema.sparse_vector_name else None
+        ),
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config(),
+    )
+    for field_name, index_schema in schema.payload_indexes.items():
+        await _create_index(schema.name, field_name, index_schema)
+
+
+def _index_matches(info: models.PayloadIndexInfo, schema: IndexSchema) -> bool:
+    if isinstance(schema, models.TextIndexParams):
+        if info.data_type != models.PayloadSchemaType.TEXT:
+            return False
+        return getattr(info.params, "tokenizer", None) == schema.tokenizer
+    return info.data_type == schema
+
+
+def _dense_params(info: models.CollectionInfo, vector_name: str) -> Optional[models.VectorParams]:
+    vectors = info.config.params.vectors
+    if isinstance(vectors, dict):
+        return vectors.get(vector_name)
+    return vectors if not vector_name else None
+
+
+def has_sparse_vector(info: models.CollectionInfo, sparse_vector_name: str) -> bool:
+    return sparse_vector_name in (info.config.params.sparse_vectors or {})
+
+
+async def reconcile(schema: CollectionSchema, dry_run: bool = False) -> list[str]:
+    """
+    对比线上集合与声明的结构，返回执行 (或 dry_run 时需要执行) 的变更描述
+    """
+    settings = get_settings()
+    qdrant_client = await get_qdrant()
+    if not await qdrant_client.collection_exists(schema.name):
+        return [f"{schema.name}: 集合不存在，将在首次写入时按声明创建"]
+    info = await qdrant_client.get_collection(schema.name)
+    actions = []
+
+    # 1. payload 索引
+    live_indexes = info.payload_schema or {}
+    for field_name, index_schema in schema.payload_indexes.items():
+        live = live_indexes.get(field_name)
+        if live is not None and _index_matches(live, index_schema):
+            continue
+        actions.append(f"{schema.name}: {'重建' if live is not None else '创建'}索引 {field_name}")
+        if dry_run:
+            continue
+        if live is not None:
+            await qdrant_client.delete_payload_index(schema.name, field_name, wait=True)
+        await _create_index(schema.name, field_name, index_schema)
+
+    # 2. 稠密向量：维度与距离只报告，on_disk 可在线修改
+    update = {}
+    dense = _dense_params(info, schema.vector_name)
+    if dense is None:
+        actions.append(f"{schema.name}: 未找到稠密向量 '{schema.vector_name}'，需要重新入库")
+    else:
+        if dense.distance != schema.distance:
+            actions.append(f"{schema.name}: 距离为 {dense.distance}，声明为 {schema.distance}，需要重新入库")
+        if bool(dense.on_disk) != settings.qdrant_vectors_on_disk:
+            update["vectors_config"] = {
+                schema.vector_name: models.VectorParamsDiff(on_disk=settings.qdrant_vectors_on_disk)
+            }
+            actions.append(f"{schema.name}: 原始向量 on_disk -> {settings.qdrant_vectors_on_disk}")
+    # 稀疏向量配置同样无法在线添加
+    if schema.sparse_vector_name and not has_sparse_vector(info, schema.sparse_vector_name):
+        actions.append(f"{schema.name}: 未找到稀疏向量 '{schema.sparse_vector_name}'，需要重建集合并重新入库")
+
+    # 3. HNSW
+    desired_hnsw = hnsw_config()
+    live_hnsw = info.config.hnsw_config
+    if live_hnsw.m != desired_hnsw.m or live_hnsw.ef_construct != desired_hnsw.ef_construct:
+        update["hnsw_config"] = desired_hnsw
+        actions.append(
+            f"{schema.name}: HNSW m={live_hnsw.m}/ef_construct={live_hnsw.ef_construct} "
+            f"-> m={desired_hnsw.m}/ef_construct={desired_hnsw.ef_construct}"
+        )
+
+    # 4. 量化
+    desired_quantization = quantization_config()
+    live_quantization = info.config.quantization_config
+    if desired_quantization is None:
+        if live_quantization is not None:
+            update["quantization_config"] = models.Disabled.DISABLED
+            actions.append(f"{schema.name}: 关闭量化")
+    elif not isinstance(live_quantization, models.ScalarQuantization) or (
+            live_quantization.scalar.type != desired_quantization.scalar.type
+            or live_quantization.scalar.quantile != desired_quantization.scalar.quantile
+            or bool(live_quantization.scalar.always_ram) != desired_quantization.scalar.always_ram
+    ):
+        update["quantization_config"] = desired_quantization
+        actions.append(f"{schema.name}: 启用 int8 标量量化 (quantile={desired_quantization.scalar.quantile})")
+
+    if update and not dry_run:
+        # 参数变更后由 Qdrant 的 optimizer 在后台重建段，期间集合仍可读写
+        await qdrant_client.update_collection(collection_name=schema.name, **update)
+    return actions
+
+
+class SchemaReconciler:
+    def __init__(self):
+        self.last_actions: list[str] = []
+        self.last_run: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_skipped: Optional[str] = None
+
+    async def reconcile_on_startup(self) -> list[str]:
+        """
+        启动时校正：同时启动的多个 uvicorn worker 中只有拿到锁的一个执行
+        锁不主动释放，到期前重启的 worker 也直接跳过
+        """
+        lock_ttl = get_settings().qdrant_schema_reconcile_lock_ttl
+        if not await db_manager.redis.set(RECONCILE_LOCK_KEY, "1", nx=True, ex=lock_ttl):
+            self.last_skipped = "其他 worker 已执行校正"
+            return []
+        return await self.reconcile_all()
+
+    async def reconcile_all(self, dry_run: bool = False) -> list[str]:
+        actions = []
+        for schema in declared_schemas():
+            try:
+                actions.extend(await reconcile(schema, dry_run))
+            except Exception as e:
+                self.last_error = f"{schema.name}: {e}"
+                print(f"Qdrant 集合校正失败 {schema.name}: {e}")
+        self.last_actions = actions
+        self.last_run = time.time()
+        for action in actions:
+            print(f"Qdrant 集合校正: {action}")
+        return actions
+
+    def stats(self) -> dict:
+        return {
+            "schemas": [schema.name for schema in declared_schemas()],
+            "last_run": self.last_run,
+            "last_actions": self.last_actions,
+            "last_error": self.last_error,
+            "last_skipped": self.last_skipped,
+        }
+
+
+# 实例化单例
+schema_reconciler = SchemaReconciler()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+async def benchmark(collection_name: str, samples: int = 50, k: int = 10, ef_values=(32, 64, 128, 256)) -> list[dict]:
+    """
+    召回率 / 延迟基准：以集合中抽样的向量作为查询，精确搜索 (exact=True) 的结果为真值，
+    对比不同 hnsw_ef 下全精度、int8 量化、int8 量化 + 重打分三种方式的 recall@k 与延迟
+    """
+    schema = next((s for s in declared_schemas() if s.name == collection_name), CollectionSchema(collection_name))
+    using = schema.vector_name or None
+    qdrant_client = await get_qdrant()
+    points, _ = await qdrant_client.scroll(
+        collection_name=collection_name, limit=samples, with_payload=False, with_vectors=[schema.vector_name] if using else True
+    )
+    queries = [(p.id, p.vector[schema.vector_name] if isinstance(p.vector, dict) else p.vector) for p in points]
+    if not queries:
+        return []
+
+    async def search(vector, params: models.SearchParams) -> tuple[list, float]:
+        start = time.perf_counter()
+        result = await qdrant_client.query_points(
+            collection_name=collection_name, query=vector, using=using, limit=k + 1,
+            search_params=params, with_payload=False,
+        )
+        return [p.id for p in result.points], time.perf_counter() - start
+
+    # 查询向量本身必然排第一，真值与结果中都去掉它
+    truth = {}
+    for point_id, vector in queries:
+        ids, _ = await search(vector, models.SearchParams(exact=True))
+        truth[point_id] = [i for i in ids if i != point_id][:k]
+
+    info = await qdrant_client.get_collection(collection_name)
+    modes = [("fp32", models.QuantizationSearchParams(ignore=True))]
+    if info.config.quantization_config is not None:
+        oversampling = get_settings().qdrant_oversampling
+        modes += [
+            ("int8", models.QuantizationSearchParams(rescore=False)),
+            ("int8+rescore", models.QuantizationSearchParams(rescore=True, oversampling=oversampling)),
+        ]
+
+    report = []
+    for ef in ef_values:
+        for mode, quantization in modes:
+            recalls, latencies = [], []
+            for point_id, vector in queries:
+                ids, latency = await search(vector, models.SearchParams(hnsw_ef=ef, quantization=quantization))
+                ids = [i for i in ids if i != point_id][:k]
+                expected = truth[point_id]
+                recalls.append(len(set(ids) & set(expected)) / len(expected) if expected else 1.0)
+                latencies.append(latency)
+            report.append({
+                "hnsw_ef": ef,
+                "mode": mode,
+                f"recall@{k}": sum(recalls) / len(recalls),
+                "p50_ms": _percentile(latencies, 0.5) * 1000,
+                "p95_ms": _percentile(latencies, 0.95) * 1000,
+            })
+    return report
+
+
+async def main(args: argparse.Namespace):
+    db_manager.init_resources()
+    try:
+        if args.benchmark:
+            report = await benchmark(args.benchmark, args.samples, args.k)
+            print(f"{'hnsw_ef':>8} {'mode':>14} {'recall@' + str(args.k):>10} {'p50_ms':>8} {'p95_ms':>8}")
+            for row in report:
+                print(
+                    f"{row['hnsw_ef']:>8} {row['mode']:>14} {row[f'recall@{args.k}']:>10.3f} "
+                    f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}"
+                )
+        else:
+            actions = await schema_reconciler.reconcile_all(dry_run=args.dry_run)
+            if not actions:
+                print("所有集合已与声明的结构一致")
+    finally:
+        await db_manager.close_resources()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Qdrant 集合结构校正与召回率基准")
+    parser.add_argument("--dry-run", action="store_true", help="只打印需要的变更，不修改集合")
+    parser.add_argument("--benchmark", metavar="COLLECTION", help="对指定集合运行召回率 / 延迟基准")
+    parser.add_argument("--samples", type=int, default=50, help="基准抽样的查询向量数")
+    parser.add_argument("--k", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,247 @@
+"""当前学期的预计算课表索引
+
+"下一节课是什么 / 在哪" 是最常见的教务问题，这里把每个学生当前学期的课表展开到教学周：
+- 每个 (学生, 教学周) 对应一个按 (星期, 开始节次) 排序的课程列表，二分查找回答
+  "下一节课"、"今天的课"、"星期 X 的课"，不需要 join 也不需要 LLM
+- 课程组合相同的教学周共享同一个列表，内存占用与学生数 × 不同周模式数成正比
+- 学生数据懒加载 (来源是 tool_cache 缓存的课表)，收到 tool_cache 的失效广播后增量重建
+"""
+import asyncio
+import datetime
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+
+from .academicService import get_current_courses
+from .toolCache import tool_cache
+from ..core.config import get_settings
+from ..db.session import get_async_db
+from ..models.tableModels import Semester
+from ..utils.academicCalendar import parse_week_range, parse_clock, teaching_week, current_period, \
+    period_end, DAY_NAMES
+from ..utils.backgroundTasks import spawn
+
+
+@dataclass(frozen=True, slots=True)
+class ClassSession:
+    course_name: str
+    teacher_name: str
+    classroom: str
+    day_of_week: int
+    start_period: int
+    end_period: int
+    week_range: str
+
+    def to_dict(self, week: Optional[int] = None) -> dict:
+        data = {
+            "course_name": self.course_name,
+            "teacher_name": self.teacher_name,
+            "classroom": self.classroom,
+            "day_of_week": self.day_of_week,
+            "day_name": DAY_NAMES[self.day_of_week] if 0 < self.day_of_week < len(DAY_NAMES) else "",
+            "start_period": self.start_period,
+            "end_period": self.end_period,
+            "week_range": self.week_range,
+        }
+        if week is not None:
+            data["week"] = week
+        return data
+
+
+class WeekTimetable:
+    """一个教学周内按 (星期, 开始节次) 排序的课程"""
+    __slots__ = ("keys", "sessions")
+
+    def __init__(self, sessions: list[ClassSession]):
+        self.sessions = sorted(sessions, key=lambda s: (s.day_of_week, s.start_period))
+        self.keys = [(s.day_of_week, s.start_period) for s in self.sessions]
+
+    def on_day(self, day: int) -> list[ClassSession]:
+        return self.sessions[bisect_left(self.keys, (day, 0)):bisect_left(self.keys, (day + 1, 0))]
+
+    def after(self, day: int, period: int) -> Optional[ClassSession]:
+        """(day, period) 之后开始的第一节课"""
+        i = bisect_right(self.keys, (day, period))
+        return self.sessions[i] if i < len(self.sessions) else None
+
+    def ongoing(self, day: int, period: int) -> Optional[ClassSession]:
+        i = bisect_right(self.keys, (day, period)) - 1
+        if i >= 0:
+            session = self.sessions[i]
+            if session.day_of_week == day and session.start_period <= period <= session.end_period:
+                return session
+        return None
+
+
+class StudentTimetable:
+    def __init__(self, sessions: list[ClassSession]):
+        by_week: dict[int, list[ClassSession]] = {}
+        for session in sessions:
+            for week in parse_week_range(session.week_range):
+                by_week.setdefault(week, []).append(session)
+        shared: dict[frozenset, WeekTimetable] = {}
+        self.weeks: dict[int, WeekTimetable] = {}
+        for week, week_sessions in by_week.items():
+            # 课程组合相同的周共享同一个 WeekTimetable
+            pattern = frozenset(week_sessions)
+            if pattern not in shared:
+                shared[pattern] = WeekTimetable(week_sessions)
+            self.weeks[week] = shared[pattern]
+        self.last_week = max(self.weeks) if self.weeks else 0
+
+
+class TimetableIndex:
+    def __init__(self):
+        settings = get_settings()
+        self.period_starts = [parse_clock(t) for t in settings.class_period_starts]
+        self.period_minutes = settings.class_period_minutes
+        self._semester: Optional[dict] = None
+        self._students: dict[int, StudentTimetable] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        self.rebuilds = 0
+        tool_cache.add_invalidation_handler(self._on_invalidation)
+
+    async def _get_semester(self) -> Optional[dict]:
+        if self._semester is None:
+            async with get_async_db() as db:
+                result = await db.execute(select(Semester).where(Semester.is_current == True).limit(1))
+                semester = result.scalar_one_or_none()
+            if semester is None or semester.start_date is None:
+                return None
+            self._semester = {"id": semester.id, "name": semester.name, "start_date": semester.start_date}
+        return self._semester
+
+    async def _build(self, student_id: int) -> StudentTimetable:
+        rows = await get_current_courses(student_id) or []
+        timetable = StudentTimetable([
+            ClassSession(
+                course_name=row["course_name"],
+                teacher_name=row["teacher_name"],
+                classroom=row["classroom"],
+                day_of_week=row["day_of_week"],
+                start_period=row["start_period"],
+                end_period=row["end_period"],
+                week_range=row["week_range"],
+            )
+            for row in rows
+        ])
+        self.rebuilds += 1
+        return timetable
+
+    async def get(self, student_id: int) -> StudentTimetable:
+        timetable = self._students.get(student_id)
+        if timetable is not None:
+            return timetable
+        lock = self._locks.setdefault(student_id, asyncio.Lock())
+        async with lock:
+            timetable = self._students.get(student_id)
+            if timetable is None:
+                timetable = await self._build(student_id)
+                self._students[student_id] = timetable
+        self._locks.pop(student_id, None)
+        return timetable
+
+    def _position(self, semester: dict, now: datetime.datetime) -> tuple[int, int, int]:
+        """当前时刻对应的 (教学周, 星期, 已开始的节次)"""
+        return (
+            teaching_week(semester["start_date"], now.date()),
+            now.isoweekday(),
+            current_period(now.time(), self.period_starts),
+        )
+
+    async def next_class(self, student_id: int, now: Optional[datetime.datetime] = None) -> dict:
+        """正在上的课与下一节课"""
+        semester = await self._get_semester()
+        if semester is None:
+            return {"ongoing": None, "next": None}
+        timetable = await self.get(student_id)
+        now = now or datetime.datetime.now()
+        week, day, period = self._position(semester, now)
+
+        ongoing = None
+        current = timetable.weeks.get(week)
+        if current is not None and period > 0:
+            ongoing = current.ongoing(day, period)
+            # 最后一节已经下课 (课间或之后) 不算正在上课
+            if ongoing and period == ongoing.end_period and \
+                    now.time() >= period_end(period, self.period_starts, self.period_minutes):
+                ongoing = None
+
+        # 从本周当前节次往后找，本周没有则顺延到之后的教学周
+        next_session, next_week = None, None
+        search_week, search_day, search_period = max(week, 1), day, period
+        if week < 1:
+            search_day, search_period = 0, 0
+        while search_week <= timetable.last_week:
+            week_table = timetable.weeks.get(search_week)
+            if week_table is not None:
+                next_session = week_table.after(search_day, search_period)
+                if next_session is not None:
+                    next_week = search_week
+                    break
+            search_week, search_day, search_period = search_week + 1, 0, 0
+
+        return {
+            "semester_name": semester["name"],
+            "week": week,
+            "ongoing": ongoing.to_dict(week) if ongoing else None,
+            "next": next_session.to_dict(next_week) if next_session else None,
+        }
+
+    async def classes_on(
+            self,
+            student_id: int,
+            day_of_week: Optional[int] = None,
+            week: Optional[int] = None,
+            now: Optional[datetime.datetime] = None,
+    ) -> dict:
+        """某个教学周某一天的课，默认今天"""
+        semester = await self._get_semester()
+        if semester is None:
+            return {"classes": []}
+        timetable = await self.get(student_id)
+        now = now or datetime.datetime.now()
+        current_week, today, _ = self._position(semester, now)
+        week = week or current_week
+        day_of_week = day_of_week or today
+        week_table = timetable.weeks.get(week)
+        sessions = week_table.on_day(day_of_week) if week_table else []
+        return {
+            "semester_name": semester["name"],
+            "week": week,
+            "day_of_week": day_of_week,
+            "day_name": DAY_NAMES[day_of_week] if 0 < day_of_week < len(DAY_NAMES) else "",
+            "classes": [s.to_dict(week) for s in sessions],
+        }
+
+    # --- 增量重建 ---
+
+    def invalidate(self, student_ids: list[int]):
+        """丢弃并在后台重建已加载学生的课表"""
+        for student_id in student_ids:
+            if self._students.pop(student_id, None) is not None:
+                spawn(self.get(student_id))
+
+    def reset(self):
+        """学期切换：清空全部索引"""
+        self._semester = None
+        self._students.clear()
+
+    def _on_invalidation(self, data: dict):
+        if data.get("semester"):
+            self.reset()
+        self.invalidate(data.get("students") or [])
+
+    def stats(self) -> dict:
+        return {
+            "semester": self._semester["name"] if self._semester else None,
+            "students": len(self._students),
+            "week_tables": len({id(w) for t in self._students.values() for w in t.weeks.values()}),
+            "rebuilds": self.rebuilds,
+        }
+
+
+# 实例化单例
+timetable_index = TimetableIndex()
@@ -0,0 +1,253 @@
+"""教务工具结果缓存
+
+成绩、课表查询每次都要做 4~5 张表的 join，而当前学期课表几乎不变，成绩也只在教师发布时变化。
+这里按学生把工具结果缓存在 Redis 的一个 HASH 里 (toolcache:student:{id})，带 TTL：
+- enrollments / course_schedules 的 ORM 写入在提交后自动失效相关学生的缓存
+- Semester.is_current 变化时递增学期代数，所有学生的课表缓存一次性失效
+- 绕过 ORM 的批量写入 (update()/insert() 语句) 需要调用方显式调用 invalidate_students
+"""
+import asyncio
+import json
+from collections import Counter
+from itertools import chain
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..db.session import db_manager, get_async_db
+from ..models.tableModels import Enrollment, CourseSchedule, Semester
+from ..utils.backgroundTasks import spawn
+
+SEMESTER_GEN_KEY = "toolcache:semester_gen"
+# 失效广播频道，其他 worker 的进程内索引 (如 timetableIndex) 据此增量重建
+INVALIDATION_CHANNEL = "toolcache:invalidate"
+# 依赖当前学期的结果，学期切换时失效
+SEMESTER_SCOPED = {"courses"}
+
+
+def _student_key(student_id: int) -> str:
+    return f"toolcache:student:{student_id}"
+
+
+class ToolResultCache:
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.tool_cache_enabled
+        self.ttl = settings.tool_cache_ttl
+        self.counters = Counter()
+        self._hooks_registered = False
+        self._handlers: list[Callable[[dict], Any]] = []
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _encode(rows: list[dict]) -> str:
+        # 列名只写一次，每行存为数组，比逐行 dict 更紧凑
+        columns = list(rows[0].keys()) if rows else []
+        return json.dumps(
+            {"c": columns, "r": [[row[c] for c in columns] for row in rows]},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    @staticmethod
+    def _decode(raw: str) -> list[dict]:
+        data = json.loads(raw)
+        return [dict(zip(data["c"], row)) for row in data["r"]]
+
+    async def get_or_load(
+            self,
+            kind: str,
+            student_id: int,
+            loader: Callable[[], Awaitable[Optional[list[dict]]]],
+    ) -> Optional[list[dict]]:
+        """
+        Args:
+            kind: 结果类型，如 grades / courses
+            student_id: 学生 id
+            loader: 未命中时查询数据库的函数，返回 None 表示查询失败，不写入缓存
+        """
+        redis_client = db_manager.redis
+        if not self.enabled or redis_client is None:
+            return await loader()
+
+        key = _student_key(student_id)
+        try:
+            # 一次往返同时取出缓存值、写入时的学期代数与当前学期代数
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hmget(key, kind, f"{kind}:gen")
+            pipe.get(SEMESTER_GEN_KEY)
+            (value, gen), current_gen = await pipe.execute()
+            current_gen = current_gen or "0"
+            if value is not None and (kind not in SEMESTER_SCOPED or gen == current_gen):
+                self.counters[f"{kind}:hit"] += 1
+                return self._decode(value)
+        except Exception as e:
+            print(f"工具结果缓存读取失败: {e}")
+            self.counters["errors"] += 1
+            return await loader()
+
+        self.counters[f"{kind}:miss"] += 1
+        rows = await loader()
+        if rows is None:
+            return rows
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hset(key, mapping={kind: self._encode(rows), f"{kind}:gen": current_gen})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            print(f"工具结果缓存写入失败: {e}")
+            self.counters["errors"] += 1
+        return rows
+
+    async def invalidate_students(self, student_ids: Iterable[int]):
+        student_ids = sorted(set(student_ids))
+        if not student_ids or db_manager.redis is None:
+            return
+        await db_manager.redis.delete(*[_student_key(student_id) for student_id in student_ids])
+        self.counters["invalidated_students"] += len(student_ids)
+        await db_manager.redis.publish(INVALIDATION_CHANNEL, json.dumps({"students": student_ids}))
+
+    async def invalidate_semester(self):
+        """当前学期切换：递增学期代数，所有课表缓存自然失效"""
+        if db_manager.redis is None:
+            return
+        await db_manager.redis.incr(SEMESTER_GEN_KEY)
+        self.counters["semester_switches"] += 1
+        await db_manager.redis.publish(INVALIDATION_CHANNEL, json.dumps({"semester": True}))
+
+    async def invalidate_schedules(self, schedule_ids: Iterable[int]):
+        """排课变化：失效选了这些课的学生"""
+        schedule_ids = list(set(schedule_ids))
+        if not schedule_ids:
+            return
+        async with get_async_db() as db:
+            result = await db.execute(
+                select(Enrollment.student_id).where(Enrollment.schedule_id.in_(schedule_ids)).distinct()
+            )
+            student_ids = result.scalars().all()
+        await self.invalidate_students(student_ids)
+        await db_manager.redis.publish(INVALIDATION_CHANNEL, json.dumps({"schedules": sorted(schedule_ids)}))
+
+    # --- 失效广播订阅 ---
+
+    def add_invalidation_handler(self, handler: Callable[[dict], Any]):
+        """
+        注册进程内索引的失效回调，消息格式为 {"students": [...]} / {"schedules": [...]} / {"semester": true}
+        """
+        self._handlers.append(handler)
+
+    async def _listen(self):
+        # 所有 worker 都订阅，写入发生在哪个 worker 都能收到
+        while True:
+            pubsub = db_manager.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    for handler in self._handlers:
+                        try:
+                            handler(data)
+                        except Exception as e:
+                            print(f"失效回调执行失败: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"失效广播订阅中断，稍后重连: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def start_listener(self):
+        """应用启动时调用"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        """应用关闭时调用"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    # --- ORM 写入后自动失效 ---
+
+    def register_invalidation_hooks(self):
+        """应用启动时调用，监听所有 Session 的 flush / commit"""
+        if self._hooks_registered:
+            return
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+        self._hooks_registered = True
+
+    @staticmethod
+    def _after_flush(session: Session, flush_context):
+        pending = session.info.setdefault(
+            "toolcache_pending", {"students": set(), "schedules": set(), "semester": False}
+        )
+        dirty = [obj for obj in session.dirty if session.is_modified(obj)]
+        for obj in chain(session.new, dirty, session.deleted):
+            if isinstance(obj, Enrollment):
+                pending["students"].add(obj.student_id)
+                # 选课记录换了学生时，原学生的缓存也要失效
+                pending["students"].update(inspect(obj).attrs.student_id.history.deleted or ())
+            elif isinstance(obj, CourseSchedule) and obj.id is not None:
+                pending["schedules"].add(obj.id)
+            elif isinstance(obj, Semester):
+                if obj in session.new or obj in session.deleted or \
+                        inspect(obj).attrs.is_current.history.has_changes():
+                    pending["semester"] = True
+
+    def _after_commit(self, session: Session):
+        pending = session.info.pop("toolcache_pending", None)
+        if not pending or not (pending["students"] or pending["schedules"] or pending["semester"]):
+            return
+        try:
+            spawn(self._apply(pending))
+        except RuntimeError:
+            # 没有运行中的事件循环 (同步脚本)，交给 TTL 过期
+            pass
+
+    @staticmethod
+    def _after_rollback(session: Session):
+        session.info.pop("toolcache_pending", None)
+
+    async def _apply(self, pending: dict):
+        try:
+            await self.invalidate_students(s for s in pending["students"] if s is not None)
+            await self.invalidate_schedules(pending["schedules"])
+            if pending["semester"]:
+                await self.invalidate_semester()
+                if get_settings().tool_cache_warm_up:
+                    # 延迟导入，避免与 academicService 循环依赖
+                    from .academicService import warm_up_tool_cache
+                    await warm_up_tool_cache()
+        except Exception as e:
+            print(f"工具结果缓存失效失败: {e}")
+            self.counters["errors"] += 1
+
+    def stats(self) -> dict:
+        kinds = sorted({k.split(":")[0] for k in self.counters if ":" in k})
+        result = {"enabled": self.enabled, "ttl": self.ttl}
+        for kind in kinds:
+            hits, misses = self.counters[f"{kind}:hit"], self.counters[f"{kind}:miss"]
+            result[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        for name in ("invalidated_students", "semester_switches", "warmed_students", "errors"):
+            result[name] = self.counters[name]
+        return result
+
+
+# 实例化单例
+tool_cache = ToolResultCache()
@@ -1,12 +1,10 @@
-from fastapi import Depends
+from typing import Optional
+
 from langchain_core.tools import tool
-from sqlalchemy import select, update
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from ..db.session import get_async_db
-from ..models.tableModels import Enrollment, CourseSchedule, Course, Teacher, Semester
-from ..models.toolTableModels import ScoreToolResponse, CourseToolResponse
+from ..services.academicService import get_grades, get_current_courses
+from ..services.classroomIndex import classroom_index
+from ..services.timetableIndex import timetable_index
 
 
 def create_campus_tools():
@@ -15,30 +13,10 @@ def create_campus_tools():
         """"
             根据学生id查询学生的各科成绩
         """
-        async with get_async_db() as db:
-            stmt = (
-                select(
-                    Course.name.label("course_name"),
-                    Enrollment.score,
-                    Enrollment.grade_point,
-                    Enrollment.status,
-                    Semester.name.label("semester_name")
-                )
-                .select_from(Enrollment)
-                .join(CourseSchedule, Enrollment.schedule_id == CourseSchedule.id)
-                .join(Course, CourseSchedule.course_id == Course.id)
-                .join(Semester, CourseSchedule.semester_id == Semester.id)
-                .where(Enrollment.student_id == user_id)
-                .where(Enrollment.score.isnot(None))  # 使用 .isnot(None)
-                .order_by(Semester.id.desc())
-            )
-
-            result = await db.execute(stmt)
-            score_data = result.mappings().all()
-            score_data = [ScoreToolResponse.model_validate(s).model_dump() for s in score_data]
-            print(f"score_data: {score_data}")
-
-            return score_data
+        # 结果按学生缓存在 Redis，成绩发布时自动失效
+        score_data = await get_grades(user_id)
+        print(f"score_data: {score_data}")
+        return score_data
 
     @tool
     async def get_courses_by_student_id(user_id: int):
@@ -47,47 +25,54 @@ def create_campus_tools():
         :param user_id: 学生id
         :return: 学生当前学期的课表
         """
-        async with get_async_db() as db:
-            try:
-                # 1. 构建查询语句
-                # 我们从 Enrollment 出发，因为只有学生选了课才会在课表里
-                stmt = (
-                    select(
-                        Course.name.label("course_name"),
-                        Teacher.name.label("teacher_name"),
-                        CourseSchedule.classroom,
-                        CourseSchedule.day_of_week,
-                        CourseSchedule.start_period,
-                        CourseSchedule.end_period,
-                        CourseSchedule.week_range,
-                        Semester.name.label("semester_name")
-                    )
-                    # 【关键修复点 1】显式指定起始表
-                    .select_from(Enrollment)
-                    # 【关键修复点 2】按照关系链条依次顺序连接，并明确 ON 条件
-                    .join(CourseSchedule, Enrollment.schedule_id == CourseSchedule.id)
-                    .join(Course, CourseSchedule.course_id == Course.id)
-                    .join(Teacher, CourseSchedule.teacher_id == Teacher.id)
-                    .join(Semester, CourseSchedule.semester_id == Semester.id)
-                    # 过滤条件
-                    .where(Enrollment.student_id == user_id)
-                    .where(Semester.is_current == True)
-                    .where(Enrollment.status == "enrolled")
-                    .order_by(CourseSchedule.day_of_week, CourseSchedule.start_period)
-                )
+        # 结果按学生缓存在 Redis，选课 / 排课变化或学期切换时自动失效
+        schedule_data = await get_current_courses(user_id)
+        print(f"schedule_data: {schedule_data}")
+        return schedule_data
 
-                result = await db.execute(stmt)
-                # 获取所有行并转为字典
-                schedule_data = result.mappings().all()
-                schedule_data = [CourseToolResponse.model_validate(s).model_dump() for s in schedule_data]
+    @tool
+    async def get_next_class_by_student_id(user_id: int):
+        """
+        description: 查询学生正在上的课和下一节课 (课程、老师、教室、第几周星期几第几节)
+        :param user_id: 学生id
+        """
+        return await timetable_index.next_class(user_id)
 
-                print(f"schedule_data: {schedule_data}")
+    @tool
+    async def get_classes_on_day_by_student_id(user_id: int, day_of_week: Optional[int] = None,
+                                               week: Optional[int] = None):
+        """
+        description: 查询学生某个教学周某一天的课，比查询整学期课表更快
+        :param user_id: 学生id
+        :param day_of_week: 星期几，1-7，不传表示今天
+        :param week: 第几教学周，不传表示本周
+        """
+        return await timetable_index.classes_on(user_id, day_of_week=day_of_week, week=week)
 
-                return schedule_data
+    @tool
+    async def find_free_classrooms(day_of_week: Optional[int] = None, start_period: Optional[int] = None,
+                                   end_period: Optional[int] = None, week: Optional[int] = None,
+                                   building: Optional[str] = None):
+        """
+        description: 查询空闲教室，不传参数表示现在这一节空闲的教室
+        :param day_of_week: 星期几，1-7，不传表示今天
+        :param start_period: 开始节次，不传表示当前节次
+        :param end_period: 结束节次，不传表示与开始节次相同
+        :param week: 第几教学周，不传表示本周
+        :param building: 楼栋名称，传入时优先返回该楼及附近楼栋的教室；无法识别时返回全校空教室并带 building_unknown
+        """
+        return await classroom_index.find_free(day_of_week, start_period, end_period, week, building)
 
-            except Exception as e:
-                print(f"查询课表时发生错误: {str(e)}")
-                return None
+    @tool
+    async def find_schedule_conflicts(kind: Optional[str] = None, name: Optional[str] = None):
+        """
+        description: 查询当前学期的排课冲突 (同一教室或同一教师在同一时间有多门课)
+        :param kind: room 表示教室冲突，teacher 表示教师冲突，不传表示全部
+        :param name: 教室名或教师姓名，只返回与其相关的冲突
+        """
+        return await classroom_index.find_conflicts(kind, name)
 
-    tools = [get_grades_by_student_id, get_courses_by_student_id]
+    tools = [get_grades_by_student_id, get_courses_by_student_id,
+             get_next_class_by_student_id, get_classes_on_day_by_student_id,
+             find_free_classrooms, find_schedule_conflicts]
     return tools
@@ -0,0 +1,59 @@
+"""教学周与节次换算
+
+- week_range 解析：支持 "1-16"、"1-8,10-16"、"3"、"1-16单" / "2-16双"、"第1-16周" 等写法
+- 根据学期开始日期与节次开始时间，把某个时刻换算成 (教学周, 星期, 节次)
+"""
+import datetime
+import re
+from functools import lru_cache
+from typing import Optional
+
+_RANGE = re.compile(r"(\d+)(?:\s*[-~～至]\s*(\d+))?\s*([单双])?")
+
+DAY_NAMES = ["", "周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
+
+@lru_cache(maxsize=4096)
+def parse_week_range(week_range: Optional[str]) -> frozenset[int]:
+    """解析为教学周集合；无法解析时返回空集合"""
+    if not week_range:
+        return frozenset()
+    weeks = set()
+    for part in re.split(r"[,，、;；]", week_range.replace("周", "").replace("第", "")):
+        match = _RANGE.search(part)
+        if not match:
+            continue
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        parity = match.group(3)
+        for week in range(start, end + 1):
+            if parity == "单" and week % 2 == 0 or parity == "双" and week % 2 == 1:
+                continue
+            weeks.add(week)
+    return frozenset(weeks)
+
+
+def parse_clock(value: str) -> datetime.time:
+    hour, minute = value.split(":")
+    return datetime.time(int(hour), int(minute))
+
+
+def teaching_week(semester_start: datetime.date, day: datetime.date) -> int:
+    """学期第一周为 1，开学前为 0 或负数"""
+    return (day - semester_start).days // 7 + 1
+
+
+def current_period(now: datetime.time, period_starts: list[datetime.time]) -> int:
+    """已经开始的节次数：第一节开始前为 0，第 n 节开始后 (下一节开始前) 为 n"""
+    period = 0
+    for start in period_starts:
+        if now < start:
+            break
+        period += 1
+    return period
+
+
+def period_end(period: int, period_starts: list[datetime.time], period_minutes: int) -> datetime.time:
+    start = period_starts[min(period, len(period_starts)) - 1]
+    end = datetime.datetime.combine(datetime.date.min, start) + datetime.timedelta(minutes=period_minutes)
+    return end.time()
@@ -0,0 +1,29 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Coroutine
+
+# 保存后台任务引用，防止任务在完成前被垃圾回收
+_background_tasks: set[asyncio.Task] = set()
+# 只对发起它的请求有效的 ContextVar (默认值均为 None)，后台任务中重置，不继承请求的状态
+_request_scoped: list[ContextVar] = []
+
+
+def request_scoped(var: ContextVar) -> ContextVar:
+    """登记一个请求级 ContextVar，spawn 出的后台任务中该变量为 None"""
+    _request_scoped.append(var)
+    return var
+
+
+async def _detached(coro: Coroutine):
+    # create_task 复制了调用方的上下文，这里只修改任务自己的副本
+    for var in _request_scoped:
+        var.set(None)
+    return await coro
+
+
+def spawn(coro: Coroutine) -> asyncio.Task:
+    """在事件循环中启动一个不阻塞当前请求的后台任务"""
+    task = asyncio.create_task(_detached(coro))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
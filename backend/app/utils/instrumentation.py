@@ -0,0 +1,210 @@
+"""/chat 链路各环节的延迟、token 与错误指标
+
+- 图节点：build_graph 注册的每个节点都经过 instrument_node 包装，按节点与意图记录耗时和错误
+- LLM：ScheduledChatOpenAI 每次实际调用记录耗时与 prompt / completion token，
+  LLMBase 记录结构化输出解析失败与升级；/status/tiers 的层级统计也由这些指标汇总而来
+- 嵌入 / Qdrant / MySQL：分别包装嵌入客户端、Qdrant 客户端，并挂 SQLAlchemy 引擎事件
+当前所在节点通过 ContextVar 传递，节点内发起的 LLM、检索、SQL 调用都带上节点标签。
+指标通过 run.py 的 /metrics 以 Prometheus 文本格式输出。
+"""
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+from langgraph.errors import GraphBubbleUp
+from sqlalchemy import event
+
+from .metrics import metrics_registry
+from ..core.config import get_settings
+
+_current_node: ContextVar[str] = ContextVar("metrics_node", default="none")
+_current_intent: ContextVar[str] = ContextVar("metrics_intent", default="none")
+
+NODE_DURATION = metrics_registry.histogram(
+    "campus_node_duration_seconds", "图节点执行耗时", ("node", "intent")
+)
+NODE_ERRORS = metrics_registry.counter(
+    "campus_node_errors_total", "图节点执行异常次数", ("node", "intent")
+)
+LLM_DURATION = metrics_registry.histogram(
+    "campus_llm_duration_seconds", "LLM 调用耗时 (不含排队)", ("node", "intent", "tier", "model")
+)
+LLM_TOKENS = metrics_registry.counter(
+    "campus_llm_tokens_total", "LLM token 消耗", ("node", "intent", "tier", "model", "kind")
+)
+LLM_ERRORS = metrics_registry.counter(
+    "campus_llm_errors_total", "LLM 调用异常次数", ("node", "intent", "tier", "model")
+)
+LLM_PARSE_FAILURES = metrics_registry.counter(
+    "campus_llm_parse_failures_total", "结构化输出解析失败次数", ("node", "tier", "model")
+)
+LLM_ESCALATIONS = metrics_registry.counter(
+    "campus_llm_escalations_total", "结构化输出解析失败后升级到大模型重试的次数", ("node", "tier", "model")
+)
+EMBEDDING_DURATION = metrics_registry.histogram(
+    "campus_embedding_duration_seconds", "嵌入模型调用耗时 (不含缓存命中)", ("node", "backend", "kind")
+)
+EMBEDDING_ERRORS = metrics_registry.counter(
+    "campus_embedding_errors_total", "嵌入模型调用异常次数", ("node", "backend", "kind")
+)
+QDRANT_DURATION = metrics_registry.histogram(
+    "campus_qdrant_duration_seconds", "Qdrant 请求耗时", ("node", "operation", "collection")
+)
+QDRANT_ERRORS = metrics_registry.counter(
+    "campus_qdrant_errors_total", "Qdrant 请求异常次数", ("node", "operation", "collection")
+)
+SQL_DURATION = metrics_registry.histogram(
+    "campus_sql_duration_seconds", "MySQL 语句执行耗时", ("node", "statement")
+)
+SQL_ERRORS = metrics_registry.counter(
+    "campus_sql_errors_total", "MySQL 语句执行异常次数", ("node", "statement")
+)
+
+
+def metrics_enabled() -> bool:
+    return get_settings().metrics_enabled
+
+
+@contextmanager
+def _timed(histogram, errors, *labels):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(*labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+
+def instrument_node(node, routed: bool = True):
+    """
+    包装图节点，记录耗时与异常
+    Args:
+        routed: 节点是否在本轮路由之后执行；路由之前 state 里的 intent 还是上一轮的，标记为 routing
+    """
+    if not metrics_enabled():
+        return node
+    name = node.__name__
+
+    # functools.wraps 保留原签名，LangGraph 据此决定是否传入 config
+    @functools.wraps(node)
+    async def wrapped(state, *args, **kwargs):
+        intent = (state.get("intent") or "none") if routed else "routing"
+        node_token = _current_node.set(name)
+        intent_token = _current_intent.set(intent)
+        start = time.perf_counter()
+        try:
+            return await node(state, *args, **kwargs)
+        except GraphBubbleUp:
+            # interrupt 等控制流异常不是错误
+            raise
+        except Exception:
+            NODE_ERRORS.inc(name, intent)
+            raise
+        finally:
+            NODE_DURATION.observe(time.perf_counter() - start, name, intent)
+            _current_node.reset(node_token)
+            _current_intent.reset(intent_token)
+
+    return wrapped
+
+
+def record_llm_call(tier: str, model: str, latency: float, usage: Optional[dict]):
+    node, intent = _current_node.get(), _current_intent.get()
+    LLM_DURATION.observe(latency, node, intent, tier, model)
+    if usage:
+        LLM_TOKENS.inc(node, intent, tier, model, "prompt", amount=usage.get("input_tokens", 0))
+        LLM_TOKENS.inc(node, intent, tier, model, "completion", amount=usage.get("output_tokens", 0))
+
+
+def record_llm_error(tier: str, model: str):
+    LLM_ERRORS.inc(_current_node.get(), _current_intent.get(), tier, model)
+
+
+def record_llm_parse_failure(tier: str, model: str):
+    LLM_PARSE_FAILURES.inc(_current_node.get(), tier, model)
+
+
+def record_llm_escalation(tier: str, model: str):
+    # 记在发起升级的层级上，升级后的调用本身计入 large
+    LLM_ESCALATIONS.inc(_current_node.get(), tier, model)
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """记录嵌入模型实际调用的耗时，位于缓存层之下，缓存命中不计入"""
+
+    def __init__(self, embeddings: Embeddings, backend: str):
+        self.embeddings = embeddings
+        self.backend = backend
+
+    async def aembed_query(self, text: str) -> list[float]:
+        with _timed(EMBEDDING_DURATION, EMBEDDING_ERRORS, _current_node.get(), self.backend, "query"):
+            return await self.embeddings.aembed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        with _timed(EMBEDDING_DURATION, EMBEDDING_ERRORS, _current_node.get(), self.backend, "documents"):
+            return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        with _timed(EMBEDDING_DURATION, EMBEDDING_ERRORS, _current_node.get(), self.backend, "query"):
+            return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with _timed(EMBEDDING_DURATION, EMBEDDING_ERRORS, _current_node.get(), self.backend, "documents"):
+            return self.embeddings.embed_documents(texts)
+
+
+# 需要计时的 Qdrant 请求，其余属性直接透传
+_QDRANT_OPERATIONS = {
+    "query_points", "search", "scroll", "retrieve", "upsert", "delete", "overwrite_payload", "set_payload", "count",
+    "batch_update_points",
+}
+
+
+class InstrumentedQdrant:
+    """AsyncQdrantClient 的透明代理，为检索 / 写入请求计时"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in _QDRANT_OPERATIONS:
+            return attr
+
+        async def timed(*args, **kwargs):
+            collection = kwargs.get("collection_name") or (args[0] if args else "")
+            with _timed(QDRANT_DURATION, QDRANT_ERRORS, _current_node.get(), name, collection):
+                return await attr(*args, **kwargs)
+
+        return timed
+
+
+def _statement_kind(statement: str) -> str:
+    parts = statement.lstrip().split(None, 1)
+    return parts[0].lower() if parts else "unknown"
+
+
+def register_sql_metrics(engine):
+    """在 AsyncEngine 底层的同步引擎上挂事件，记录每条语句的执行耗时"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["metrics_start"].pop()
+        SQL_DURATION.observe(time.perf_counter() - start, _current_node.get(), _statement_kind(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        starts = exception_context.connection.info.get("metrics_start") if exception_context.connection else None
+        if starts:
+            starts.pop()
+        SQL_ERRORS.inc(_current_node.get(), _statement_kind(exception_context.statement or ""))
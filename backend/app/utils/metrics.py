@@ -0,0 +1,144 @@
+"""轻量 Prometheus 指标
+
+只实现本项目用到的 Counter / Histogram 与文本格式输出 (text/plain; version=0.0.4)，不引入额外依赖。
+所有记录都发生在事件循环线程中，observe / inc 只是几次字典查找与 bisect，开销可以忽略。
+"""
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+# 延迟直方图的默认分桶 (秒)，覆盖 SQL / 向量检索的毫秒级到 LLM 生成的数十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各分桶计数 (非累积, 末尾为 +Inf), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = [[0] * (len(self.buckets) + 1), 0.0]
+            self._values[labels] = entry
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def label_sets(self) -> list[tuple]:
+        return list(self._values)
+
+    def aggregate(self, keep: Callable[[tuple], bool]) -> tuple[list[int], float]:
+        """合并满足 keep(labels) 的各组标签，返回 (各分桶计数, sum)"""
+        counts, total = [0] * (len(self.buckets) + 1), 0.0
+        for labels, (entry_counts, entry_total) in self._values.items():
+            if keep(labels):
+                counts = [a + b for a, b in zip(counts, entry_counts)]
+                total += entry_total
+        return counts, total
+
+    def quantile(self, counts: list[int], q: float) -> Optional[float]:
+        """与 Prometheus histogram_quantile 相同，在目标分桶内线性插值估算分位数"""
+        observed = sum(counts)
+        if not observed:
+            return None
+        rank = q * observed
+        cumulative, lower = 0, 0.0
+        for upper, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        # 落在 +Inf 桶时只能给出最大的有限上界
+        return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for upper, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(upper)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total!r}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 重复注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 实例化单例
+metrics_registry = MetricsRegistry()
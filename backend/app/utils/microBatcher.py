@@ -0,0 +1,105 @@
+"""异步动态微批处理
+
+并发到达的单条请求先进入队列，凑满 max_batch_size 或等待 max_wait_ms 后合并为一批，
+在线程池中执行一次批量计算，再把结果分发给各自的调用方。
+适用于 CPU 推理这类 "批量计算一次比逐条计算多次便宜得多" 的场景，事件循环始终不会被阻塞。
+"""
+import asyncio
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional
+
+from .backgroundTasks import spawn
+
+
+def _bucket(size: int) -> str:
+    """批大小直方图按 2 的幂分桶：1, 2, 4, 8, ..."""
+    upper = 1
+    while upper < size:
+        upper *= 2
+    return f"<={upper}"
+
+
+class MicroBatcher:
+    def __init__(
+            self,
+            name: str,
+            process: Callable[[list], list],
+            executor: Executor,
+            max_batch_size: int,
+            max_wait_ms: float,
+    ):
+        self.name = name
+        self.process = process
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: list[tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batch_sizes = Counter()
+        self.counters = Counter()
+        # 最近若干批次的 (完成时刻, 条数, 耗时)，用于计算吞吐与延迟
+        self._recent = deque(maxlen=1000)
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((item, future))
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._queue:
+            batch = [(item, f) for item, f in self._queue[:self.max_batch_size] if not f.cancelled()]
+            del self._queue[:self.max_batch_size]
+            if batch:
+                # spawn 保存任务引用，避免批次在执行中被垃圾回收
+                spawn(self._run(batch))
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        start = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.process, [item for item, _ in batch]
+            )
+        except Exception as e:
+            self.counters["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        duration = time.perf_counter() - start
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        self.counters["batches"] += 1
+        self.counters["items"] += len(batch)
+        self.batch_sizes[_bucket(len(batch))] += 1
+        self._recent.append((time.monotonic(), len(batch), duration))
+
+    def stats(self) -> dict:
+        recent = list(self._recent)
+        window = recent[-1][0] - recent[0][0] if len(recent) > 1 else 0.0
+        durations = sorted(d for _, _, d in recent)
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": len(self._queue),
+            "batches": self.counters["batches"],
+            "items": self.counters["items"],
+            "errors": self.counters["errors"],
+            "avg_batch_size": self.counters["items"] / self.counters["batches"] if self.counters["batches"] else None,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items(), key=lambda x: int(x[0][2:]))),
+            # 最近批次时间窗口内的吞吐 (条/秒)
+            "throughput": sum(n for _, n, _ in recent) / window if window > 0 else None,
+            "batch_latency_avg_ms": sum(durations) / len(durations) * 1000 if durations else None,
+            "batch_latency_p95_ms": durations[int(len(durations) * 0.95)] * 1000 if durations else None,
+        }
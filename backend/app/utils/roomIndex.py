@@ -0,0 +1,235 @@
+"""教室占用区间索引
+
+按 (教学周, 星期) 存储每间教室、每位教师的占用节次位图 (第 n 节对应第 n 位)：
+- 空教室查询：一次位与判断一间教室，整校几百间教室在几十微秒内完成
+- 冲突检测：建索引时发现同一 (周, 星期, 教室/教师) 的节次重叠即记录冲突
+- 就近查询：教室名按 "楼栋 + 房间号" 拆分，配置楼栋坐标后按距离排序，否则只在同一楼栋内查找；
+  楼栋名无法识别时退回全校教室
+
+纯内存结构，不依赖数据库；可以直接运行合成数据的基准测试：
+    python -m backend.app.utils.roomIndex --rooms 400 --schedules 8000
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+_ROOM = re.compile(r"^(.*?)[-\s]*(\d+)$")
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduleSlot:
+    schedule_id: int
+    course_name: str
+    teacher_id: int
+    teacher_name: str
+    classroom: str
+    day_of_week: int
+    start_period: int
+    end_period: int
+    weeks: frozenset[int]
+
+    def to_dict(self) -> dict:
+        return {
+            "schedule_id": self.schedule_id,
+            "course_name": self.course_name,
+            "teacher_name": self.teacher_name,
+            "classroom": self.classroom,
+            "day_of_week": self.day_of_week,
+            "start_period": self.start_period,
+            "end_period": self.end_period,
+        }
+
+
+def period_mask(start_period: int, end_period: int) -> int:
+    return ((1 << (end_period - start_period + 1)) - 1) << start_period
+
+
+def split_classroom(classroom: str) -> tuple[str, str]:
+    """"翡翠湖A-101" -> ("翡翠湖A", "101")，没有房间号时整个名称视为楼栋"""
+    match = _ROOM.match(classroom.strip())
+    if not match or not match.group(1):
+        return classroom.strip(), ""
+    return match.group(1), match.group(2)
+
+
+class RoomIndex:
+    def __init__(self, slots: Iterable[ScheduleSlot], building_coordinates: Optional[dict] = None):
+        self.building_coordinates = building_coordinates or {}
+        # (week, day) -> {classroom: 占用位图}
+        self.room_masks: dict[tuple[int, int], dict[str, int]] = {}
+        # (week, day) -> {teacher_id: 占用位图}
+        self.teacher_masks: dict[tuple[int, int], dict[int, int]] = {}
+        # 冲突: (类型, schedule_id_a, schedule_id_b) -> [slot_a, slot_b, 冲突的教学周]
+        self._conflicts: dict[tuple[str, int, int], list] = {}
+        self.buildings: dict[str, list[str]] = {}
+        self.slot_count = 0
+
+        # (week, day, classroom / teacher) -> 已放入的 slot，仅用于定位冲突的另一方
+        room_slots: dict[tuple, list[ScheduleSlot]] = {}
+        teacher_slots: dict[tuple, list[ScheduleSlot]] = {}
+        for slot in slots:
+            self.slot_count += 1
+            mask = period_mask(slot.start_period, slot.end_period)
+            if slot.classroom:
+                building, _ = split_classroom(slot.classroom)
+                self.buildings.setdefault(building, [])
+                if slot.classroom not in self.buildings[building]:
+                    self.buildings[building].append(slot.classroom)
+            for week in slot.weeks:
+                key = (week, slot.day_of_week)
+                if slot.classroom:
+                    self._occupy("room", self.room_masks.setdefault(key, {}), slot.classroom,
+                                 room_slots.setdefault((*key, slot.classroom), []), slot, mask, week)
+                self._occupy("teacher", self.teacher_masks.setdefault(key, {}), slot.teacher_id,
+                             teacher_slots.setdefault((*key, slot.teacher_id), []), slot, mask, week)
+        for rooms in self.buildings.values():
+            rooms.sort()
+        self.rooms = sorted(room for rooms in self.buildings.values() for room in rooms)
+        self._nearby_cache: dict[str, list[str]] = {}
+
+    def _occupy(self, kind: str, masks: dict, owner, placed: list, slot: ScheduleSlot, mask: int, week: int):
+        if masks.get(owner, 0) & mask:
+            for other in placed:
+                if period_mask(other.start_period, other.end_period) & mask:
+                    a, b = sorted((other, slot), key=lambda s: s.schedule_id)
+                    conflict = self._conflicts.setdefault((kind, a.schedule_id, b.schedule_id), [a, b, set()])
+                    conflict[2].add(week)
+        masks[owner] = masks.get(owner, 0) | mask
+        placed.append(slot)
+
+    # --- 查询 ---
+
+    def _distance(self, a: str, b: str) -> float:
+        if a == b:
+            return 0.0
+        pa, pb = self.building_coordinates.get(a), self.building_coordinates.get(b)
+        if not pa or not pb:
+            return math.inf
+        return math.dist(pa, pb)
+
+    def resolve_building(self, building: str) -> Optional[str]:
+        """楼栋名归一化，允许只写楼栋名的一部分，如 "A" 匹配 "翡翠湖A"；无法识别时返回 None"""
+        if building in self.buildings:
+            return building
+        return next((b for b in self.buildings if building and building in b), None)
+
+    def nearby_rooms(self, building: str) -> list[str]:
+        """同楼栋的教室在前，其余按楼栋距离排序；未配置坐标的楼栋不参与，无法识别的楼栋返回全校教室"""
+        rooms = self._nearby_cache.get(building)
+        if rooms is None:
+            origin = self.resolve_building(building)
+            if origin is None:
+                self._nearby_cache[building] = self.rooms
+                return self.rooms
+            ranked = sorted(
+                (b for b in self.buildings if self._distance(origin, b) < math.inf),
+                key=lambda b: (self._distance(origin, b), b),
+            )
+            rooms = [room for b in ranked for room in self.buildings[b]]
+            self._nearby_cache[building] = rooms
+        return rooms
+
+    def free_rooms(
+            self,
+            week: int,
+            day_of_week: int,
+            start_period: int,
+            end_period: int,
+            building: Optional[str] = None,
+            limit: Optional[int] = None,
+    ) -> list[str]:
+        mask = period_mask(start_period, end_period)
+        occupied = self.room_masks.get((week, day_of_week), {})
+        candidates = self.nearby_rooms(building) if building else self.rooms
+        free = []
+        for room in candidates:
+            if not occupied.get(room, 0) & mask:
+                free.append(room)
+                if limit and len(free) >= limit:
+                    break
+        return free
+
+    def is_room_free(self, classroom: str, weeks: Iterable[int], day_of_week: int,
+                     start_period: int, end_period: int) -> bool:
+        mask = period_mask(start_period, end_period)
+        return all(not self.room_masks.get((w, day_of_week), {}).get(classroom, 0) & mask for w in weeks)
+
+    def is_teacher_free(self, teacher_id: int, weeks: Iterable[int], day_of_week: int,
+                        start_period: int, end_period: int) -> bool:
+        mask = period_mask(start_period, end_period)
+        return all(not self.teacher_masks.get((w, day_of_week), {}).get(teacher_id, 0) & mask for w in weeks)
+
+    def conflicts(self, kind: Optional[str] = None) -> list[dict]:
+        """kind: room / teacher，None 表示全部"""
+        return [
+            {"type": k, "a": a.to_dict(), "b": b.to_dict(), "weeks": sorted(weeks)}
+            for (k, _, _), (a, b, weeks) in self._conflicts.items()
+            if kind is None or k == kind
+        ]
+
+
+def _benchmark(room_count: int, schedule_count: int, queries: int, seed: int):
+    import random
+    import time
+
+    rng = random.Random(seed)
+    buildings = [f"{name}{block}" for name in ("翡翠湖", "屯溪路", "宣城") for block in "ABCDEF"]
+    rooms = [f"{buildings[i % len(buildings)]}-{100 * (1 + i // len(buildings) % 6) + i % 40}" for i in range(room_count)]
+    coordinates = {b: [rng.uniform(0, 2000), rng.uniform(0, 2000)] for b in buildings}
+    slots = []
+    for i in range(schedule_count):
+        start = rng.choice((1, 3, 5, 7, 9))
+        first_week = rng.randint(1, 8)
+        slots.append(ScheduleSlot(
+            schedule_id=i,
+            course_name=f"课程{i}",
+            teacher_id=rng.randint(1, schedule_count // 4 or 1),
+            teacher_name="",
+            classroom=rng.choice(rooms),
+            day_of_week=rng.randint(1, 5),
+            start_period=start,
+            end_period=start + 1,
+            weeks=frozenset(range(first_week, min(first_week + rng.randint(8, 16), 20))),
+        ))
+
+    t0 = time.perf_counter()
+    index = RoomIndex(slots, coordinates)
+    build = time.perf_counter() - t0
+
+    def timed(fn) -> float:
+        t = time.perf_counter()
+        for _ in range(queries):
+            fn()
+        return (time.perf_counter() - t) / queries * 1e6
+
+    def free_query():
+        start = rng.choice((1, 3, 5, 7, 9))
+        index.free_rooms(rng.randint(1, 20), rng.randint(1, 7), start, start + 1)
+
+    def nearby_query():
+        start = rng.choice((1, 3, 5, 7, 9))
+        index.free_rooms(rng.randint(1, 20), rng.randint(1, 7), start, start + 1,
+                         building=rng.choice(buildings), limit=10)
+
+    def room_check():
+        start = rng.choice((1, 3, 5, 7, 9))
+        index.is_room_free(rng.choice(rooms), range(1, 17), rng.randint(1, 5), start, start + 1)
+
+    print(f"教室 {len(index.rooms)} 间, 排课 {index.slot_count} 条, 建索引 {build * 1000:.1f} ms, "
+          f"冲突 {len(index.conflicts())} 组")
+    print(f"全校空教室查询: {timed(free_query):.1f} µs/次")
+    print(f"就近空教室查询(前 10 间): {timed(nearby_query):.1f} µs/次")
+    print(f"单教室 16 周占用检查: {timed(room_check):.1f} µs/次")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="教室占用索引基准测试 (合成数据)")
+    parser.add_argument("--rooms", type=int, default=400)
+    parser.add_argument("--schedules", type=int, default=8000)
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    _benchmark(args.rooms, args.schedules, args.queries, args.seed)
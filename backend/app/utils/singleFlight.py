@@ -0,0 +1,95 @@
+"""单飞 (single-flight) 请求合并
+
+相同 key 的并发调用只执行一次，其余调用共享同一个进行中的 asyncio 任务。
+可选开启 Redis 锁，在多个 worker 之间去重：拿到锁的 worker 负责计算并把结果短暂写入 Redis，
+其他 worker 轮询结果，超时后自行计算兜底。
+"""
+import asyncio
+import json
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+from ..core.config import get_settings
+from ..db.session import db_manager
+
+
+class SingleFlight:
+    def __init__(
+            self,
+            name: str,
+            encode: Callable[[Any], str] = json.dumps,
+            decode: Callable[[str], Any] = json.loads,
+    ):
+        settings = get_settings()
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+        self.enabled = settings.single_flight_enabled
+        self.use_redis = settings.single_flight_redis
+        self.lock_ttl = settings.single_flight_lock_ttl
+        self.result_ttl = settings.single_flight_result_ttl
+        self.poll_interval = 0.05
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.counters = Counter()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["executed"] += 1
+            # 计算放在独立任务中：发起者被取消 (如客户端断开) 不会影响其他等待者
+            task = asyncio.create_task(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        redis_client = db_manager.redis
+        if not self.use_redis or redis_client is None:
+            return await fn()
+
+        lock_key = f"singleflight:{self.name}:lock:{key}"
+        result_key = f"singleflight:{self.name}:result:{key}"
+        cached = await redis_client.get(result_key)
+        if cached is not None:
+            self.counters["remote_hit"] += 1
+            return self.decode(cached)
+
+        if await redis_client.set(lock_key, "1", nx=True, ex=self.lock_ttl):
+            try:
+                result = await fn()
+                await redis_client.set(result_key, self.encode(result), ex=self.result_ttl)
+                return result
+            finally:
+                await redis_client.delete(lock_key)
+
+        # 其他 worker 正在计算：等待结果，锁释放或超时仍无结果则自行计算
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            cached = await redis_client.get(result_key)
+            if cached is not None:
+                self.counters["remote_hit"] += 1
+                return self.decode(cached)
+            if not await redis_client.exists(lock_key):
+                break
+        self.counters["remote_fallback"] += 1
+        return await fn()
+
+    def stats(self) -> dict:
+        total = self.counters["executed"] + self.counters["coalesced"]
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "redis": self.use_redis,
+            "inflight": len(self._inflight),
+            "executed": self.counters["executed"],
+            "coalesced": self.counters["coalesced"],
+            "remote_hit": self.counters["remote_hit"],
+            "remote_fallback": self.counters["remote_fallback"],
+            "coalesce_rate": self.counters["coalesced"] / total if total else 0.0,
+        }
@@ -0,0 +1,48 @@
+"""本地计算的 BM25 风格稀疏向量
+
+- 分词：英文/数字按整词，中文按单字 + 相邻二字 (bigram)，不依赖额外的分词库
+- 词项通过 crc32 哈希到 uint32 索引空间
+- 文档侧只计算 BM25 的词频饱和部分，IDF 由 Qdrant (Modifier.IDF) 在查询时计算
+"""
+import re
+import zlib
+from collections import Counter
+
+_TOKEN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+_CJK = re.compile(r"[一-鿿]")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for piece in _TOKEN.findall(text.lower()):
+        if not _CJK.match(piece):
+            tokens.append(piece)
+            continue
+        tokens.extend(piece)
+        tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+
+def _index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & 0xFFFFFFFF
+
+
+def _to_sparse(weights: dict[int, float]) -> tuple[list[int], list[float]]:
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+def encode_document(text: str, avg_doc_len: float, k1: float = 1.2, b: float = 0.75) -> tuple[list[int], list[float]]:
+    tokens = tokenize(text)
+    doc_len = len(tokens)
+    weights: dict[int, float] = {}
+    for token, tf in Counter(tokens).items():
+        # 哈希冲突时累加，影响可以忽略
+        weight = tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_doc_len))
+        index = _index(token)
+        weights[index] = weights.get(index, 0.0) + weight
+    return _to_sparse(weights)
+
+
+def encode_query(text: str) -> tuple[list[int], list[float]]:
+    return _to_sparse({_index(token): 1.0 for token in set(tokenize(text))})
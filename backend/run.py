@@ -1,12 +1,24 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.queryAgentApi import router as user_router
 from app.api.login import login_router
 from backend.app.core.config import get_settings
 from backend.app.db.session import db_manager
+from backend.app.db.redisCheckpointer import get_checkpointer
+from backend.app.agents.clientRegistry import client_registry
+from backend.app.agents.intentRouter import intent_router
+from backend.app.services.academicService import warm_up_tool_cache
+from backend.app.services.answerCache import get_answer_cache
+from backend.app.services.eventSync import get_event_sync
+from backend.app.services.qdrantSchema import schema_reconciler
+from backend.app.services.toolCache import tool_cache
+from backend.app.utils.backgroundTasks import spawn
+from backend.app.utils.metrics import metrics_registry
+from app.api.statusApi import status_router
 
 settings = get_settings()
 
@@ -17,12 +29,30 @@ async def lifespan(app: FastAPI):
     # 1. 启动时：初始化所有连接
     db_manager.init_resources()
     print("数据库和 Redis 连接池已初始化")
+    client_registry.init_resources()
+    print("LLM 与嵌入模型客户端连接池已初始化")
+    await intent_router.init_resources()
+    get_checkpointer().start_sweeper()
+    get_answer_cache().start_sweeper()
+    tool_cache.register_invalidation_hooks()
+    tool_cache.start_listener()
+    get_event_sync().start()
+    if settings.qdrant_schema_reconcile:
+        # 补建索引可能需要一段时间，不阻塞启动
+        spawn(schema_reconciler.reconcile_on_startup())
+    if settings.tool_cache_warm_up:
+        spawn(warm_up_tool_cache())
     print("\n" + "=" * 60)
     print("📚 API文档: http://localhost:8000/docs")
     print("📖 ReDoc文档: http://localhost:8000/redoc")
     print("=" * 60 + "\n")
     yield
     # 2. 关闭时：释放所有资源
+    await get_checkpointer().stop_sweeper()
+    await get_answer_cache().stop_sweeper()
+    await tool_cache.stop_listener()
+    await get_event_sync().stop()
+    await client_registry.close_resources()
     await db_manager.close_resources()
     print("连接池已优雅关闭")
 
@@ -32,6 +62,14 @@ app = FastAPI(lifespan=lifespan, title="校园智能助手")
 # 挂载路由
 app.include_router(user_router, prefix="/api", tags=["Users"])
 app.include_router(login_router, prefix="/api", tags=["login"])
+app.include_router(status_router, prefix="/api", tags=["status"])
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 抓取入口"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 
 # 配置CORS
 app.add_middleware(
@@ -0,0 +1,7 @@
+import os
+
+# Settings 中没有默认值的必填项，测试不连接真实服务，填占位值即可
+os.environ.setdefault("EMBEDDING_API_KEY", "test")
+os.environ.setdefault("MYSQL_PASSWORD", "test")
+os.environ.setdefault("QDRANT_API_KEY", "test")
+os.environ.setdefault("REDIS_PASSWORD", "")
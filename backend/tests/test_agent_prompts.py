@@ -0,0 +1,62 @@
+import hashlib
+
+import pytest
+
+from backend.app.agents import agentPrompts
+
+ALICE = {"uid": 1001, "role": "student", "name": "王小明", "number": "2021217001", "preferences": {}}
+BOB = {"uid": 2002, "role": "teacher", "name": "赵教授", "number": "T0099", "preferences": {"theme": "dark"}}
+
+# 两次请求：不同用户、不同时间、不同问题与检索结果
+SCENARIOS = [
+    (ALICE, "2026-03-01 08:15", "推免名额按什么比例分配", ["第一条 推免资格", "第二条 绩点排名"]),
+    (BOB, "2026-11-30 21:47", "明天下午有什么讲座", ["学术讲座：大模型推理优化"]),
+]
+
+
+def render(name: str, user: dict, current_time: str, question: str, context: list[str], monkeypatch):
+    """按各节点的调用方式组装，返回 (静态前缀, 末尾易变消息, 该模板用到的易变字段)"""
+    monkeypatch.setattr(agentPrompts, "current_minute", lambda: current_time)
+    user_fields = [user["name"], str(user["uid"]), current_time]
+    if name == "academic_agent":
+        trailing = agentPrompts.get_academic_agent_context(user, current_time)
+        return agentPrompts.get_academic_agent_prompt(), trailing, user_fields
+    if name == "router":
+        # 路由只把用户问题作为最后一条消息
+        return agentPrompts.get_router_system_prompt(), question, [question]
+    if name == "rag_summary":
+        trailing = agentPrompts.get_rag_summary_context(question)
+        return agentPrompts.get_rag_summary_system_prompt(), trailing, [current_time, question]
+    if name == "rag_query":
+        trailing = agentPrompts.get_rag_query_context(context)
+        return agentPrompts.get_rag_query_system_prompt(), trailing, context
+    if name == "leave":
+        trailing = agentPrompts.get_leave_context(user, current_time)
+        return agentPrompts.get_leave_system_prompt(), trailing, user_fields
+    if name == "memory_summary":
+        dialogue = f"{user['name']}: {question}"
+        trailing = agentPrompts.get_memory_summary_context(context[0], dialogue)
+        return agentPrompts.get_memory_summary_system_prompt(), trailing, [context[0], user["name"], question]
+    raise AssertionError(f"未覆盖的模板: {name}")
+
+
+def volatile_fields(user: dict, current_time: str, question: str, context: list[str]) -> list[str]:
+    return [user["name"], str(user["uid"]), current_time, question, *context]
+
+
+@pytest.mark.parametrize("template", agentPrompts.PROMPT_TEMPLATES, ids=lambda t: t.name)
+def test_prefix_is_byte_identical_across_requests(template, monkeypatch):
+    prefixes = [render(template.name, *scenario, monkeypatch)[0].encode("utf-8") for scenario in SCENARIOS]
+    assert prefixes[0] == prefixes[1]
+    assert hashlib.sha1(prefixes[0]).hexdigest()[:12] == template.fingerprint
+
+
+@pytest.mark.parametrize("template", agentPrompts.PROMPT_TEMPLATES, ids=lambda t: t.name)
+def test_volatile_fields_only_in_trailing_message(template, monkeypatch):
+    for scenario in SCENARIOS:
+        prefix, trailing, used = render(template.name, *scenario, monkeypatch)
+        for field in volatile_fields(*scenario):
+            assert field not in prefix
+        # 该模板用到的易变字段全部出现在末尾消息中
+        for field in used:
+            assert field in trailing
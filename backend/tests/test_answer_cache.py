@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from qdrant_client import AsyncQdrantClient
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.app.db.session import db_manager
+from backend.app.graph import infoGraphNodes
+from backend.app.graph.infoGraphNodes import answer_cache_lookup_node, answer_cache_store_node
+from backend.app.graph.speculation import SpeculativeTask, speculation_manager
+from backend.app.services import answerCache
+from backend.app.services.answerCache import SemanticAnswerCache
+
+# 本地模式的 Qdrant 不支持 payload 索引，只会给出警告
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes")
+
+QUESTION = "保研对绩点有什么要求"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(db_manager, "qdrant", AsyncQdrantClient(":memory:"))
+    cache = SemanticAnswerCache()
+    cache.enabled = True
+    embedding = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(cache, "_embed", embedding.aembed_query)
+    return cache
+
+
+def test_lookup_is_scoped_to_domain(cache):
+    async def scenario():
+        await cache.store(QUESTION, "绩点排名前 30%", "hfut_policy", ["1"])
+        return await cache.lookup(QUESTION, "hfut_policy"), await cache.lookup(QUESTION, "campus_life")
+
+    same_domain, other_domain = asyncio.run(scenario())
+    assert same_domain["answer"] == "绩点排名前 30%"
+    assert other_domain is None
+
+
+def test_purge_expired_deletes_old_entries(cache, monkeypatch):
+    async def scenario():
+        await cache.store(QUESTION, "旧答案", "hfut_policy", ["1"])
+        # 时钟拨到 ttl 之后：第一条已过期，之后写入的仍然有效
+        later = time.time() + cache.ttl + 60
+        monkeypatch.setattr(answerCache.time, "time", lambda: later)
+        await cache.store("图书馆几点关门", "22:00", "campus_life", ["2"])
+        await cache.purge_expired()
+        points, _ = await db_manager.qdrant.scroll(cache.collection_name, limit=10, with_payload=True)
+        return [p.payload["question"] for p in points]
+
+    assert asyncio.run(scenario()) == ["图书馆几点关门"]
+
+
+CONFIG = {"configurable": {"thread_id": "1-student"}}
+
+
+def test_hit_before_rewrite_cancels_speculation(cache, monkeypatch):
+    monkeypatch.setattr(infoGraphNodes, "get_answer_cache", lambda: cache)
+
+    async def scenario():
+        await cache.store(QUESTION, "绩点排名前 30%", "hfut_postgraduate_admission_policy", ["1"])
+        # 路由阶段启动、尚未完成的投机改写
+        speculative = SpeculativeTask(task=asyncio.create_task(asyncio.sleep(10)), started_at=time.perf_counter())
+        speculation_manager.park("1-student", speculative)
+        update = await answer_cache_lookup_node({"messages": [HumanMessage(QUESTION)]}, CONFIG)
+        await asyncio.sleep(0)
+        return update, speculative
+
+    update, speculative = asyncio.run(scenario())
+    assert update["answer_cache_hit"] is True
+    assert update["messages"][0].content == "绩点排名前 30%"
+    assert speculative.task.cancelled()
+    assert speculation_manager.claim("1-student") is None
+
+
+def test_follow_up_questions_bypass_cache(cache, monkeypatch):
+    monkeypatch.setattr(infoGraphNodes, "get_answer_cache", lambda: cache)
+    follow_up = "那它的绩点要求呢"
+    history = [HumanMessage("计算机学院的保研名额有多少"), AIMessage("共 42 个名额")]
+    stored = []
+    monkeypatch.setattr(infoGraphNodes, "spawn", lambda coro: stored.append(coro.close()))
+
+    async def scenario():
+        # 其他对话里写入了同样问法的答案
+        await cache.store(follow_up, "物理学院要求绩点 3.5", "hfut_postgraduate_admission_policy", ["9"])
+        lookup = await answer_cache_lookup_node({"messages": [*history, HumanMessage(follow_up)]}, CONFIG)
+        store = await answer_cache_store_node({
+            "messages": [*history, HumanMessage(follow_up), AIMessage("计算机学院要求绩点 3.2")],
+            "rag_query_source_ids": ["1"],
+            "rag_query_params": {"domain": "hfut_postgraduate_admission_policy"},
+        })
+        return lookup, store
+
+    lookup, store = asyncio.run(scenario())
+    assert lookup == {"answer_cache_hit": False}
+    assert store == {}
+    assert stored == []
+
+
+def test_event_questions_skip_lookup(cache, monkeypatch):
+    monkeypatch.setattr(infoGraphNodes, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(cache, "lookup", None)
+    update = asyncio.run(answer_cache_lookup_node({"messages": [HumanMessage("明天有什么讲座")]}, CONFIG))
+    assert update == {"answer_cache_hit": False}
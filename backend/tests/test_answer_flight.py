@@ -0,0 +1,64 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.app.graph import infoGraphNodes
+from backend.app.graph.infoGraphNodes import answer_flight, info_query_node
+
+
+class FakeAgent:
+    def __init__(self):
+        self.calls = 0
+
+    async def arun(self, messages, context=None):
+        self.calls += 1
+        run_id = f"run-{self.calls}"
+        await asyncio.sleep(0.05)
+        return [messages[-1], AIMessage(
+            content="绩点排名前 30%", id=run_id,
+            usage_metadata={"input_tokens": 120, "output_tokens": 8, "total_tokens": 128},
+        )]
+
+
+def state(thread: int) -> dict:
+    return {
+        "messages": [HumanMessage(content="保研对绩点有什么要求", id=f"q-{thread}")],
+        "rag_query_results": ["第二条 绩点排名前 30%"],
+        "rag_query_params": {"domain": "hfut_policy"},
+    }
+
+
+def run_threads(monkeypatch, configurable: dict) -> tuple[FakeAgent, list[AIMessage]]:
+    agent = FakeAgent()
+    monkeypatch.setattr(infoGraphNodes.AgentBase, "get_or_create", classmethod(lambda cls, **kwargs: agent))
+    monkeypatch.setattr(answer_flight, "enabled", True)
+    monkeypatch.setattr(answer_flight, "use_redis", False)
+
+    async def scenario():
+        return await asyncio.gather(*(
+            info_query_node(state(i), {"configurable": {"thread_id": str(i), **configurable}}) for i in range(3)
+        ))
+
+    return agent, [update["messages"][0] for update in asyncio.run(scenario())]
+
+
+def test_followers_share_the_full_message(monkeypatch):
+    agent, messages = run_threads(monkeypatch, {})
+    assert agent.calls == 1
+    for message in messages:
+        assert message.id == "run-1"
+        assert message.usage_metadata["total_tokens"] == 128
+    # 各线程拿到的是副本
+    assert len({id(m) for m in messages}) == 3
+
+
+def test_streaming_requests_bypass_the_flight(monkeypatch):
+    agent, messages = run_threads(monkeypatch, {"stream_tokens": True})
+    assert agent.calls == 3
+    assert sorted(m.id for m in messages) == ["run-1", "run-2", "run-3"]
+
+
+def test_answer_round_trips_through_redis_encoding():
+    message = AIMessage(content="答案", id="run-1", usage_metadata={"input_tokens": 1, "output_tokens": 2, "total_tokens": 3})
+    decoded = answer_flight.decode(answer_flight.encode(message))
+    assert decoded == message
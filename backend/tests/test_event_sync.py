@@ -0,0 +1,84 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from backend.app.db.session import db_manager
+from backend.app.services import eventSync
+from backend.app.services.eventSync import LOCK_KEY, WATERMARK_KEY, CampusEventSync
+
+
+class FakeRedis:
+    """内存实现的 get / set NX / eval，eval 只认本模块的两个锁脚本"""
+
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.store.get(key) != token:
+            return 0
+        if script == eventSync.RELEASE_LOCK_SCRIPT:
+            del self.store[key]
+        return 1
+
+
+# 数据库时钟比应用时钟快 8 小时 (应用 UTC、数据库 UTC+8)
+DB_NOW = datetime.datetime(2026, 10, 18, 20, 0, 0)
+
+
+def make_sync(monkeypatch, batches: list[list], on_apply=None) -> tuple[CampusEventSync, FakeRedis, list]:
+    redis_client = FakeRedis()
+    monkeypatch.setattr(db_manager, "redis", redis_client)
+    sync = CampusEventSync()
+    sync.batch_size = 2
+    untils = []
+
+    async def db_now():
+        return DB_NOW
+
+    async def fetch_batch(watermark, until):
+        untils.append(until)
+        return batches.pop(0) if batches else []
+
+    async def apply_batch(events):
+        if on_apply:
+            on_apply(redis_client)
+
+    monkeypatch.setattr(sync, "_db_now", db_now)
+    monkeypatch.setattr(sync, "_fetch_batch", fetch_batch)
+    monkeypatch.setattr(sync, "_apply_batch", apply_batch)
+    return sync, redis_client, untils
+
+
+def events(*ids):
+    return [SimpleNamespace(id=i, updated_at=DB_NOW - datetime.timedelta(minutes=10)) for i in ids]
+
+
+def test_cycle_uses_database_clock_and_releases_own_lock(monkeypatch):
+    sync, redis_client, untils = make_sync(monkeypatch, [events(1, 2), events(3)])
+    cycle = asyncio.run(sync.run_cycle())
+    assert cycle["processed"] == 3
+    assert untils == [DB_NOW - sync.lag] * 2
+    assert '"id": 3' in redis_client.store[WATERMARK_KEY]
+    assert LOCK_KEY not in redis_client.store
+
+
+def test_lost_lock_stops_cycle_without_touching_new_owner(monkeypatch):
+    def lock_expired_and_taken(redis_client):
+        # 单批耗时超过锁有效期，锁已被另一个 worker 拿到
+        redis_client.store[LOCK_KEY] = "other-worker"
+
+    sync, redis_client, _ = make_sync(monkeypatch, [events(1, 2), events(3, 4)], lock_expired_and_taken)
+    cycle = asyncio.run(sync.run_cycle())
+    assert cycle["processed"] == 0
+    assert WATERMARK_KEY not in redis_client.store
+    assert redis_client.store[LOCK_KEY] == "other-worker"
+    assert sync.counters["lock_lost"] == 1
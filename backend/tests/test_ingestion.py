@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from qdrant_client import AsyncQdrantClient
+
+from backend.app.db.session import db_manager
+from backend.app.services.ingestion import IngestionError, PolicyIngestion
+from backend.app.services.qdrantSchema import policy_schema, reconcile
+
+DOMAIN = "test_policy"
+
+# 本地模式的 Qdrant 不支持 payload 索引，只会给出警告
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes")
+
+
+class BrokenEmbedding(DeterministicFakeEmbedding):
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise RuntimeError("embedding service down")
+
+
+@pytest.fixture
+def qdrant(monkeypatch):
+    client = AsyncQdrantClient(":memory:")
+    monkeypatch.setattr(db_manager, "qdrant", client)
+    return client
+
+
+def make_ingestion(**kwargs) -> PolicyIngestion:
+    ingestion = PolicyIngestion(
+        domain=DOMAIN, collection_name="test_policy", batch_size=2, concurrency=4, chunk_size=20, chunk_overlap=0,
+        **kwargs,
+    )
+    ingestion.embedding_model = DeterministicFakeEmbedding(size=8)
+    return ingestion
+
+
+async def sources(client: AsyncQdrantClient) -> dict[str, set[str]]:
+    points, _ = await client.scroll("test_policy", limit=1000, with_payload=True)
+    result = {}
+    for p in points:
+        result.setdefault(p.payload["metadata"]["source"], set()).add(p.payload["content"])
+    return result
+
+
+def write_docs(directory, docs: dict[str, str]):
+    for path in directory.glob("*.md"):
+        path.unlink()
+    for name, text in docs.items():
+        (directory / name).write_text(text, encoding="utf-8")
+
+
+def test_concurrent_batches_create_collection_once(qdrant, tmp_path):
+    write_docs(tmp_path, {f"{i}.md": "第一条规定。第二条规定。第三条规定。第四条规定。" * 3 for i in range(4)})
+    stats = asyncio.run(make_ingestion().run(tmp_path))
+    assert stats.upserted == stats.chunks > 8
+    assert len(asyncio.run(sources(qdrant))) == 4
+
+
+def test_changed_and_removed_documents(qdrant, tmp_path):
+    write_docs(tmp_path, {"a.md": "旧的规定内容。", "b.md": "另一份文件。"})
+    asyncio.run(make_ingestion().run(tmp_path))
+
+    write_docs(tmp_path, {"a.md": "新的规定内容。"})
+    stats = asyncio.run(make_ingestion().run(tmp_path))
+    assert asyncio.run(sources(qdrant)) == {"a.md": {"新的规定内容。"}}
+    assert stats.deleted == 2
+
+
+def test_failed_upsert_keeps_old_chunks(qdrant, tmp_path):
+    write_docs(tmp_path, {"a.md": "旧的规定内容。"})
+    asyncio.run(make_ingestion().run(tmp_path))
+
+    write_docs(tmp_path, {"a.md": "新的规定内容。"})
+    ingestion = make_ingestion()
+    ingestion.embedding_model = BrokenEmbedding(size=8)
+    with pytest.raises(RuntimeError):
+        asyncio.run(ingestion.run(tmp_path))
+    assert asyncio.run(sources(qdrant)) == {"a.md": {"旧的规定内容。"}}
+
+
+def test_sparse_vector_written_in_dense_mode(qdrant, tmp_path):
+    settings = make_ingestion().settings
+    assert settings.retrieval_mode == "dense"
+    write_docs(tmp_path, {"a.md": "保研绩点要求。"})
+    asyncio.run(make_ingestion().run(tmp_path))
+    points, _ = asyncio.run(qdrant.scroll("test_policy", with_vectors=True))
+    assert all(p.vector.get(settings.sparse_vector_name) for p in points)
+
+
+def test_backfill_sparse_for_dense_only_points(qdrant, tmp_path):
+    write_docs(tmp_path, {"a.md": "保研绩点要求。", "b.md": "四级和六级成绩。"})
+    ingestion = make_ingestion()
+    sparse_name = ingestion.settings.sparse_vector_name
+    asyncio.run(ingestion.run(tmp_path))
+
+    async def drop_sparse():
+        points, _ = await qdrant.scroll("test_policy", with_vectors=True)
+        await qdrant.delete_vectors("test_policy", vectors=[sparse_name], points=[p.id for p in points])
+
+    asyncio.run(drop_sparse())
+    assert asyncio.run(make_ingestion().backfill_sparse()) == 2
+    assert asyncio.run(make_ingestion().backfill_sparse()) == 0
+    points, _ = asyncio.run(qdrant.scroll("test_policy", with_vectors=True))
+    assert all(p.vector.get(sparse_name) for p in points)
+
+
+def create_dense_only(client: AsyncQdrantClient):
+    """升级前创建的旧集合：只有未命名的稠密向量"""
+    from qdrant_client.http import models
+
+    asyncio.run(client.create_collection(
+        "test_policy", vectors_config=models.VectorParams(size=8, distance=models.Distance.COSINE)
+    ))
+
+
+def test_dense_only_collection_keeps_ingesting(qdrant, tmp_path):
+    create_dense_only(qdrant)
+    write_docs(tmp_path, {"a.md": "保研绩点要求。"})
+    stats = asyncio.run(make_ingestion().run(tmp_path))
+    assert stats.upserted == stats.chunks > 0
+
+
+def test_dense_only_collection_fails_fast_when_sparse_required(qdrant, tmp_path, monkeypatch):
+    create_dense_only(qdrant)
+    write_docs(tmp_path, {"a.md": "保研绩点要求。"})
+    with pytest.raises(IngestionError, match="重新入库"):
+        asyncio.run(make_ingestion().backfill_sparse())
+
+    ingestion = make_ingestion()
+    monkeypatch.setattr(ingestion.settings, "retrieval_mode", "hybrid")
+    # 在向量化任何分片之前失败
+    ingestion.embedding_model = BrokenEmbedding(size=8)
+    with pytest.raises(IngestionError):
+        asyncio.run(ingestion.run(tmp_path))
+
+
+def test_reconcile_reports_missing_sparse_vector(qdrant):
+    create_dense_only(qdrant)
+    actions = asyncio.run(reconcile(policy_schema("test_policy"), dry_run=True))
+    assert any("稀疏向量" in action for action in actions)
@@ -0,0 +1,36 @@
+import asyncio
+
+from backend.app.agents.intentRouter import IntentRouter
+
+
+def test_single_keyword_hit_is_below_fast_threshold():
+    router = IntentRouter()
+    label, confidence = router.classify_by_keywords("帮我看看学分")
+    assert label == "academic"
+    assert confidence < router.threshold
+
+
+def test_multiple_keyword_hits_take_fast_path():
+    router = IntentRouter()
+    label, confidence = router.classify_by_keywords("我的成绩和学分")
+    assert label == "academic"
+    assert confidence >= router.threshold
+
+
+def test_greetings_are_not_fast_routed():
+    router = IntentRouter()
+    # 主图没有 chat 分支，问候不能由快速路由直接给出
+    assert router.classify_by_keywords("你好，谢谢") == (None, 0.0)
+
+
+def test_single_hit_falls_back_to_llm_without_examples():
+    router = IntentRouter()
+    llm_calls = []
+
+    async def llm_route():
+        llm_calls.append(1)
+        return "info"
+
+    # 没有样例库时，单个关键词命中不足以跳过 LLM
+    assert asyncio.run(router.route("学分互认政策", llm_route)) == "info"
+    assert llm_calls == [1]
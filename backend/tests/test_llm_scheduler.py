@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from backend.app.agents import llmScheduler
+from backend.app.agents.llmScheduler import LLMScheduler, set_request_deadline
+from backend.app.utils.backgroundTasks import spawn
+
+
+def connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://llm.local/v1/chat/completions"))
+
+
+def flaky(failures: int):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise connection_error()
+        return "ok"
+
+    return call, calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    # 取抖动区间的上界，便于断言退避序列
+    monkeypatch.setattr(llmScheduler.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(llmScheduler.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_connection_errors_back_off_exponentially(sleeps):
+    scheduler = LLMScheduler()
+    call, calls = flaky(failures=3)
+    assert asyncio.run(scheduler.run("m", call)) == "ok"
+    base = scheduler.settings.llm_retry_backoff_base
+    assert sleeps == [base, base * 2, base * 4]
+    assert scheduler.lane("m").counters["retried"] == 3
+
+
+def test_backoff_stops_at_request_deadline(sleeps):
+    scheduler = LLMScheduler()
+    call, calls = flaky(failures=1)
+
+    async def scenario():
+        # 剩余时间不足一次退避，直接抛出而不是等待
+        set_request_deadline(scheduler.settings.llm_retry_backoff_base / 10)
+        return await scheduler.run("m", call)
+
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(scenario())
+    assert calls == [1]
+    assert sleeps == []
+
+
+def test_spawned_tasks_do_not_inherit_request_deadline():
+    async def scenario():
+        set_request_deadline(0.01)
+
+        async def background():
+            return llmScheduler._deadline.get()
+
+        return llmScheduler._deadline.get(), await spawn(background())
+
+    request_deadline, background_deadline = asyncio.run(scenario())
+    assert request_deadline is not None
+    assert background_deadline is None
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from backend.app.agents.onnxEmbeddings import OnnxEmbeddings
+
+
+class FakeOnnxEmbeddings(OnnxEmbeddings):
+    """不加载模型：查询直接返回文本长度，文档向量化阻塞到 release 被设置"""
+
+    def __init__(self):
+        super().__init__("unused")
+        self.release = threading.Event()
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        return [[float(len(t))] for t in texts]
+
+    def _encode_chunked(self, texts: list[str]) -> list[list[float]]:
+        self.release.wait(timeout=5)
+        return self._encode(texts)
+
+
+def test_queries_are_not_blocked_by_document_encoding():
+    embeddings = FakeOnnxEmbeddings()
+
+    async def scenario():
+        documents = asyncio.create_task(embeddings.aembed_documents(["文档"] * 100))
+        await asyncio.sleep(0.01)
+        # 文档批次仍在执行，查询批次走自己的线程池
+        queries = await asyncio.wait_for(
+            asyncio.gather(*(embeddings.aembed_query("q" * n) for n in range(1, 6))), timeout=1
+        )
+        assert not documents.done()
+        embeddings.release.set()
+        return queries, await documents
+
+    try:
+        queries, documents = asyncio.run(scenario())
+    finally:
+        embeddings.release.set()
+        embeddings.close()
+    assert queries == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert len(documents) == 100
+    # 并发到达的查询合并为一批
+    assert embeddings.batcher.stats()["batches"] == 1
@@ -0,0 +1,38 @@
+import asyncio
+
+from backend.app.db.session import db_manager
+from backend.app.services.qdrantSchema import SchemaReconciler
+
+
+class FakeRedis:
+    """只实现 SET NX，足以模拟多个 worker 抢同一把锁"""
+
+    def __init__(self):
+        self.store = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+
+def test_only_one_worker_reconciles_on_startup(monkeypatch):
+    monkeypatch.setattr(db_manager, "redis", FakeRedis())
+    calls = []
+
+    async def fake_reconcile_all(self, dry_run: bool = False):
+        calls.append(self)
+        return ["created index"]
+
+    monkeypatch.setattr(SchemaReconciler, "reconcile_all", fake_reconcile_all)
+    # 四个 worker 同时启动，各自持有一个 schema_reconciler
+    workers = [SchemaReconciler() for _ in range(4)]
+
+    async def scenario():
+        return await asyncio.gather(*(w.reconcile_on_startup() for w in workers))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(results) == [[], [], [], ["created index"]]
+    assert sum(w.last_skipped is not None for w in workers) == 3
@@ -0,0 +1,56 @@
+from backend.app.utils.roomIndex import RoomIndex, ScheduleSlot
+
+
+def slot(schedule_id: int, classroom: str, start_period: int = 1) -> ScheduleSlot:
+    return ScheduleSlot(
+        schedule_id=schedule_id, course_name=f"课程{schedule_id}", teacher_id=schedule_id, teacher_name="",
+        classroom=classroom, day_of_week=1, start_period=start_period, end_period=start_period + 1,
+        weeks=frozenset({1}),
+    )
+
+
+def booking(schedule_id: int, classroom: str, teacher_id: int, start_period: int, weeks: set) -> ScheduleSlot:
+    return ScheduleSlot(
+        schedule_id=schedule_id, course_name=f"课程{schedule_id}", teacher_id=teacher_id, teacher_name="",
+        classroom=classroom, day_of_week=3, start_period=start_period, end_period=start_period + 1,
+        weeks=frozenset(weeks),
+    )
+
+
+def make_index(**kwargs) -> RoomIndex:
+    # 第 1-2 节占用 A-101 与 B-201，第 5-6 节占用 A-102 (仅用于登记教室)
+    return RoomIndex([slot(1, "翡翠湖A-101"), slot(2, "翡翠湖A-102", 5), slot(3, "屯溪路B-201")], **kwargs)
+
+
+def test_nearby_rooms_prefers_same_building():
+    index = make_index()
+    assert index.free_rooms(1, 1, 1, 2, building="A") == ["翡翠湖A-102"]
+    assert index.resolve_building("A") == "翡翠湖A"
+
+
+def test_unknown_building_falls_back_to_all_rooms():
+    index = make_index(building_coordinates={"翡翠湖A": [0, 0], "屯溪路B": [500, 0]})
+    assert index.resolve_building("图书馆") is None
+    assert index.free_rooms(1, 1, 5, 6, building="图书馆") == index.free_rooms(1, 1, 5, 6)
+    assert index.free_rooms(1, 1, 5, 6, building="图书馆") == ["屯溪路B-201", "翡翠湖A-101"]
+
+
+def test_room_and_teacher_conflicts_report_pair_and_weeks():
+    index = RoomIndex([
+        # 同一教室第 1-2 节与第 2-3 节重叠，第 2、3 周都排了
+        booking(10, "翡翠湖A-101", teacher_id=1, start_period=1, weeks={1, 2, 3}),
+        booking(11, "翡翠湖A-101", teacher_id=2, start_period=2, weeks={2, 3, 4}),
+        # 同一教师第 2 周同时在两间教室上课
+        booking(12, "翡翠湖A-102", teacher_id=9, start_period=5, weeks={1, 2}),
+        booking(13, "屯溪路B-201", teacher_id=9, start_period=6, weeks={2, 5}),
+        # 紧接着的节次不算冲突
+        booking(14, "翡翠湖A-101", teacher_id=3, start_period=4, weeks={2}),
+    ])
+
+    room = index.conflicts("room")
+    assert [(c["a"]["schedule_id"], c["b"]["schedule_id"], c["weeks"]) for c in room] == [(10, 11, [2, 3])]
+    teacher = index.conflicts("teacher")
+    assert [(c["a"]["schedule_id"], c["b"]["schedule_id"], c["weeks"]) for c in teacher] == [(12, 13, [2])]
+    assert len(index.conflicts()) == 2
+    assert not index.is_teacher_free(9, [2], 3, 5, 5)
+    assert index.is_room_free("翡翠湖A-101", [1], 3, 3, 6)
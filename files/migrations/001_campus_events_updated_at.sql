@@ -0,0 +1,8 @@
+-- campus_events 增加 updated_at 列，作为 Qdrant 增量同步 (eventSync) 的水位
+-- 在部署包含 CampusEvent.updated_at 的版本之前，对已有数据库执行一次
+-- 已有行的 updated_at 取执行迁移的时刻，首次同步会把它们全部写入 Qdrant
+
+ALTER TABLE campus_events
+    ADD COLUMN updated_at DATETIME NOT NULL
+        DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    ADD INDEX ix_campus_events_updated_at (updated_at);